@@ -79,21 +79,52 @@ you don't need to specify the engine by 'at_engine' parameter like this::
 
 For details such as option parameters list of :function:`anytemplate.render`,
 see its help; see the output of 'help(anytemplate.render)', etc.
+
+To render many template files in batch, you can call
+:function:`anytemplate.render_many` with jobs, tuples of (template file path,
+context, output, options), and it yields the results one by one. Here is an
+example::
+
+    jobs = ((f"/path/to/{name}.j2", ctx, f"/tmp/out/{name}")
+            for name, ctx in contexts.items())
+    for output in anytemplate.render_many(jobs, at_engine="jinja2"):
+        print("Rendered:", output)
 """
 from __future__ import absolute_import
-from .globals import AUTHOR, VERSION, LOGGER
-from .api import (
-    list_engines, find_engine, renders, render, render_to,
-    TemplateEngineNotFound, TemplateNotFound
-)
-
-__author__ = AUTHOR
-__version__ = VERSION
+import importlib
+
+# Names provided by the modules imported lazily in __getattr__, not to import
+# these on start, e.g. of the thin client of the daemon, anytemplate.client.
+_LAZY_ATTRS = {
+    "globals": ("AUTHOR", "VERSION", "LOGGER"),
+    "api": ("list_engines", "find_engine", "renders", "render", "render_to",
+            "render_many", "render_parallel", "renders_async",
+            "render_async", "renders_iter", "render_iter", "clear_caches",
+            "set_resolver_ttl", "TemplateEngineNotFound",
+            "TemplateNotFound"),
+}
+_ALIASES = dict(__author__="AUTHOR", __version__="VERSION")
 
 __all__ = [
     "LOGGER",
     "list_engines", "find_engine", "renders", "render", "render_to",
-    "TemplateEngineNotFound", "TemplateNotFound",
+    "render_many", "render_parallel", "renders_async", "render_async",
+    "renders_iter", "render_iter",
+    "clear_caches", "set_resolver_ttl", "TemplateEngineNotFound",
+    "TemplateNotFound",
 ]
 
+
+def __getattr__(name):
+    """
+    Import the modules provide `name` lazily.
+    """
+    attr = _ALIASES.get(name, name)
+    for modname, attrs in _LAZY_ATTRS.items():
+        if attr in attrs:
+            return getattr(importlib.import_module(f".{modname}", __name__),
+                           attr)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # vim:sw=4:ts=4:et:
@@ -8,10 +8,14 @@
 """
 from __future__ import absolute_import
 
+import collections
 import logging
+import os
 import os.path
+import pickle
 import sys
 
+import anytemplate.cache
 import anytemplate.compat
 import anytemplate.engine
 import anytemplate.globals
@@ -25,6 +29,11 @@ from anytemplate.engine import find_by_filename as list_engines  # noqa: F401
 
 LOGGER = logging.getLogger(__name__)
 
+_ENGINE_CACHE = anytemplate.cache.make_cache(64)
+
+JobResult = collections.namedtuple("JobResult",
+                                   "filepath output result error")
+
 
 def find_engine(filepath=None, name=None):
     """
@@ -35,6 +44,13 @@ def find_engine(filepath=None, name=None):
     :return: Template engine class found
     """
     if name is None:
+        if filepath is None:
+            engine = anytemplate.engine.find_default()
+            if engine is None:
+                raise TemplateEngineNotFound("filename=None")
+
+            return engine
+
         engines = anytemplate.engine.find_by_filename(filepath)
         if not engines:
             raise TemplateEngineNotFound(f"filename={filepath!s}")
@@ -48,9 +64,82 @@ def find_engine(filepath=None, name=None):
         return engine
 
 
+def clear_caches():
+    """
+    Clear all in-process caches such as the cache of template engine objects.
+    """
+    anytemplate.cache.clear_caches()
+
+
+def set_resolver_ttl(ttl):
+    """
+    Set the seconds to skip checks if the dirs to search template files in
+    were changed, after the last check. These are checked on every lookup by
+    default, and it may be set to a positive value if template files are not
+    added and removed often, e.g. in long-running processes.
+
+    :param ttl: Seconds to skip the checks or 0 to check on every lookup
+    """
+    anytemplate.utils.RESOLVER.ttl = ttl
+
+
+def get_engine(ecls, at_cls_args=None, at_cache=True):
+    """
+    Get an instance of template engine class `ecls`.
+
+    Instances are cached and reused across calls by the class and the
+    arguments to instantiate it, `at_cls_args`, unless `at_cache` is False or
+    `at_cls_args` cannot be made hashable.
+
+    :param ecls: Template engine class
+    :param at_cls_args: Arguments passed to instantiate template engine class
+    :param at_cache: Reuse the cached engine object if True
+
+    :return: Template engine object
+    """
+    if at_cls_args is None:
+        at_cls_args = {}
+
+    key = anytemplate.cache.make_key(at_cls_args) if at_cache else None
+    if key is None:
+        return ecls(**at_cls_args)
+
+    return _ENGINE_CACHE.get_or_set((ecls, key),
+                                    lambda: ecls(**at_cls_args))
+
+
+def _primed(render_iter_fn, target):
+    """
+    Make a function calls `render_iter_fn` and gets the first chunk of the
+    results at once, so that errors on loading templates are raised early,
+    and returns a generator yields all chunks.
+
+    :param render_iter_fn: A callable returns a generator yields chunks of
+        the rendered string
+    :param target: Template file path or template content for errors
+    """
+    def _iter(first, chunks):
+        """Yield chunks and wrap errors while rendering."""
+        try:
+            if first is not None:
+                yield first
+            for chunk in chunks:
+                yield chunk
+        except Exception as exc:
+            raise CompileError(f"exc={exc!r}, template={target[:200]}")
+
+    def _render_iter(*args, **kwargs):
+        """Call `render_iter_fn` and get the first chunk."""
+        chunks = render_iter_fn(*args, **kwargs)
+        return _iter(next(chunks, None), chunks)
+
+    return _render_iter
+
+
 def _render(template=None, filepath=None, context=None, at_paths=None,
             at_encoding=anytemplate.compat.ENCODING, at_engine=None,
-            at_ask_missing=False, at_cls_args=None, _at_usr_tmpl=None,
+            at_ask_missing=False, at_cls_args=None, at_cache=True,
+            _at_usr_tmpl=None, _at_engine_obj=None, _at_iter=False,
             **kwargs):
     """
     Compile and render given template string and return the result string.
@@ -64,26 +153,40 @@ def _render(template=None, filepath=None, context=None, at_paths=None,
     :param at_engine: Specify the name of template engine to use explicitly or
         None to find it automatically anyhow.
     :param at_cls_args: Arguments passed to instantiate template engine class
+    :param at_cache: Reuse the cached template engine object and compiled
+        template objects if True
     :param _at_usr_tmpl: Template file of path will be given by user later;
         this file will be used just for testing purpose.
+    :param _at_engine_obj: Template engine object to use instead of finding
+        and instantiating it
+    :param _at_iter: Return a generator yields chunks of the rendered string
+        instead if True
     :param kwargs: Keyword arguments passed to the template engine to
         render templates with specific features enabled.
 
     :return: Rendered string
     """
-    ecls = find_engine(filepath, at_engine)
-    LOGGER.debug("Use the template engine: %s", ecls.name())
-    engine = ecls() if at_cls_args is None else ecls(**at_cls_args)
+    if _at_engine_obj is None:
+        ecls = find_engine(filepath, at_engine)
+        LOGGER.debug("Use the template engine: %s", ecls.name())
+        engine = get_engine(ecls, at_cls_args, at_cache)
+    else:
+        engine = _at_engine_obj
+
     at_paths = anytemplate.utils.mk_template_paths(filepath, at_paths)
 
     if filepath is None:
         (render_fn, target) = (engine.renders, template)
+        if _at_iter:
+            render_fn = _primed(engine.renders_iter, template)
     else:
         (render_fn, target) = (engine.render, filepath)
+        if _at_iter:
+            render_fn = _primed(engine.render_iter, filepath)
 
     try:
         return render_fn(target, context=context, at_paths=at_paths,
-                         at_encoding=at_encoding, **kwargs)
+                         at_encoding=at_encoding, at_cache=at_cache, **kwargs)
     except TemplateNotFound as exc:
         LOGGER.warning("** Missing template[s]: paths=%r", at_paths)
         if not at_ask_missing:
@@ -103,7 +206,42 @@ def _render(template=None, filepath=None, context=None, at_paths=None,
 
         return render_fn(target, context=context,
                          at_paths=(at_paths + [os.path.dirname(usr_tmpl)]),
-                         at_encoding=at_encoding, **kwargs)
+                         at_encoding=at_encoding, at_cache=at_cache, **kwargs)
+    except Exception as exc:
+        raise CompileError(f"exc={exc!r}, template={target[:200]}")
+
+
+async def _render_async(template=None, filepath=None, context=None,
+                        at_paths=None, at_encoding=anytemplate.compat.ENCODING,
+                        at_engine=None, at_cls_args=None, at_cache=True,
+                        at_executor=None, **kwargs):
+    """
+    Asynchronous version of :func:`_render`. Missing templates are not asked
+    to users.
+
+    :param at_executor: concurrent.futures.Executor object to run blocking
+        operations in or None to use the default executor of the running
+        event loop
+
+    :return: Rendered string
+    """
+    ecls = find_engine(filepath, at_engine)
+    LOGGER.debug("Use the template engine: %s", ecls.name())
+    engine = get_engine(ecls, at_cls_args, at_cache)
+    at_paths = anytemplate.utils.mk_template_paths(filepath, at_paths)
+
+    if filepath is None:
+        (render_fn, target) = (engine.renders_async, template)
+    else:
+        (render_fn, target) = (engine.render_async, filepath)
+
+    try:
+        return await render_fn(target, context=context, at_paths=at_paths,
+                               at_encoding=at_encoding, at_cache=at_cache,
+                               at_executor=at_executor, **kwargs)
+    except TemplateNotFound as exc:
+        LOGGER.warning("** Missing template[s]: paths=%r", at_paths)
+        raise TemplateNotFound(str(exc)) from exc
     except Exception as exc:
         raise CompileError(f"exc={exc!r}, template={target[:200]}")
 
@@ -122,6 +260,10 @@ def renders(template, context=None, **options):
         - at_engine: Specify the name of template engine to use explicitly or
           None to find it automatically anyhow.
         - at_cls_args: Arguments passed to instantiate template engine class
+        - at_cache: Reuse the cached template engine object and compiled
+          template objects if True (default)
+        - at_cache_dir: Dir to save cache files such as compiled templates
+          to, to reuse them across processes, or None (default)
         - other keyword arguments passed to the template engine to render
           templates with specific features enabled.
 
@@ -144,6 +286,10 @@ def render(filepath, context=None, **options):
         - at_engine: Specify the name of template engine to use explicitly or
           None to find it automatically anyhow.
         - at_cls_args: Arguments passed to instantiate template engine class
+        - at_cache: Reuse the cached template engine object and compiled
+          template objects if True (default)
+        - at_cache_dir: Dir to save cache files such as compiled templates
+          to, to reuse them across processes, or None (default)
         - other keyword arguments passed to the template engine to render
           templates with specific features enabled.
 
@@ -155,12 +301,101 @@ def render(filepath, context=None, **options):
     return _render(filepath=filepath, context=context, **options)
 
 
+async def renders_async(template, context=None, **options):
+    """
+    Asynchronous version of :func:`renders`.
+
+    Template engines support asynchronous rendering natively such as Jinja2
+    render templates in the event loop, and the others render templates in
+    the executor given by the option `at_executor`.
+
+    :param template: Template content string
+    :param context: A dict or dict-like object to instantiate given
+        template file
+    :param options: Optional keyword arguments same as :func:`renders`'s and:
+
+        - at_executor: concurrent.futures.Executor object to run blocking
+          operations in or None to use the default executor of the running
+          event loop
+
+    :return: Rendered string
+    """
+    return await _render_async(template, context=context, **options)
+
+
+async def render_async(filepath, context=None, **options):
+    """
+    Asynchronous version of :func:`render`.
+
+    Template engines support asynchronous rendering natively such as Jinja2
+    render templates in the event loop and load template files in the
+    executor given by the option `at_executor`, and the others render
+    templates in that executor.
+
+    :param filepath: Template file path
+    :param context: A dict or dict-like object to instantiate given
+        template file. Use
+        :func:`anytemplate.utils.parse_and_load_contexts_async` to load
+        context files without blocking the event loop.
+    :param options: Optional keyword arguments same as :func:`render`'s and:
+
+        - at_executor: concurrent.futures.Executor object to run blocking
+          operations in or None to use the default executor of the running
+          event loop
+
+    :return: Rendered string
+    """
+    return await _render_async(filepath=filepath, context=context, **options)
+
+
+def renders_iter(template, context=None, **options):
+    """
+    Streaming version of :func:`renders` yields chunks of the rendered string
+    one by one. Template engines support it such as Jinja2 and Mako render
+    templates incrementally, and the others yield the result at once.
+
+    :param template: Template content string
+    :param context: A dict or dict-like object to instantiate given
+        template file
+    :param options: Optional keyword arguments same as :func:`renders`'s
+
+    :return: A generator yields chunks of the rendered string
+    """
+    return _render(template, context=context, _at_iter=True, **options)
+
+
+def render_iter(filepath, context=None, **options):
+    """
+    Streaming version of :func:`render` yields chunks of the rendered string
+    one by one. Template engines support it such as Jinja2 and Mako render
+    templates incrementally, and the others yield the result at once.
+
+    :param filepath: Template file path or '-'
+    :param context: A dict or dict-like object to instantiate given
+        template file
+    :param options: Optional keyword arguments same as :func:`render`'s
+
+    :return: A generator yields chunks of the rendered string
+    """
+    if filepath == '-':
+        return _render(sys.stdin.read(), context=context, _at_iter=True,
+                       **options)
+
+    return _render(filepath=filepath, context=context, _at_iter=True,
+                   **options)
+
+
 def render_to(filepath, context=None, output=None,
               at_encoding=anytemplate.compat.ENCODING, **options):
     """
     Render given template file and write the result string to given `output`.
     The result string will be printed to sys.stdout if output is None or '-'.
 
+    The result is written in chunks as rendered by :func:`render_iter` to a
+    temporary file replaces the output file on success, so the output file is
+    left as it was if some errors occurred while rendering. The result
+    printed to stdout may be written partially in that case.
+
     :param filepath: Template file path
     :param context: A dict or dict-like object to instantiate given
         template file
@@ -173,10 +408,363 @@ def render_to(filepath, context=None, output=None,
         - at_engine: Specify the name of template engine to use explicitly or
           None to find it automatically anyhow.
         - at_cls_args: Arguments passed to instantiate template engine class
+        - at_cache: Reuse the cached template engine object and compiled
+          template objects if True (default)
+        - at_cache_dir: Dir to save cache files such as compiled templates
+          to, to reuse them across processes, or None (default)
         - other keyword arguments passed to the template engine to render
           templates with specific features enabled.
     """
-    res = render(filepath, context=context, **options)
+    res = render_iter(filepath, context=context, **options)
     anytemplate.utils.write_to_output(res, output, at_encoding)
 
+
+def _parse_job(job):
+    """
+    :param job: A template file path or a tuple of (template file path,
+        context, output, options) and the items except for the first one may
+        be omitted
+    :return: A tuple of (template file path, context, output, options)
+
+    >>> _parse_job("a.t")
+    ('a.t', None, None, {})
+    >>> _parse_job(("a.t", {"a": 1}, "a.txt"))
+    ('a.t', {'a': 1}, 'a.txt', {})
+    """
+    if isinstance(job, str):
+        job = (job, )
+
+    job = tuple(job)
+    if not job or len(job) > 4:
+        raise ValueError(f"Invalid job: {job!r}")
+
+    (filepath, context, output, options) = job + (None, ) * (4 - len(job))
+    return (filepath, context, output, options or {})
+
+
+def render_many(jobs, **options):
+    """
+    Render given template files in batch and yield the results one by one.
+
+    Template engines are found and instantiated once for each group of jobs
+    of the same template engine and the same arguments to instantiate it, and
+    shared among them. Jobs are processed lazily in the order given, so that
+    `jobs` may be a generator yields a large number of jobs.
+
+    :param jobs: An iterable yields jobs, template file paths or tuples of
+        (template file path, context, output, options); context, output and
+        options may be omitted. `output` is the file path to write the result
+        to or '-' to print it to stdout as :func:`render_to` does, and
+        `options` is a dict of keyword arguments to render the template
+        overrides `options` given to this function.
+    :param options: Optional keyword arguments common to all jobs, same as
+        :func:`render`'s
+
+    :return: A generator yields the rendered string, or the output if the job
+        has it, of each job
+    """
+    engines = {}
+    for job in jobs:
+        yield _render_one(job, options, engines)
+
+
+def _get_job_engine(filepath, options, engines):
+    """
+    :param filepath: Template file path
+    :param options: A dict of options to render the template
+    :param engines: A dict to keep template engine objects to share among
+        jobs
+    :return: A tuple of (template engine object, options without the ones to
+        find and instantiate it)
+    """
+    options = dict(options)
+    at_engine = options.pop("at_engine", None)
+    at_cls_args = options.pop("at_cls_args", None) or {}
+    at_cache = options.get("at_cache", True)
+
+    ckey = anytemplate.cache.make_key(at_cls_args)
+    key = (at_engine or anytemplate.compat.get_file_extension(filepath),
+           ckey, at_cache)
+    engine = None if ckey is None else engines.get(key)
+    if engine is None:
+        engine = get_engine(find_engine(filepath, at_engine), at_cls_args,
+                            at_cache)
+        if ckey is not None:
+            engines[key] = engine
+
+    return (engine, options)
+
+
+def _render_one(job, options, engines):
+    """
+    Render a job of :func:`render_many`.
+
+    :param job: A job :func:`render_many` takes
+    :param options: Optional keyword arguments common to all jobs
+    :param engines: A dict to keep template engine objects to share among
+        jobs
+    :return: The rendered string or the output if the job has it
+    """
+    (filepath, context, output, opts) = _parse_job(job)
+    (engine, opts) = _get_job_engine(filepath, dict(options, **opts),
+                                     engines)
+    res = _render(filepath=filepath, context=context, _at_engine_obj=engine,
+                  **opts)
+    if output is None:
+        return res
+
+    encoding = opts.get("at_encoding", anytemplate.compat.ENCODING)
+    anytemplate.utils.write_to_output(res, output, encoding)
+    return output
+
+
+def _merge_context(shared, context):
+    """
+    :param shared: Context common to all jobs or None
+    :param context: Context of a job or None
+    :return: The context of the job overrides the common one shallowly
+
+    >>> _merge_context({"a": 1, "b": 1}, {"b": 2})
+    {'a': 1, 'b': 2}
+    >>> _merge_context(None, {"b": 2})
+    {'b': 2}
+    """
+    if shared is None:
+        return context
+
+    if context is None:
+        return shared
+
+    return dict(shared, **context)
+
+
+def _check_outputs(jobs):
+    """
+    :param jobs: An iterable yields jobs same as :func:`render_many` takes
+    :return: A generator yields tuples of (job, error); error is a ValueError
+        object if the output of the job is same as the one of any job before
+        it, not to overwrite the result of it, or None
+    """
+    outputs = set()
+    for job in jobs:
+        error = None
+        try:
+            output = _parse_job(job)[2]
+        except ValueError:
+            output = None  # It's processed in _render_job later.
+
+        if output not in (None, '-'):
+            path = os.path.abspath(output)
+            if path in outputs:
+                error = ValueError(f"Duplicate output: {output}")
+            outputs.add(path)
+
+        yield (job, error)
+
+
+def _render_job(job_and_error, options, context=None, engines=None):
+    """
+    Render a job of :func:`render_parallel`.
+
+    :param job_and_error: A tuple of (job :func:`render_many` takes, error
+        found before rendering it or None)
+    :param options: Optional keyword arguments common to all jobs
+    :param context: Context common to all jobs or None
+    :param engines: A dict to keep template engine objects to share among
+        jobs or None
+    :return: :class:`JobResult` object
+    """
+    (job, error) = job_and_error
+    filepath = output = None
+    try:
+        (filepath, ctx, output, opts) = _parse_job(job)
+        if error is not None:
+            raise error
+
+        # The parent process prints the result to keep the order of results.
+        job = (filepath, _merge_context(context, ctx),
+               None if output == '-' else output, opts)
+        return JobResult(filepath, output,
+                         _render_one(job, options,
+                                     {} if engines is None else engines),
+                         None)
+    except Exception as exc:  # pylint: disable=broad-except
+        try:
+            pickle.dumps(exc)
+        except Exception:  # pylint: disable=broad-except
+            exc = CompileError(repr(exc))
+
+        return JobResult(filepath, output, None, exc)
+
+
+# The options and the context common to all jobs of :func:`render_parallel`
+# in each worker process, sent once on its start.
+_WORKER_ARGS = (None, None)
+
+
+def _init_worker(options, context):
+    """
+    Initialize a worker process of :func:`render_parallel`.
+    """
+    global _WORKER_ARGS  # pylint: disable=global-statement
+    _WORKER_ARGS = (options, context)
+
+
+def _render_worker_job(job_and_error):
+    """
+    Render a job in a worker process of :func:`render_parallel`.
+    """
+    return _render_job(job_and_error, *_WORKER_ARGS)
+
+
+def render_parallel(jobs, processes=None, maxtasksperchild=None,
+                    chunksize=1, context=None, **options):
+    """
+    Render given template files in parallel with a pool of processes.
+
+    The results are yielded in the same order as `jobs` and the errors in
+    each job are returned with its result instead of being raised, so that
+    the other jobs are processed even if some of them failed. Jobs to output
+    to the same file as any job before them fail with ValueError not to
+    overwrite the results.
+
+    :param jobs: An iterable yields jobs same as :func:`render_many` takes;
+        contexts in them must be picklable
+    :param processes: Number of the worker processes or None to use the number
+        of CPUs. Jobs are processed in this process and template engines are
+        shared among them as :func:`render_many` does if it's 1.
+    :param maxtasksperchild: Number of jobs each worker process processes
+        before it's replaced with a new one, or None to keep it alive
+    :param chunksize: Number of jobs sent to a worker process at once
+    :param context: Context common to all jobs or None. It's sent to each
+        worker process only once, and the contexts of jobs override it
+        shallowly if these were given.
+    :param options: Optional keyword arguments common to all jobs, same as
+        :func:`render`'s
+
+    :return: A generator yields :class:`JobResult` objects; the result is the
+        rendered string, or the output if the job has it and it's not '-',
+        and the error is an exception raised or None if it was successful.
+        Results of the jobs to output to '-' are printed to stdout in order.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    args = _check_outputs(jobs)
+    if processes == 1:
+        engines = {}
+        for res in _print_results(_render_job(arg, options, context, engines)
+                                  for arg in args):
+            yield res
+        return
+
+    import multiprocessing
+
+    with multiprocessing.Pool(processes, initializer=_init_worker,
+                              initargs=(options, context),
+                              maxtasksperchild=maxtasksperchild) as pool:
+        for res in _print_results(pool.imap(_render_worker_job, args,
+                                            chunksize)):
+            yield res
+
+
+# Options do not affect the results of rendering.
+_NON_RESULT_OPTIONS = ("at_cache", "at_cache_dir", "at_ask_missing",
+                       "at_executor")
+
+
+def render_incremental(jobs, manifest, processes=1, context=None,
+                       **options):
+    """
+    Render given template files as :func:`render_parallel` does, but only the
+    ones of which outputs are not up-to-date, that is, any of the template
+    files, the files these include, the contexts, the template engines or
+    the options were changed since they were rendered last, as recorded in
+    the dependency manifest file `manifest`.
+
+    Outputs of the template engines cannot find the files templates include,
+    and the outputs to stdout are always rendered.
+
+    :param jobs: An iterable yields jobs same as :func:`render_parallel` takes
+    :param manifest: Path of the dependency manifest file to load the records
+        of outputs from and save them to; see :mod:`anytemplate.deps`
+    :param processes: Number of the worker processes or None; see
+        :func:`render_parallel`
+    :param context: Context common to all jobs or None; see
+        :func:`render_parallel`
+    :param options: Optional keyword arguments common to all jobs, same as
+        :func:`render`'s
+
+    :return: A generator yields :class:`JobResult` objects; the ones of the
+        outputs up-to-date come first as these are skipped, and the rest come
+        in the same order as `jobs`
+    """
+    import anytemplate.deps
+
+    deps = anytemplate.deps.Manifest(manifest)
+    (engines, stale, digests) = ({}, [], {})
+    shared = None if context is None else anytemplate.deps.digest(context)
+    for job in jobs:
+        try:
+            (filepath, ctx, output, opts) = _parse_job(job)
+            if output in (None, '-'):
+                raise ValueError(f"Output is not a file: {output!r}")
+
+            opts = dict(options, **opts)
+            cls_args = opts.get("at_cls_args") or {}
+            (engine, opts) = _get_job_engine(filepath, opts, engines)
+        except (ValueError, TemplateEngineNotFound):
+            stale.append((job, None))  # Let render_parallel process it.
+            continue
+
+        # Jobs share the context object usually, and it may be large.
+        if id(ctx) not in digests:
+            digests[id(ctx)] = (ctx, anytemplate.deps.digest(ctx))
+
+        keys = (anytemplate.deps.digest((shared, digests[id(ctx)][1])),
+                anytemplate.deps.options_digest(
+                    engine.name(),
+                    dict([(k, v) for k, v in opts.items()
+                          if k not in _NON_RESULT_OPTIONS],
+                         at_cls_args=cls_args)
+                ))
+        if deps.is_uptodate(output, *keys):
+            LOGGER.info("Skip %s as it's up-to-date", output)
+            yield JobResult(filepath, output, output, None)
+            continue
+
+        # Stat the inputs before rendering so that the ones changed while
+        # rendering make the output stale.
+        try:
+            inputs = anytemplate.deps.stats(
+                engine.dependencies(filepath, **opts)
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.info("Failed to find the dependencies of %s: %r",
+                        filepath, exc)
+            inputs = None
+        stale.append((job, (inputs, keys)))
+
+    try:
+        results = render_parallel([job for job, _info in stale], processes,
+                                  context=context, **options)
+        for ((_job, info), res) in zip(stale, results):
+            if info is not None and res.error is None:
+                deps.update(res.output, info[0], *info[1])
+            yield res
+    finally:
+        deps.save()
+
+
+def _print_results(results):
+    """
+    Print the results of the jobs to output to stdout and pass them through.
+
+    :param results: An iterable yields :class:`JobResult` objects
+    """
+    for res in results:
+        if res.output == '-' and res.error is None:
+            anytemplate.utils.write_to_output(res.result, '-')
+        yield res
+
 # vim:sw=4:ts=4:et:
@@ -0,0 +1,289 @@
+#
+# Copyright (C) 2015 - 2018 Satoru SATOH <ssato @ redhat.com>
+# License: MIT
+#
+"""
+Benchmark of startup costs of anytemplate.
+
+Run it like 'python -m anytemplate.bench' to see how long it takes to render
+a trivial template in a new process, for each phase of it:
+
+- startup: Start the python interpreter
+- import: Import anytemplate
+- resolve: Find the template engine to render the template
+- load_contexts: Load context files
+- render: Render the template
+- cli: Run anytemplate.cli.main end to end, in wall-clock time
+
+and the costs of modules imported, measured by 'python -X importtime'.
+
+Budgets of these phases in msec can be given with '--budget PHASE=MSEC', e.g.
+'--budget import=50 --budget cli=300', and it exits with non-zero code if any
+of them were exceeded.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import json
+import os.path
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+PHASES = ("startup", "import", "resolve", "load_contexts", "render", "cli")
+
+# Code to run in a new process to measure each phase in it.
+_PROBE = """\
+import sys, time, json
+(tmpl, engine, ctxs) = (sys.argv[1], sys.argv[2] or None, sys.argv[3:])
+times = [time.perf_counter()]
+import anytemplate.api, anytemplate.utils
+times.append(time.perf_counter())
+anytemplate.api.find_engine(tmpl, engine)
+times.append(time.perf_counter())
+ctx = anytemplate.utils.parse_and_load_contexts(ctxs)
+times.append(time.perf_counter())
+anytemplate.api.render(tmpl, ctx, at_engine=engine)
+times.append(time.perf_counter())
+print(json.dumps([(t - s) * 1000 for s, t in zip(times, times[1:])]))
+"""
+
+_IMPORTTIME_RE = re.compile(
+    r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)\s*$"
+)
+
+
+def parse_importtime(output):
+    """
+    Parse the output of 'python -X importtime'.
+
+    :param output: The output string of 'python -X importtime'
+    :return: A list of tuples of (module name, self time in usec, cumulative
+        time in usec, nest level)
+
+    >>> parse_importtime('''import time: self [us] | cumulative | name
+    ... import time:       100 |        100 |   a.b
+    ... import time:        50 |        150 | a''')
+    [('a.b', 100, 100, 1), ('a', 50, 150, 0)]
+    """
+    res = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            (self_us, cum_us, indent, name) = match.groups()
+            res.append((name, int(self_us), int(cum_us),
+                        (len(indent) - 1) // 2))
+    return res
+
+
+def measure_imports(code, python=sys.executable):
+    """
+    Run `code` with 'python -X importtime' and return the import costs.
+
+    :param code: Python code to run
+    :param python: Python interpreter path
+    :return: A list of tuples same as :func:`parse_importtime` returns
+    """
+    proc = subprocess.run([python, "-X", "importtime", "-c", code],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True)
+    return parse_importtime(proc.stderr)
+
+
+def new_imports(before, after):
+    """
+    :param before: Import costs before some step, returned from
+        :func:`measure_imports`
+    :param after: Import costs after that step
+    :return: A list of import costs of the modules imported in that step
+    """
+    names = set(imp[0] for imp in before)
+    return [imp for imp in after if imp[0] not in names]
+
+
+def top_level_cost(imports):
+    """
+    :param imports: A list of tuples same as :func:`parse_importtime` returns
+    :return: The sum of cumulative time of top level imports in usec
+
+    >>> top_level_cost([('a.b', 100, 100, 1), ('a', 50, 150, 0)])
+    150
+    """
+    return sum(imp[2] for imp in imports if imp[3] == 0)
+
+
+def _run(args, **kwargs):
+    """
+    :param args: Command and arguments to run
+    :return: subprocess.CompletedProcess object
+    """
+    return subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True, **kwargs)
+
+
+def _wallclock(args, **kwargs):
+    """
+    :param args: Command and arguments to run
+    :return: Wall-clock time to run it in msec
+    """
+    start = time.perf_counter()
+    _run(args, **kwargs)
+    return (time.perf_counter() - start) * 1000
+
+
+def measure(template, contexts=None, engine=None, python=sys.executable):
+    """
+    Measure the costs of each phase to render given template in new
+    processes.
+
+    :param template: Template file path
+    :param contexts: A list of context file specs
+    :param engine: Template engine name or None
+    :param python: Python interpreter path
+
+    :return: A tuple of (a dict of phase name to msec, a list of import costs
+        same as :func:`parse_importtime` returns)
+    """
+    if contexts is None:
+        contexts = []
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] +
+        [p for p in env.get("PYTHONPATH", '').split(os.pathsep) if p]
+    )
+    res = dict(startup=_wallclock([python, "-c", "pass"], env=env))
+
+    proc = _run([python, "-X", "importtime", "-c", _PROBE, template,
+                 engine or ''] + contexts, env=env)
+    res.update(zip(PHASES[1:-1], json.loads(proc.stdout)))
+
+    cli = [python, "-m", "anytemplate.cli", "-o", os.devnull, template]
+    for ctx in contexts:
+        cli[-1:-1] = ["-C", ctx]
+    if engine:
+        cli[-1:-1] = ["-E", engine]
+    res["cli"] = _wallclock(cli, env=env)
+
+    return (res, parse_importtime(proc.stderr))
+
+
+def measure_n(template, contexts=None, engine=None, repeat=3,
+              python=sys.executable):
+    """
+    Same as :func:`measure` but repeat it `repeat` times and return the
+    median of each phase.
+    """
+    results = [measure(template, contexts, engine, python)
+               for _i in range(repeat)]
+    res = dict((phase, statistics.median(r[0][phase] for r in results))
+               for phase in PHASES)
+    return (res, results[-1][1])
+
+
+def parse_budgets(budgets):
+    """
+    :param budgets: A list of budget specs, 'PHASE=MSEC'
+    :return: A dict of phase name to budget in msec
+
+    >>> parse_budgets(["import=50", "cli=300.5"])
+    {'import': 50.0, 'cli': 300.5}
+    """
+    res = {}
+    for budget in budgets:
+        (phase, msec) = budget.split('=', 1)
+        if phase not in PHASES:
+            raise ValueError(f"Unknown phase: {phase}")
+        res[phase] = float(msec)
+
+    return res
+
+
+def check_budgets(results, budgets):
+    """
+    :param results: A dict of phase name to msec
+    :param budgets: A dict of phase name to budget in msec
+    :return: A list of (phase, msec, budget) exceeded its budget
+
+    >>> check_budgets({"import": 60.0}, {"import": 50.0})
+    [('import', 60.0, 50.0)]
+    """
+    return [(phase, results[phase], budget) for phase, budget
+            in budgets.items() if results[phase] > budget]
+
+
+def option_parser():
+    """
+    :return: Option parsing object :: argparse.ArgumentParser
+    """
+    psr = argparse.ArgumentParser(prog="python -m anytemplate.bench")
+    psr.add_argument("template", nargs="?",
+                     help="Template file path to render; a trivial "
+                          "string.Template template and a JSON context file "
+                          "are used if not given")
+    psr.add_argument("-C", "--context", action="append", dest="contexts",
+                     default=[], help="Context file spec same as the CLI's")
+    psr.add_argument("-E", "--engine", help="Template engine name")
+    psr.add_argument("-r", "--repeat", type=int, default=3,
+                     help="Times to repeat measurements [%(default)s]")
+    psr.add_argument("-b", "--budget", action="append", dest="budgets",
+                     default=[],
+                     help="Budget of a phase in msec, 'PHASE=MSEC'; phase is "
+                          f"one of {', '.join(PHASES)}")
+    psr.add_argument("-n", "--top", type=int, default=10,
+                     help="Number of the most expensive modules to show "
+                          "[%(default)s]")
+    return psr
+
+
+def main(argv=None):
+    """
+    Entrypoint.
+    """
+    psr = option_parser()
+    args = psr.parse_args(sys.argv[1:] if argv is None else argv)
+    try:
+        budgets = parse_budgets(args.budgets)
+    except ValueError as exc:
+        psr.error(str(exc))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.template is None:
+            args.template = os.path.join(workdir, "bench.tmpl")
+            args.engine = args.engine or "string.Template"
+            with open(args.template, 'w') as out:
+                out.write("$a\n")
+
+            if not args.contexts:
+                args.contexts = [os.path.join(workdir, "bench.json")]
+                with open(args.contexts[0], 'w') as out:
+                    json.dump(dict(a="aaa"), out)
+
+        (res, imports) = measure_n(args.template, args.contexts,
+                                   args.engine, args.repeat)
+
+    for phase in PHASES:
+        print(f"{phase}: {res[phase]:.1f} ms")
+
+    print("Most expensive imports (self, cumulative):")
+    for imp in sorted(imports, key=lambda i: i[1], reverse=True)[:args.top]:
+        print(f"  {imp[0]}: {imp[1] / 1000.0:.1f} ms, "
+              f"{imp[2] / 1000.0:.1f} ms")
+
+    exceeded = check_budgets(res, budgets)
+    for phase, msec, budget in exceeded:
+        print(f"FAIL: {phase} took {msec:.1f} ms > {budget:.1f} ms",
+              file=sys.stderr)
+
+    return 1 if exceeded else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# vim:sw=4:ts=4:et:
@@ -0,0 +1,163 @@
+#
+# Copyright (C) 2015 - 2018 Satoru SATOH <ssato @ redhat.com>
+# License: MIT
+#
+"""anytemplate.cache - in-process caches shared by anytemplate modules.
+"""
+from __future__ import absolute_import
+
+import collections
+import threading
+
+
+_CACHES = []
+
+
+def make_key(obj):
+    """
+    Make a hashable and canonicalized key from given object `obj`.
+
+    Containers are tagged with their types not to make the same key from
+    different objects, e.g. {"k": 1} and [("k", 1)].
+
+    :param obj: A dict, list, tuple, set or any other hashable object
+    :return: A hashable object or None if `obj` cannot be made hashable
+
+    >>> make_key(dict(b=[1, 2], a=1))
+    ('d', (('a', 1), ('b', ('l', (1, 2)))))
+    >>> make_key(dict(a={}))
+    ('d', (('a', ('d', ())),))
+    >>> make_key({"x": {"k": 1}}) == make_key({"x": [("k", 1)]})
+    False
+    >>> len(set(make_key(o) for o in ({}, [], (), set())))
+    4
+    >>> make_key([bytearray()]) is None
+    True
+    """
+    try:
+        key = _make_key(obj)
+        hash(key)
+    except TypeError:
+        return None
+
+    return key
+
+
+def _make_key(obj):
+    """
+    :param obj: Any object
+    """
+    if isinstance(obj, dict):
+        return ('d', tuple(sorted((k, _make_key(v)) for k, v in obj.items())))
+
+    if isinstance(obj, list):
+        return ('l', tuple(_make_key(v) for v in obj))
+
+    if isinstance(obj, tuple):
+        return ('t', tuple(_make_key(v) for v in obj))
+
+    if isinstance(obj, (set, frozenset)):
+        return ('s', frozenset(_make_key(v) for v in obj))
+
+    return obj
+
+
+class LRUCache(object):
+    """
+    Bounded and thread-safe mapping object discards the least recently used
+    items first.
+
+    >>> cache = LRUCache(2)
+    >>> cache.set("a", 1)
+    >>> cache.set("b", 2)
+    >>> cache.get("a")
+    1
+    >>> cache.set("c", 3)
+    >>> cache.get("b") is None
+    True
+    """
+    def __init__(self, maxsize=128):
+        """
+        :param maxsize: Maximum number of items to keep
+        """
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """
+        :param key: Key of the item to get
+        :param default: Default value returned if no item of `key` was found
+        """
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                return self._data[key]
+            except KeyError:
+                return default
+
+    def set(self, key, value):
+        """
+        :param key: Key of the item to set
+        :param value: Value of the item to set
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, factory):
+        """
+        Get the item of `key` or make it with `factory` and set it if missing.
+        `factory` is called without the lock held and may be called more than
+        once for the same key in race conditions, so it must not have side
+        effects.
+
+        :param key: Key of the item to get
+        :param factory: A callable takes no arguments to make the item
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+
+        return value
+
+    def clear(self):
+        """Remove all items.
+        """
+        with self._lock:
+            self._data.clear()
+
+
+_MISSING = object()
+
+
+def make_cache(maxsize=128):
+    """
+    Make a :class:`LRUCache` object and register it to clear with
+    :func:`clear_caches` later.
+
+    :param maxsize: Maximum number of items to keep
+    """
+    cache = LRUCache(maxsize)
+    _CACHES.append(cache)
+
+    return cache
+
+
+def clear_caches():
+    """
+    Clear all caches made by :func:`make_cache`.
+    """
+    for cache in _CACHES:
+        cache.clear()
+
+# vim:sw=4:ts=4:et:
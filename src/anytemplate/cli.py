@@ -9,7 +9,10 @@ from __future__ import absolute_import
 from __future__ import print_function
 
 import argparse
+import json
 import logging
+import os
+import os.path
 import sys
 
 import anytemplate.api
@@ -25,13 +28,24 @@ def option_parser():
     :return: Option parsing object :: optparse.OptionParser
     """
     defaults = dict(template_paths=[], contexts=[], schema=None, output='-',
-                    engine=None, list_engines=False, verbose=1)
+                    engine=None, list_engines=False, jobs=1, cache_dir=None,
+                    lazy_contexts=False, validate_merged=False, batch=None,
+                    connect=None, incremental=None, verbose=1)
 
     psr = argparse.ArgumentParser()
     psr.set_defaults(**defaults)
 
-    psr.add_argument("template", type=str, nargs="?",
-                     help="Template file path")
+    psr.add_argument("templates", type=str, nargs="*", metavar="template",
+                     help="Template file path[s]")
+    psr.add_argument("--batch", metavar="MANIFEST",
+                     help="Render the templates listed in the manifest file "
+                          "of JSON, YAML or NDJSON ('.ndjson' or '.jsonl') "
+                          "in a process. Each entry of it is a template file "
+                          "path or a mapping has 'template' and optionally "
+                          "'output', 'context' (a mapping overrides the "
+                          "top-level keys of contexts) and 'engine'. It "
+                          "reads a NUL-separated list of template file paths "
+                          "from stdin if MANIFEST is '-'.")
     psr.add_argument("-T", "--template-path", action="append",
                      dest="template_paths",
                      help="Template search path can be specified multiple "
@@ -48,12 +62,47 @@ def option_parser():
     psr.add_argument("-s", "--schema",
                      help="JSON schema file in any formats anyconfig "
                           "supports, to validate context files")
+    psr.add_argument("--validate-merged", action="store_true",
+                     help="Validate the merged context only once with the "
+                          "schema instead of each context file")
     psr.add_argument("-E", "--engine",
                      help="Specify template engine name such as 'jinja2'")
     psr.add_argument("-L", "--list-engines", action="store_true",
                      help="List supported template engines in your "
                           "environment")
-    psr.add_argument("-o", "--output", help="Output filename [stdout]")
+    psr.add_argument("-o", "--output",
+                     help="Output filename [stdout]. It's the output dir if "
+                          "multiple templates or --batch were given, and the "
+                          "results are written to the files of which names "
+                          "are the template file names without the last "
+                          "extensions, or to stdout if it's '-'.")
+    psr.add_argument("-j", "--jobs", type=parse_jobs,
+                     help="Number of processes to load context files and "
+                          "render templates in parallel or 'auto' to use "
+                          "the number of CPUs [%(default)s]")
+    psr.add_argument("--cache-dir",
+                     help="Dir to save cache files such as compiled "
+                          "templates and parsed context files to, to reuse "
+                          "them in later runs")
+    psr.add_argument("--resolver-ttl", type=float, metavar="SECS",
+                     help="Seconds to skip checks if the template search "
+                          "dirs were changed after the last check, useful "
+                          "with many templates or --connect [0]")
+    psr.add_argument("--lazy-contexts", action="store_true",
+                     help="Load context files on the first access to "
+                          "contexts, not before templates are found and "
+                          "loaded")
+    psr.add_argument("--incremental", metavar="MANIFEST",
+                     help="Render only the templates of which outputs are "
+                          "not up-to-date, that is, any of the template "
+                          "files, the files these include, the contexts or "
+                          "the options were changed since the last run, as "
+                          "recorded in the dependency manifest file MANIFEST")
+    psr.add_argument("--connect", metavar="SOCK",
+                     help="Run in the daemon started with 'serve SOCK' "
+                          "listens on the Unix domain socket SOCK, to reuse "
+                          "the template engines and the contexts loaded in "
+                          "it")
     psr.add_argument("-v", "--verbose", action="store_const", const=0,
                      help="Verbose mode")
     psr.add_argument("-q", "--quiet", action="store_const", const=2,
@@ -61,6 +110,186 @@ def option_parser():
     return psr
 
 
+def parse_jobs(jobs):
+    """
+    :param jobs: Number of processes or 'auto'
+    :return: Number of processes or None means the number of CPUs
+
+    >>> parse_jobs("auto") is None
+    True
+    >>> parse_jobs("4")
+    4
+    """
+    if jobs == "auto":
+        return None
+
+    try:
+        res = int(jobs)
+    except ValueError:
+        res = 0
+
+    if res < 1:
+        raise argparse.ArgumentTypeError(f"Invalid number of jobs: {jobs}")
+
+    return res
+
+
+def mk_output_path(template, outdir):
+    """
+    :param template: Template file path
+    :param outdir: Output dir or '-' means stdout
+
+    >>> mk_output_path("/a/b/c.conf.j2", "/tmp/out")
+    '/tmp/out/c.conf'
+    >>> mk_output_path("/a/b/c", "/tmp/out")
+    '/tmp/out/c'
+    >>> mk_output_path("/a/b/c.j2", "-")
+    '-'
+    """
+    if outdir == '-':
+        return outdir
+
+    return os.path.join(outdir,
+                        os.path.splitext(os.path.basename(template))[0])
+
+
+def load_manifest(manifest, istream=None):
+    """
+    Load the manifest of templates to render in batch.
+
+    :param manifest: Manifest file path or '-' to read a NUL-separated list of
+        template file paths from `istream`
+    :param istream: Input stream to read the list from or None (stdin)
+    :return: A list of the entries in the manifest
+
+    >>> import io
+    >>> load_manifest('-', io.StringIO("a.j2\\0b.j2\\0"))
+    ['a.j2', 'b.j2']
+    """
+    if manifest == '-':
+        istream = sys.stdin if istream is None else istream
+        return [path for path in istream.read().split('\0') if path.strip()]
+
+    if os.path.splitext(manifest)[-1] in (".ndjson", ".jsonl"):
+        with open(manifest) as inp:
+            return [json.loads(line) for line in inp if line.strip()]
+
+    entries = anytemplate.utils.load_context(manifest, None)
+    if not isinstance(entries, list):
+        raise ValueError(f"Manifest must be a list: {manifest}")
+
+    return entries
+
+
+def mk_batch_job(entry, outdir):
+    """
+    :param entry: An entry of the manifest
+    :param outdir: Output dir or '-' means stdout
+    :return: A job :func:`anytemplate.api.render_parallel` takes; the context
+        of it overrides the common one if it's not None
+
+    >>> mk_batch_job("a/b.j2", "out")
+    ('a/b.j2', None, 'out/b', {})
+    >>> mk_batch_job(dict(template="a.j2", output="-", context=dict(b=2),
+    ...                   engine="jinja2"), "out")
+    ('a.j2', {'b': 2}, '-', {'at_engine': 'jinja2'})
+    """
+    if isinstance(entry, str):
+        entry = dict(template=entry)
+
+    if not isinstance(entry, dict) or not entry.get("template"):
+        raise ValueError(f"Invalid entry: {entry!r}")
+
+    tmpl = entry["template"]
+    output = entry.get("output") or mk_output_path(tmpl, outdir)
+    ctx = entry.get("context") or None
+
+    opts = dict(at_engine=entry["engine"]) if entry.get("engine") else {}
+    return (tmpl, ctx, output, opts)
+
+
+def split_duplicate_outputs(jobs):
+    """
+    :param jobs: A list of tuples of (entry, job)
+    :return: A tuple of (a list of the tuples of which outputs are unique,
+        a list of tuples of (entry, error) of the rest)
+
+    >>> (jobs, dups) = split_duplicate_outputs(
+    ...     [("a", ("a/x.t", None, "x", {})), ("b", ("b/x.t", None, "x", {})),
+    ...      ("c", ("c.t", None, "c", {}))]
+    ... )
+    >>> jobs
+    [('c', ('c.t', None, 'c', {}))]
+    >>> [entry for entry, _err in dups]
+    ["'a'", "'b'"]
+    """
+    entries = {}
+    for entry, job in jobs:
+        if job[2] != '-':
+            entries.setdefault(os.path.abspath(job[2]), []).append(entry)
+
+    (res, dups) = ([], [])
+    for entry, job in jobs:
+        others = [] if job[2] == '-' else entries[os.path.abspath(job[2])]
+        if len(others) > 1:
+            dups.append((repr(entry), ValueError(
+                f"Duplicate output {job[2]} of the entries: "
+                f"{', '.join(repr(e) for e in others)}"
+            )))
+        else:
+            res.append((entry, job))
+
+    return (res, dups)
+
+
+def render_templates(args, ctx, entries=None):
+    """
+    Render multiple templates in parallel if needed.
+
+    :param args: Parsed arguments :: argparse.Namespace
+    :param ctx: Context to render templates with
+    :param entries: A list of the entries of the manifest of templates to
+        render or None to render `args.templates`
+    :return: Number of templates failed to render
+    """
+    if entries is None:
+        entries = args.templates
+
+    failures = []
+    jobs = []
+    for entry in entries:
+        try:
+            jobs.append((entry, mk_batch_job(entry, args.output)))
+        except (ValueError, TypeError) as exc:
+            LOGGER.error("%s", exc)
+            failures.append((repr(entry), exc))
+
+    (jobs, dups) = split_duplicate_outputs(jobs)
+    failures.extend(dups)
+    jobs = [job for _entry, job in jobs]
+
+    # The context is sent to each worker process once.
+    options = dict(context=ctx, at_paths=args.template_paths,
+                   at_engine=args.engine, at_cache_dir=args.cache_dir)
+    if args.incremental:
+        results = anytemplate.api.render_incremental(
+            jobs, args.incremental, args.jobs, **options
+        )
+    else:
+        results = anytemplate.api.render_parallel(jobs, args.jobs, **options)
+    for res in results:
+        if res.error is not None:
+            LOGGER.error("Failed to render %s: %s", res.filepath, res.error)
+            failures.append((res.filepath, res.error))
+
+    if failures:
+        print(f"{len(failures)} of {len(entries)} templates failed to "
+              "render:", file=sys.stderr)
+        for path, err in failures:
+            print(f"  {path}: {err}", file=sys.stderr)
+    return len(failures)
+
+
 def get_loglevel(level):
     """
     Set log level.
@@ -74,37 +303,92 @@ def get_loglevel(level):
         return logging.INFO
 
 
-def main(argv=None):
-    """
-    Entrypoint.
+def run(argv, load_contexts=None, allow_connect=True):
     """
-    if argv is None:
-        argv = sys.argv
+    Run the CLI with given arguments.
 
+    :param argv: A list of arguments without the program name
+    :param load_contexts: A callable same as
+        :func:`anytemplate.utils.parse_and_load_contexts` to load contexts or
+        None to use it
+    :param allow_connect: Run in the daemon if '--connect' was given and it's
+        True; the daemon runs the CLI with False not to connect to itself
+    :return: Exit code
+    """
     psr = option_parser()
-    args = psr.parse_args(argv[1:])
+    try:
+        args = psr.parse_args(argv)
+    except SystemExit as exc:
+        return exc.code
+
+    if args.connect and allow_connect:
+        import anytemplate.client as client
+
+        return client.run(args.connect, argv)
 
-    if not args.template:
+    if not args.templates and not args.batch:
         if args.list_engines:
             ecs = anytemplate.api.list_engines()
             print(", ".join(f"{e.name()} ({e.priority()})" for e in ecs))
-            sys.exit(0)
-        else:
-            psr.print_usage()
-            sys.exit(1)
+            return 0
+
+        psr.print_usage()
+        return 1
 
     LOGGER.setLevel(get_loglevel(args.verbose))
+    if args.resolver_ttl is not None:
+        anytemplate.api.set_resolver_ttl(args.resolver_ttl)
 
     ctx = {}
 
     if args.contexts:
         LOGGER.info("Loading contexts: %r ...", args.contexts[:3])
-        ctx = anytemplate.utils.parse_and_load_contexts(args.contexts,
-                                                        args.schema)
-    anytemplate.api.render_to(args.template, ctx, args.output,
+        if args.lazy_contexts:
+            load = anytemplate.utils.LazyContext
+        else:
+            load = load_contexts or anytemplate.utils.parse_and_load_contexts
+
+        ctx = load(args.contexts, args.schema, workers=args.jobs,
+                   cache_dir=args.cache_dir,
+                   validate_merged=args.validate_merged)
+    if args.batch:
+        try:
+            entries = load_manifest(args.batch) + args.templates
+        except (OSError, ValueError) as exc:
+            print(f"Failed to load the manifest {args.batch}: {exc}",
+                  file=sys.stderr)
+            return 1
+
+        return 1 if render_templates(args, ctx, entries) else 0
+
+    if len(args.templates) > 1:
+        return 1 if render_templates(args, ctx) else 0
+
+    if args.incremental:
+        entries = [dict(template=args.templates[0], output=args.output)]
+        return 1 if render_templates(args, ctx, entries) else 0
+
+    anytemplate.api.render_to(args.templates[0], ctx, args.output,
                               at_paths=args.template_paths,
-                              at_engine=args.engine, at_ask_missing=True)
-    sys.exit(0)
+                              at_engine=args.engine, at_ask_missing=True,
+                              at_cache_dir=args.cache_dir)
+    return 0
+
+
+def main(argv=None):
+    """
+    Entrypoint. It runs the daemon, see :mod:`anytemplate.server`, if the
+    first argument is 'serve'.
+    """
+    if argv is None:
+        argv = sys.argv
+
+    if argv[1:2] == ["serve"]:
+        import anytemplate.server as server
+
+        sys.exit(server.main(argv[2:]))
+
+    sys.exit(run(argv[1:]))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,219 @@
+#
+# Copyright (C) 2015 - 2018 Satoru SATOH <ssato @ redhat.com>
+# License: MIT
+#
+"""anytemplate.client - Thin client of :mod:`anytemplate.server`.
+
+This module only depends on the standard modules cheap to import, not on the
+other modules of anytemplate, and :func:`main`, the entrypoint of the CLI,
+runs the CLI in the daemon without importing them if '--connect SOCK' was
+given, so that the client starts as quickly as possible.
+
+Clients and the daemon exchange frames; each frame is a type byte, the length
+of its payload in 4 bytes (big endian) and the payload:
+
+- 'A': Request from the client, JSON of a dict has 'argv', 'cwd' and 'stdin'
+- 'O' and 'E': Chunks of stdout and stderr of the CLI sent to the client
+- 'X': Exit code of the CLI, the last frame sent to the client
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+
+import json
+import os
+import socket
+import struct
+import sys
+
+
+ARGS = b'A'
+STDOUT = b'O'
+STDERR = b'E'
+EXIT = b'X'
+
+_HEADER = struct.Struct("!cI")
+
+# Options of the CLI take values, see :func:`anytemplate.cli.option_parser`.
+OPTIONS_WITH_VALUE = ("-T", "--template-path", "-C", "--context", "-s",
+                      "--schema", "-E", "--engine", "-o", "--output", "-j",
+                      "--jobs", "--cache-dir", "--resolver-ttl", "--batch",
+                      "--incremental", "--connect")
+
+# Options of the CLI take values may be '-' to read stdin.
+_STDIN_OPTIONS = ("-C", "--context", "--batch")
+
+
+def send_frame(sock, kind, payload=b''):
+    """
+    :param sock: Socket object
+    :param kind: Type of the frame, one of ARGS, STDOUT, STDERR and EXIT
+    :param payload: Payload bytes
+    """
+    sock.sendall(_HEADER.pack(kind, len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    """
+    :param sock: Socket object
+    :param size: Number of bytes to receive
+    :return: Received bytes or None if the connection was closed
+    """
+    buf = bytearray()
+    while len(buf) < size:
+        data = sock.recv(size - len(buf))
+        if not data:
+            return None
+        buf += data
+
+    return bytes(buf)
+
+
+def recv_frame(sock):
+    """
+    :param sock: Socket object
+    :return: A tuple of (type, payload) of the frame or (None, b'') if the
+        connection was closed
+    """
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return (None, b'')
+
+    (kind, size) = _HEADER.unpack(header)
+    payload = _recv_exactly(sock, size) if size else b''
+    if payload is None:
+        return (None, b'')
+
+    return (kind, payload)
+
+
+def _parse_options(argv):
+    """
+    Parse the options of the CLI roughly, without abbreviations of them.
+
+    :param argv: A list of arguments of the CLI without the program name
+    :return: A list of tuples of (option or None for positional arguments,
+        value)
+
+    >>> _parse_options(["-C", "a.yml", "--output=-", "-Cjson:-", "-v", "a.t"])
+    [('-C', 'a.yml'), ('--output', '-'), ('-C', 'json:-'), ('-v', None), \
+(None, 'a.t')]
+    """
+    res = []
+    itr = iter(argv)
+    for arg in itr:
+        if not arg.startswith('-') or arg == '-':
+            res.append((None, arg))
+        elif arg.startswith("--") and '=' in arg:
+            res.append(tuple(arg.split('=', 1)))
+        elif arg in OPTIONS_WITH_VALUE:
+            res.append((arg, next(itr, None)))
+        elif not arg.startswith("--") and arg[:2] in OPTIONS_WITH_VALUE:
+            res.append((arg[:2], arg[2:]))
+        else:
+            res.append((arg, None))
+
+    return res
+
+
+def reads_stdin(argv):
+    """
+    :param argv: A list of arguments of the CLI without the program name
+    :return: True if the CLI reads stdin
+
+    >>> reads_stdin(["-o", "-", "a.t"])
+    False
+    >>> reads_stdin(["-C", "yaml:-", "a.t"])
+    True
+    >>> reads_stdin(["-"])
+    True
+    """
+    return any(val is not None and (val == '-' or val.endswith(":-"))
+               for opt, val in _parse_options(argv)
+               if opt is None or opt in _STDIN_OPTIONS)
+
+
+def find_socket(argv):
+    """
+    :param argv: A list of arguments of the CLI without the program name
+    :return: The path of the socket given with '--connect' or None
+
+    >>> find_socket(["--connect", "a.sock", "a.t"])
+    'a.sock'
+    >>> find_socket(["-o", "--connect", "a.t"]) is None
+    True
+    """
+    socks = [val for opt, val in _parse_options(argv) if opt == "--connect"]
+    return socks[-1] if socks else None
+
+
+def connect(path, argv, stdin=None, stdout=None, stderr=None):
+    """
+    Run the CLI with `argv` in the daemon listens on `path` and write the
+    outputs of it to `stdout` and `stderr` as these come.
+
+    :param path: Path of the Unix domain socket
+    :param argv: A list of arguments of the CLI without the program name
+    :param stdin: Input string forwarded to the daemon or None
+    :param stdout: Stream to write stdout of the CLI to or None (sys.stdout)
+    :param stderr: Stream to write stderr of the CLI to or None (sys.stderr)
+    :return: Exit code
+    :throw: OSError if it failed to connect to the daemon
+    """
+    streams = {STDOUT: stdout or sys.stdout, STDERR: stderr or sys.stderr}
+    req = dict(argv=argv, cwd=os.getcwd(), stdin=stdin)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with sock:
+        sock.connect(path)
+        send_frame(sock, ARGS, json.dumps(req).encode("utf-8"))
+        while True:
+            (kind, payload) = recv_frame(sock)
+            if kind is None:
+                raise OSError(f"The connection to {path} was closed")
+
+            if kind == EXIT:
+                return int(payload)
+
+            if kind in streams:
+                streams[kind].write(payload.decode("utf-8", "surrogateescape"))
+                streams[kind].flush()
+
+
+def run(path, argv):
+    """
+    Run the CLI with `argv` in the daemon listens on `path`, with stdin
+    forwarded to it if needed.
+
+    :param path: Path of the Unix domain socket
+    :param argv: A list of arguments of the CLI without the program name
+    :return: Exit code
+    """
+    stdin = sys.stdin.read() if reads_stdin(argv) else None
+    try:
+        return connect(path, argv, stdin)
+    except OSError as exc:
+        print(f"Failed to connect to {path}: {exc}", file=sys.stderr)
+        return 1
+
+
+def main(argv=None):
+    """
+    Entrypoint of the CLI. It runs the CLI in the daemon if '--connect SOCK'
+    was given, or :func:`anytemplate.cli.main` otherwise.
+    """
+    if argv is None:
+        argv = sys.argv
+
+    path = find_socket(argv[1:])
+    if path is None:
+        import anytemplate.cli
+
+        anytemplate.cli.main(argv)
+    else:
+        sys.exit(run(path, argv[1:]))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
+
+# vim:sw=4:ts=4:et:
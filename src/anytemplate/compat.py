@@ -71,6 +71,23 @@ def get_file_extension(filepath):
     return ''
 
 
+def entry_points(group):
+    """
+    Get a list of entry points of given group.
+
+    :param group: Entry points group name
+    """
+    try:
+        import importlib.metadata as metadata
+    except ImportError:  # python < 3.8
+        return []
+
+    try:
+        return list(metadata.entry_points(group=group))
+    except TypeError:  # python < 3.10
+        return list(metadata.entry_points().get(group, []))
+
+
 def merge(dic, diff):
     """
     Merge mapping objects.
@@ -0,0 +1,215 @@
+#
+# Copyright (C) 2015 - 2018 Satoru SATOH <ssato @ redhat.com>
+# License: MIT
+#
+"""anytemplate.deps - Dependency manifest of outputs for incremental builds.
+
+The manifest is a JSON file keeps the records of the outputs rendered, keyed
+by their absolute paths. Each record has:
+
+- inputs: A dict of the files and the dirs the template depends on, the
+  template file itself and the files it includes, to their stats
+- context: The digest of the context the template was rendered with
+- options: The digest of the template engine and the options
+- output: The stat of the output
+
+and the stat of a file or a dir is a list of [size, mtime in nsec, digest of
+the content, or the names in the dir]. Files are only hashed if their sizes or
+mtimes were changed, so that touching them does not make outputs stale.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import json
+import logging
+import os
+import os.path
+import pickle
+import threading
+
+import anytemplate.cache
+
+
+LOGGER = logging.getLogger(__name__)
+
+VERSION = 1
+
+
+def digest(obj):
+    """
+    :param obj: Any picklable object such as contexts
+    :return: The sha1 digest of `obj` or None if it's not picklable
+
+    >>> digest({"a": 1}) == digest({"a": 1})
+    True
+    >>> digest(lambda: 1) is None
+    True
+    """
+    try:
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return None
+
+    return hashlib.sha1(data).hexdigest()
+
+
+def options_digest(engine, options):
+    """
+    :param engine: Template engine name
+    :param options: A dict of the options to render the template with
+    :return: The sha1 digest of them or None
+    """
+    key = anytemplate.cache.make_key(options)
+    if key is None:
+        return None
+
+    return hashlib.sha1(repr((engine, key)).encode("utf-8")).hexdigest()
+
+
+def _content_digest(path):
+    """
+    :param path: File or dir path
+    :return: The sha1 digest of the content of the file or the names in the
+        dir
+    :throw: OSError
+    """
+    sha1 = hashlib.sha1()
+    if os.path.isdir(path):
+        sha1.update("\0".join(sorted(os.listdir(path))).encode("utf-8",
+                                                               "replace"))
+    else:
+        with open(path, "rb") as inp:
+            for chunk in iter(lambda: inp.read(65536), b''):
+                sha1.update(chunk)
+
+    return sha1.hexdigest()
+
+
+def stat(path):
+    """
+    :param path: File or dir path
+    :return: A list of [size, mtime in nsec, digest of the content]
+    :throw: OSError
+    """
+    res = os.stat(path)
+    return [res.st_size, res.st_mtime_ns, _content_digest(path)]
+
+
+def stats(paths):
+    """
+    :param paths: A list of the files and the dirs or None
+    :return: A dict of their absolute paths to their stats, or None if
+        `paths` is None or any of them cannot be stat-ed
+    """
+    if paths is None:
+        return None
+
+    try:
+        return dict((os.path.abspath(p), stat(p)) for p in paths)
+    except OSError as exc:
+        LOGGER.debug("Failed to stat the inputs: %r", exc)
+        return None
+
+
+class Manifest(object):
+    """
+    Dependency manifest of outputs.
+    """
+    def __init__(self, path):
+        """
+        :param path: Manifest file path; it's empty if it does not exist or
+            it's not valid
+        """
+        self.path = path
+        self._outputs = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path) as inp:
+                data = json.load(inp)
+            if data.get("version") == VERSION:
+                self._outputs = data["outputs"]
+        except (OSError, ValueError, KeyError, AttributeError) as exc:
+            LOGGER.debug("Ignored the manifest %s: %r", path, exc)
+
+    def _is_same(self, path, old):
+        """
+        :param path: File or dir path
+        :param old: The stat of `path` recorded, which is updated if only the
+            size or mtime of it were changed
+        :return: True if the content of `path` is same as recorded
+        """
+        try:
+            res = os.stat(path)
+            if [res.st_size, res.st_mtime_ns] == old[:2]:
+                return True
+
+            if _content_digest(path) != old[2]:
+                return False
+        except (OSError, TypeError, IndexError):
+            return False
+
+        old[:2] = [res.st_size, res.st_mtime_ns]
+        return True
+
+    def is_uptodate(self, output, context, options):
+        """
+        :param output: Output file path
+        :param context: The digest of the context
+        :param options: The digest of the template engine and the options
+        :return: True if the output is up-to-date and need not be rendered
+        """
+        rec = self._outputs.get(os.path.abspath(output))
+        if not rec or context is None or options is None:
+            return False
+
+        if rec.get("context") != context or rec.get("options") != options:
+            return False
+
+        inputs = rec.get("inputs")
+        if not isinstance(inputs, dict):
+            return False
+
+        return (all(self._is_same(path, old) for path, old in inputs.items())
+                and self._is_same(os.path.abspath(output), rec.get("output")))
+
+    def update(self, output, inputs, context, options):
+        """
+        Record the output rendered.
+
+        :param output: Output file path
+        :param inputs: The stats of the files and the dirs the template
+            depends on by :func:`stats`, taken before it was rendered so that
+            the ones changed while rendering make the output stale, or None
+            if these are not known
+        :param context: The digest of the context
+        :param options: The digest of the template engine and the options
+        """
+        output = os.path.abspath(output)
+        try:
+            rec = dict(context=context, options=options, output=stat(output),
+                       inputs=inputs)
+        except OSError as exc:
+            LOGGER.debug("Failed to record %s: %r", output, exc)
+            rec = None
+
+        with self._lock:
+            if rec is None:
+                self._outputs.pop(output, None)
+            else:
+                self._outputs[output] = rec
+
+    def save(self):
+        """
+        Save the manifest atomically.
+        """
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        outdir = os.path.dirname(self.path)
+        if outdir:
+            os.makedirs(outdir, exist_ok=True)
+
+        with self._lock:
+            with open(tmp, 'w') as out:
+                json.dump(dict(version=VERSION, outputs=self._outputs), out)
+        os.replace(tmp, self.path)
+
+# vim:sw=4:ts=4:et:
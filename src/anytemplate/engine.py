@@ -3,75 +3,351 @@
 # License: MIT
 #
 """A module to consolidate access to template engine backends.
+
+Template engines are registered as :class:`EngineSpec` objects keep their
+metadata such as names, file extensions and priorities, and the modules of
+them are not imported until these are actually needed. The specs of the
+built-in engines are the only source of their metadata, and the engine
+classes take it from them with :func:`builtin_spec`.
+
+Third-party template engines can be registered through the entry points of
+the group 'anytemplate.engines'; the name of each entry point is the engine
+name and the object it refers to is the template engine class, e.g. in
+setup.cfg::
+
+    [options.entry_points]
+    anytemplate.engines =
+        foo = foo_anytemplate.engine:Engine
 """
 from __future__ import absolute_import
 
+import importlib
+import importlib.util
 import operator
 
 from anytemplate.globals import LOGGER
+from anytemplate.engines.base import get_file_extension
+
+import anytemplate.compat
+
+
+ENTRY_POINTS_GROUP = "anytemplate.engines"
+
+
+class EngineSpec(object):
+    """
+    Metadata of a template engine to load the class of it lazily.
+    """
+    def __init__(self, name, modname=None, file_extensions=None, priority=99,
+                 requires=None, loader=None):
+        """
+        :param name: Template engine name
+        :param modname: Name of the module provides the class 'Engine'
+        :param file_extensions: File extensions the engine can process or
+            None if these are not known until the engine class is loaded
+        :param priority: Priority of the engine from 0 to 99
+        :param requires: Name of the module the engine depends on, to check
+            its availability without importing it
+        :param loader: A callable takes no arguments and returns the template
+            engine class, used instead of importing `modname`
+        """
+        self.name = name
+        self.modname = modname
+        self.file_extensions = file_extensions
+        self.priority = priority
+        self.requires = requires
+        self.loader = loader
+        self._engine = None
+        self._loaded = False
+
+    def __repr__(self):
+        return f"<EngineSpec name={self.name!r}>"
+
+    def is_available(self):
+        """
+        :return: True if the module the engine depends on looks available
+        """
+        if self.requires is None:
+            return True
+
+        try:
+            return importlib.util.find_spec(self.requires) is not None
+        except (ImportError, ValueError):
+            return False
+
+    def load(self):
+        """
+        Load the template engine class.
+
+        :return: Template engine class or None if it's not available
+        """
+        if not self._loaded:
+            self._engine = self._load()
+            self._loaded = True
+
+        return self._engine
+
+    def _load(self):
+        """
+        Load the template engine class actually.
+        """
+        if not self.is_available():
+            LOGGER.info("%s support was disabled as needed module looks "
+                        "missing", self.name)
+            return None
+
+        try:
+            if self.loader is not None:
+                return self.loader()
+
+            return importlib.import_module(self.modname).Engine
+        except ImportError:
+            LOGGER.info("%s support was disabled as needed module looks "
+                        "missing", self.name)
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.warning("Failed to load %s: %r", self.name, exc)
+
+        return None
+
+
+def _spec_from_engine(engine):
+    """
+    :param engine: Template engine class
+    """
+    return EngineSpec(engine.name(), file_extensions=engine.file_extensions(),
+                      priority=engine.priority(), loader=lambda: engine)
 
-import anytemplate.engines.base
-import anytemplate.engines.cheetah
-import anytemplate.engines.strtemplate
 
-ENGINES = [anytemplate.engines.strtemplate.Engine, ]
+_BUILTIN_SPECS = (
+    EngineSpec("string.Template", "anytemplate.engines.strtemplate",
+               file_extensions=[], priority=50),
+    # Cheetah is not ported to python 3 and has the lowest priority.
+    EngineSpec("cheetah", "anytemplate.engines.cheetah", file_extensions=[],
+               priority=99, requires="Cheetah"),
+    EngineSpec("jinja2", "anytemplate.engines.jinja2",
+               file_extensions=["j2", "jinja2", "jinja"], priority=10,
+               requires="jinja2"),
+    EngineSpec("mako", "anytemplate.engines.mako", file_extensions=[],
+               priority=30, requires="mako"),
+    EngineSpec("tenjin", "anytemplate.engines.tenjin", file_extensions=[],
+               priority=30, requires="tenjin"),
+    EngineSpec("pystache", "anytemplate.engines.pystache",
+               file_extensions=["mustache"], priority=30,
+               requires="pystache"),
+)
 
-if anytemplate.engines.cheetah.Template is None:
-    LOGGER.info("Cheetah support was disable as needed module looks missing")
-else:
-    ENGINES.append(anytemplate.engines.cheetah.Engine)
+ENGINE_SPECS = list(_BUILTIN_SPECS)
 
-try:
-    import anytemplate.engines.jinja2
-    ENGINES.append(anytemplate.engines.jinja2.Engine)
-except ImportError:
-    LOGGER.info("jinja2 support was disable as needed module looks missing")
+_ENTRY_POINTS_LOADED = False
 
-try:
-    import anytemplate.engines.mako
-    ENGINES.append(anytemplate.engines.mako.Engine)
-except ImportError:
-    LOGGER.info("mako support was disable as needed module looks missing")
+# Indexes of ENGINE_SPECS made on demand and reset by invalidate_index():
+# name to engine spec and file extension to a tuple of engine specs.
+_SPECS_BY_NAME = None
+_SPECS_BY_EXT = None
 
-try:
-    import anytemplate.engines.tenjin
-    ENGINES.append(anytemplate.engines.tenjin.Engine)
-except ImportError:
-    LOGGER.info("tenjin support was disable as needed module looks missing")
+# ENGINE_SPECS sorted by priorities and the list of the template engines
+# available sorted by priorities made on demand as well.
+_SPECS_BY_PRIORITY = None
+_ENGINES_BY_PRIORITY = None
 
-try:
-    import anytemplate.engines.pystache
-    ENGINES.append(anytemplate.engines.pystache.Engine)
-except ImportError:
-    LOGGER.info("Pystache (mustache) support was disable as needed module "
-                "looks missing")
+# Cache of engines found by file extensions.
+_ENGINES_BY_EXT = {}
+
+
+class _EngineList(list):
+    """
+    List of template engine classes must not be modified, as it's cached.
+    """
+    def _readonly(self, *_args, **_kwargs):
+        raise TypeError("The list of template engines is read-only; use "
+                        "anytemplate.engine.register_engine() to add ones")
+
+    append = extend = insert = remove = pop = clear = sort = reverse = \
+        __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+
+
+def builtin_spec(name):
+    """
+    :param name: Name of a built-in template engine
+    :return: :class:`EngineSpec` object of the engine
+    """
+    return [spec for spec in _BUILTIN_SPECS if spec.name == name][0]
+
+
+def _load_entry_points():
+    """
+    Register template engines provided through entry points.
+    """
+    global _ENTRY_POINTS_LOADED  # pylint: disable=global-statement
+    if _ENTRY_POINTS_LOADED:
+        return
+
+    _ENTRY_POINTS_LOADED = True
+    names = set(s.name for s in ENGINE_SPECS)
+    for entry in anytemplate.compat.entry_points(ENTRY_POINTS_GROUP):
+        if entry.name in names:
+            LOGGER.info("Skip the engine %s already registered", entry.name)
+            continue
+
+        ENGINE_SPECS.append(EngineSpec(entry.name, loader=entry.load))
+        names.add(entry.name)
+        invalidate_index()
+
+
+def _get_specs_by_name():
+    """
+    Get the index of ENGINE_SPECS by names or make it if not made yet.
+    """
+    global _SPECS_BY_NAME  # pylint: disable=global-statement
+    if _SPECS_BY_NAME is None:
+        by_name = {}
+        for spec in ENGINE_SPECS:
+            by_name.setdefault(spec.name, spec)
+
+        _SPECS_BY_NAME = by_name
+
+    return _SPECS_BY_NAME
+
+
+def _get_specs_by_ext():
+    """
+    Get the index of ENGINE_SPECS by file extensions or make it if not made
+    yet. Template engines of which file extensions are not known are loaded to
+    make it.
+    """
+    global _SPECS_BY_EXT  # pylint: disable=global-statement
+    _load_entry_points()
+    if _SPECS_BY_EXT is None:
+        by_ext = {}
+        for spec in ENGINE_SPECS:
+            exts = spec.file_extensions
+            if exts is None:  # It's not known until the engine is loaded.
+                engine = spec.load()
+                exts = [] if engine is None else engine.file_extensions()
+
+            for ext in exts:
+                by_ext.setdefault(ext, []).append(spec)
+
+        _SPECS_BY_EXT = dict((ext, tuple(ss)) for ext, ss in by_ext.items())
+
+    return _SPECS_BY_EXT
+
+
+def _get_specs_by_priority():
+    """
+    Get ENGINE_SPECS sorted by priorities or make it if not made yet.
+    """
+    global _SPECS_BY_PRIORITY  # pylint: disable=global-statement
+    _load_entry_points()
+    if _SPECS_BY_PRIORITY is None:
+        _SPECS_BY_PRIORITY = tuple(sorted(ENGINE_SPECS,
+                                          key=operator.attrgetter("priority")))
+
+    return _SPECS_BY_PRIORITY
+
+
+def invalidate_index():
+    """
+    Reset the indexes of ENGINE_SPECS. It must be called if ENGINE_SPECS or
+    the file extensions of any engines in it were changed directly.
+    """
+    # pylint: disable=global-statement
+    global _SPECS_BY_NAME, _SPECS_BY_EXT, _SPECS_BY_PRIORITY
+    global _ENGINES_BY_PRIORITY
+    _SPECS_BY_NAME = _SPECS_BY_EXT = None
+    _SPECS_BY_PRIORITY = _ENGINES_BY_PRIORITY = None
+    _ENGINES_BY_EXT.clear()
+
+
+def register_engine(engine):
+    """
+    Register given template engine.
+
+    :param engine: Template engine class or :class:`EngineSpec` object
+    """
+    if not isinstance(engine, EngineSpec):
+        engine = _spec_from_engine(engine)
+
+    ENGINE_SPECS.append(engine)
+    invalidate_index()
+
+
+def _load_engines(specs):
+    """
+    :param specs: An iterable yields :class:`EngineSpec` objects
+    :return: A generator yields template engine classes available
+    """
+    for spec in specs:
+        engine = spec.load()
+        if engine is not None:
+            yield engine
 
 
 def list_engines_by_priority(engines=None):
     """
     Return a list of engines supported sorted by each priority.
+
+    All of template engines available will be loaded and the list of them is
+    cached, which must not be modified, if `engines` is None.
     """
+    global _ENGINES_BY_PRIORITY  # pylint: disable=global-statement
     if engines is None:
-        engines = ENGINES
+        if _ENGINES_BY_PRIORITY is None:
+            _ENGINES_BY_PRIORITY = _EngineList(sorted(
+                _load_engines(_get_specs_by_priority()),
+                key=operator.methodcaller("priority")
+            ))
+        return _ENGINES_BY_PRIORITY
 
     return sorted(engines, key=operator.methodcaller("priority"))
 
 
+def find_default():
+    """
+    Find the template engine class of the highest priority available, used
+    if neither template file names nor engine names were given.
+
+    Template engines are tried in the order of the priorities in their specs
+    and only the ones of higher priorities than it are loaded.
+
+    :return: A template engine class or None if no engines are available
+    """
+    for spec in _get_specs_by_priority():
+        engine = spec.load()
+        if engine is not None:
+            return engine
+
+    return None
+
+
 def find_by_filename(filename=None, engines=None):
     """
     Find a list of template engine classes to render template `filename`.
 
+    Template engines are found by the file extensions in their specs and only
+    these are loaded if `engines` is None.
+
     :param filename: Template file name (may be a absolute/relative path)
-    :param engines: Template engines
+    :param engines: Template engines or None to find from ENGINE_SPECS
+        through its indexes
 
-    :return: A list of engines support given template file
+    :return: A list or tuple of engines support given template file
     """
-    if engines is None:
-        engines = ENGINES
-
     if filename is None:
         return list_engines_by_priority(engines)
 
+    if engines is None:
+        ext = get_file_extension(filename)
+        found = _ENGINES_BY_EXT.get(ext)
+        if found is None:
+            specs = _get_specs_by_ext().get(ext, ())
+            found = tuple(sorted((e for e in _load_engines(specs)
+                                  if e.supports(filename)),
+                                 key=operator.methodcaller("priority")))
+            _ENGINES_BY_EXT[ext] = found
+
+        return found
+
     return sorted((e for e in engines if e.supports(filename)),
                   key=operator.methodcaller("priority"))
 
@@ -80,14 +356,22 @@ def find_by_name(name, engines=None):
     """
     Find a template engine class specified by its name `name`.
 
+    Only the template engine of given name is loaded if `engines` is None.
+
     :param name: Template name
-    :param engines: Template engines
+    :param engines: Template engines or None to find from ENGINE_SPECS
+        through its indexes
 
     :return: A template engine or None if no any template engine of given name
         were found.
     """
     if engines is None:
-        engines = ENGINES
+        spec = _get_specs_by_name().get(name)
+        if spec is None and not _ENTRY_POINTS_LOADED:
+            _load_entry_points()
+            spec = _get_specs_by_name().get(name)
+
+        return None if spec is None else spec.load()
 
     for egn in engines:
         if egn.name() == name:
@@ -95,4 +379,16 @@ def find_by_name(name, engines=None):
 
     return None
 
+
+def __getattr__(name):
+    """
+    Provide ENGINES, a list of template engine classes available, for
+    backward compatibility. It's read-only and template engines must be
+    added with :func:`register_engine` instead.
+    """
+    if name == "ENGINES":
+        return list_engines_by_priority()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # vim:sw=4:ts=4:et:
@@ -9,21 +9,27 @@ Base class for template engine implementations.
 from __future__ import absolute_import
 
 import functools
+import hashlib
 import logging
+import queue
+import threading
 
+import anytemplate.cache
 import anytemplate.compat
 import anytemplate.utils
 
 from anytemplate.globals import TemplateNotFound
-
-try:
-    from anyconfig.utils import get_file_extension  # flake8: noqa
-except ImportError:
-    from anytemplate.compat import get_file_extension
+from anytemplate.compat import get_file_extension
 
 
 LOGGER = logging.getLogger(__name__)
 
+# Cache of compiled template objects shared by all template engines.
+TEMPLATE_CACHE = anytemplate.cache.make_cache(256)
+
+# Minimum size of chunks of rendered results yielded in streaming rendering.
+CHUNK_SIZE = 65536
+
 
 def to_method(func):
     """
@@ -86,10 +92,165 @@ def fallback_render(template, context, at_paths=None,
     if tmpl is None:
         raise TemplateNotFound(f"template: {template}")
 
+    return read_template(tmpl, at_encoding)
+
+
+def read_template(filepath, encoding=anytemplate.compat.ENCODING):
+    """
+    :param filepath: Template file path
+    :param encoding: Template encoding
+
+    :return: The content of given template file
+    """
     try:
-        return anytemplate.compat.copen(tmpl, encoding=at_encoding).read()
+        return anytemplate.compat.copen(filepath, encoding=encoding).read()
     except UnicodeDecodeError:
-        return open(tmpl).read()
+        return open(filepath).read()
+
+
+def content_digest(content, encoding=anytemplate.compat.ENCODING):
+    """
+    :param content: Template content string or bytes
+    :param encoding: Character set encoding of `content`
+
+    >>> content_digest("aaa") == content_digest(b"aaa")
+    True
+    """
+    if not isinstance(content, bytes):
+        content = content.encode(encoding, "surrogatepass")
+
+    return hashlib.sha1(content).hexdigest()
+
+
+def iter_chunks(strings, chunksize=CHUNK_SIZE):
+    """
+    Join small strings into chunks at least `chunksize` long except for the
+    last one.
+
+    :param strings: An iterable yields strings
+    :param chunksize: Minimum size of chunks
+
+    >>> list(iter_chunks(["a", "b", "cde", "f"], 3))
+    ['abcde', 'f']
+    """
+    buf = []
+    size = 0
+    for text in strings:
+        buf.append(text)
+        size += len(text)
+        if size >= chunksize:
+            yield ''.join(buf)
+            (buf, size) = ([], 0)
+
+    if size:
+        yield ''.join(buf)
+
+
+class _Cancelled(Exception):
+    """Raised in the thread of :func:`iter_writes` if the consumer quit.
+    """
+
+
+def iter_writes(render_fn, chunksize=CHUNK_SIZE, maxchunks=4):
+    """
+    Run `render_fn` writes the results to a file-like object given in another
+    thread and yield chunks of the results written. The results are buffered
+    up to about `chunksize` * `maxchunks` long.
+
+    :param render_fn: A callable takes a file-like object has 'write' method
+    :param chunksize: Minimum size of chunks
+    :param maxchunks: Maximum number of chunks buffered
+
+    >>> list(iter_writes(lambda out: [out.write(c) for c in "abcde"], 2))
+    ['ab', 'cd', 'e']
+    """
+    chunks = queue.Queue(maxchunks)
+    cancelled = threading.Event()
+
+    def _put(item):
+        """Put `item` into the queue unless the consumer quit."""
+        while True:
+            if cancelled.is_set():
+                raise _Cancelled()
+            try:
+                return chunks.put(item, timeout=0.1)
+            except queue.Full:
+                pass
+
+    class _Writer(object):
+        """File-like object to write chunks into the queue."""
+        def __init__(self):
+            self.buf = []
+            self.size = 0
+
+        def write(self, text):
+            """Write `text`."""
+            self.buf.append(text)
+            self.size += len(text)
+            if self.size >= chunksize:
+                self.flush()
+
+        def flush(self):
+            """Flush the buffer."""
+            if self.buf:
+                _put((''.join(self.buf), None))
+                (self.buf, self.size) = ([], 0)
+
+    def _run():
+        """Render and put the results into the queue."""
+        try:
+            writer = _Writer()
+            render_fn(writer)
+            writer.flush()
+            _put((None, None))
+        except _Cancelled:
+            pass
+        except BaseException as exc:  # pylint: disable=broad-except
+            try:
+                _put((None, exc))
+            except _Cancelled:
+                pass
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            (chunk, exc) = chunks.get()
+            if chunk is None:
+                if exc is not None:
+                    raise exc
+                return
+            yield chunk
+    finally:
+        cancelled.set()
+
+
+def compile_cached(name, template_content, compile_fn, options=None,
+                   at_cache=True):
+    """
+    Get the compiled template object of given template string from the cache
+    shared by all template engines or compile it.
+
+    :param name: Template engine name
+    :param template_content: Template content
+    :param compile_fn: A callable takes `template_content` and returns the
+        compiled template object
+    :param options: A dict or any other object of options affect the
+        compilation of `template_content`
+    :param at_cache: Cache the compiled template object if True
+
+    :return: Compiled template object
+    """
+    if options is None:
+        options = {}
+
+    okey = anytemplate.cache.make_key(options) if at_cache else None
+    if okey is None:
+        return compile_fn(template_content)
+
+    key = (name, content_digest(template_content), okey)
+    return TEMPLATE_CACHE.get_or_set(key,
+                                     lambda: compile_fn(template_content))
 
 
 def filter_kwargs(keys, kwargs):
@@ -186,17 +347,28 @@ class Engine(object):
             ", ".join("%s=%s" % (k, v) for k, v in kwargs.items())
         )
 
+    def compile_cached(self, template_content, compile_fn, options=None,
+                       at_cache=True):
+        """
+        .. seealso:: :func:`compile_cached`
+        """
+        return compile_cached(self.name(), template_content, compile_fn,
+                              options=options, at_cache=at_cache)
+
     renders_impl = to_method(fallback_renders)
     render_impl = to_method(fallback_render)
 
     def renders(self, template_content, context=None, at_paths=None,
-                at_encoding=anytemplate.compat.ENCODING, **kwargs):
+                at_encoding=anytemplate.compat.ENCODING, at_cache=True,
+                at_cache_dir=None, **kwargs):
         """
         :param template_content: Template content
         :param context: A dict or dict-like object to instantiate given
             template file or None
         :param at_paths: Template search paths
         :param at_encoding: Template encoding
+        :param at_cache: Cache compiled template objects if True
+        :param at_cache_dir: Dir to save cache files to or None
         :param kwargs: Keyword arguments passed to the template engine to
             render templates with specific features enabled.
 
@@ -214,16 +386,20 @@ class Engine(object):
             str(kwargs)
         )
         return self.renders_impl(template_content, context, at_paths=paths,
-                                 at_encoding=at_encoding, **kwargs)
+                                 at_encoding=at_encoding, at_cache=at_cache,
+                                 at_cache_dir=at_cache_dir, **kwargs)
 
     def render(self, template, context=None, at_paths=None,
-               at_encoding=anytemplate.compat.ENCODING, **kwargs):
+               at_encoding=anytemplate.compat.ENCODING, at_cache=True,
+               at_cache_dir=None, **kwargs):
         """
         :param template: Template file path
         :param context: A dict or dict-like object to instantiate given
             template file
         :param at_paths: Template search paths
         :param at_encoding: Template encoding
+        :param at_cache: Cache compiled template objects if True
+        :param at_cache_dir: Dir to save cache files to or None
         :param kwargs: Keyword arguments passed to the template engine to
             render templates with specific features enabled.
 
@@ -240,4 +416,198 @@ class Engine(object):
             str(kwargs)
         )
         return self.render_impl(template, context, at_paths=paths,
-                                at_encoding=at_encoding, **kwargs)
+                                at_encoding=at_encoding, at_cache=at_cache,
+                                at_cache_dir=at_cache_dir, **kwargs)
+
+    def dependencies_impl(self, template, at_paths=None,
+                          at_encoding=anytemplate.compat.ENCODING, **kwargs):
+        """
+        Find the files the result of given template file depends on.
+        Template engines can find the files templates include should override
+        this.
+
+        :param template: Template file path
+        :param at_paths: Template search paths
+        :param at_encoding: Template encoding
+        :param kwargs: Keyword arguments passed to the template engine
+
+        :return: A list of the paths of the files (and the dirs) including
+            given template file itself, or None if these are not known
+        """
+        return None
+
+    def dependencies(self, template, at_paths=None,
+                     at_encoding=anytemplate.compat.ENCODING, **kwargs):
+        """
+        :param template: Template file path
+        :param at_paths: Template search paths
+        :param at_encoding: Template encoding
+        :param kwargs: Keyword arguments passed to the template engine
+
+        :return: A list of the paths of the files (and the dirs) the result of
+            given template file depends on, or None if these are not known
+        """
+        kwargs = self.filter_options(kwargs, self.render_valid_options())
+        paths = anytemplate.utils.mk_template_paths(template, at_paths)
+        return self.dependencies_impl(template, at_paths=paths,
+                                      at_encoding=at_encoding, **kwargs)
+
+    async def renders_async_impl(self, template_content, context,
+                                 at_executor=None, **kwargs):
+        """
+        Render given template string asynchronously by running
+        :meth:`renders_impl` in `at_executor`. Template engines support
+        asynchronous rendering natively should override this.
+
+        :param template_content: Template content
+        :param context: A dict or dict-like object to instantiate given
+            template file
+        :param at_executor: concurrent.futures.Executor object or None to use
+            the default executor of the running event loop
+        :param kwargs: Keyword arguments passed to :meth:`renders_impl`
+
+        :return: Rendered string
+        """
+        loop = anytemplate.utils.get_running_loop()
+        return await loop.run_in_executor(
+            at_executor, functools.partial(self.renders_impl,
+                                           template_content, context,
+                                           **kwargs)
+        )
+
+    async def render_async_impl(self, template, context, at_executor=None,
+                                **kwargs):
+        """
+        Render given template file asynchronously by running
+        :meth:`render_impl` in `at_executor`. Template engines support
+        asynchronous rendering natively should override this.
+
+        :param template: Template file path
+        :param context: A dict or dict-like object to instantiate given
+            template file
+        :param at_executor: concurrent.futures.Executor object or None to use
+            the default executor of the running event loop
+        :param kwargs: Keyword arguments passed to :meth:`render_impl`
+
+        :return: Rendered string
+        """
+        loop = anytemplate.utils.get_running_loop()
+        return await loop.run_in_executor(
+            at_executor, functools.partial(self.render_impl, template,
+                                           context, **kwargs)
+        )
+
+    async def renders_async(self, template_content, context=None,
+                            at_paths=None,
+                            at_encoding=anytemplate.compat.ENCODING,
+                            at_cache=True, at_cache_dir=None,
+                            at_executor=None, **kwargs):
+        """
+        Asynchronous version of :meth:`renders`.
+
+        :param at_executor: concurrent.futures.Executor object to run blocking
+            operations in or None to use the default executor of the running
+            event loop
+
+        :return: Rendered string
+        """
+        kwargs = self.filter_options(kwargs, self.render_valid_options())
+        paths = anytemplate.utils.mk_template_paths(None, at_paths)
+        if context is None:
+            context = {}
+
+        return await self.renders_async_impl(
+            template_content, context, at_paths=paths,
+            at_encoding=at_encoding, at_cache=at_cache,
+            at_cache_dir=at_cache_dir, at_executor=at_executor, **kwargs
+        )
+
+    async def render_async(self, template, context=None, at_paths=None,
+                           at_encoding=anytemplate.compat.ENCODING,
+                           at_cache=True, at_cache_dir=None, at_executor=None,
+                           **kwargs):
+        """
+        Asynchronous version of :meth:`render`.
+
+        :param at_executor: concurrent.futures.Executor object to run blocking
+            operations in or None to use the default executor of the running
+            event loop
+
+        :return: Rendered string
+        """
+        kwargs = self.filter_options(kwargs, self.render_valid_options())
+        paths = anytemplate.utils.mk_template_paths(template, at_paths)
+        if context is None:
+            context = {}
+
+        return await self.render_async_impl(
+            template, context, at_paths=paths, at_encoding=at_encoding,
+            at_cache=at_cache, at_cache_dir=at_cache_dir,
+            at_executor=at_executor, **kwargs
+        )
+
+    def renders_iter_impl(self, template_content, context, **kwargs):
+        """
+        Render given template string and yield the result in chunks. This
+        yields the result of :meth:`renders_impl` at once; template engines
+        support streaming rendering should override this.
+
+        :param template_content: Template content
+        :param context: A dict or dict-like object to instantiate given
+            template file
+        :param kwargs: Keyword arguments passed to :meth:`renders_impl`
+
+        :return: A generator yields chunks of the rendered string
+        """
+        yield self.renders_impl(template_content, context, **kwargs)
+
+    def render_iter_impl(self, template, context, **kwargs):
+        """
+        Render given template file and yield the result in chunks. This
+        yields the result of :meth:`render_impl` at once; template engines
+        support streaming rendering should override this.
+
+        :param template: Template file path
+        :param context: A dict or dict-like object to instantiate given
+            template file
+        :param kwargs: Keyword arguments passed to :meth:`render_impl`
+
+        :return: A generator yields chunks of the rendered string
+        """
+        yield self.render_impl(template, context, **kwargs)
+
+    def renders_iter(self, template_content, context=None, at_paths=None,
+                     at_encoding=anytemplate.compat.ENCODING, at_cache=True,
+                     at_cache_dir=None, **kwargs):
+        """
+        Streaming version of :meth:`renders`.
+
+        :return: A generator yields chunks of the rendered string
+        """
+        kwargs = self.filter_options(kwargs, self.render_valid_options())
+        paths = anytemplate.utils.mk_template_paths(None, at_paths)
+        if context is None:
+            context = {}
+
+        return self.renders_iter_impl(template_content, context,
+                                      at_paths=paths, at_encoding=at_encoding,
+                                      at_cache=at_cache,
+                                      at_cache_dir=at_cache_dir, **kwargs)
+
+    def render_iter(self, template, context=None, at_paths=None,
+                    at_encoding=anytemplate.compat.ENCODING, at_cache=True,
+                    at_cache_dir=None, **kwargs):
+        """
+        Streaming version of :meth:`render`.
+
+        :return: A generator yields chunks of the rendered string
+        """
+        kwargs = self.filter_options(kwargs, self.render_valid_options())
+        paths = anytemplate.utils.mk_template_paths(template, at_paths)
+        if context is None:
+            context = {}
+
+        return self.render_iter_impl(template, context, at_paths=paths,
+                                     at_encoding=at_encoding,
+                                     at_cache=at_cache,
+                                     at_cache_dir=at_cache_dir, **kwargs)
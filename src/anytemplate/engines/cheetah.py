@@ -28,6 +28,7 @@ except ImportError:
     Template = None
 
 import anytemplate.compat
+import anytemplate.engine
 import anytemplate.engines.base
 
 
@@ -52,7 +53,8 @@ class Engine(anytemplate.engines.base.Engine):
     Template Engine class to support Cheetah.
     """
     _name = "cheetah"
-    _priority = 30
+    _file_extensions = anytemplate.engine.builtin_spec(_name).file_extensions
+    _priority = anytemplate.engine.builtin_spec(_name).priority
 
     # _engine_valid_opts: parameters for Cheetah.Template.Template
     # _render_valid_opts: same as the above currently
@@ -70,7 +72,6 @@ class Engine(anytemplate.engines.base.Engine):
         :return: Whether the engine can process given template file or not.
         """
         if anytemplate.compat.IS_PYTHON_3:
-            cls._priority = 99
             return False  # Always as it's not ported to python 3.
 
         return super(Engine, cls).supports(template_file=template_file)
@@ -104,9 +105,8 @@ class Engine(anytemplate.engines.base.Engine):
         #    paths = at_paths + self._engine_valid_opts.get(..., [])
         #    ...
         kwargs = self.filter_options(kwargs, self.engine_valid_options())
-        self.engine_options.update(kwargs)
 
-        return render_impl(**self.engine_options)
+        return render_impl(**dict(self.engine_options, **kwargs))
 
     def renders_impl(self, template_content, context, **kwargs):
         """
@@ -9,6 +9,14 @@
 
   - Option parameters are passed to jinja2.Environment.__init__().
 
+  - The option 'uptodate_ttl' given on initialization of the engine is the
+    seconds to skip checks if template files are up-to-date after the last
+    check; these are checked on every rendering by default.
+
+  - Compiled templates are saved as bytecode cache files under
+    '<at_cache_dir>/jinja2/' if the common option 'at_cache_dir' was given
+    and the option 'bytecode_cache' was not.
+
   - The parameter 'loader' is not supported because anytemplate only supports
     jinja2.loaders.FileSystemLoader.
 
@@ -28,85 +36,216 @@ from __future__ import absolute_import
 import glob
 import os.path
 import os
+import time
 
 import jinja2.exceptions   # :throw: ImportError if missing
 import jinja2
 import jinja2.loaders
+import jinja2.meta
 
+import anytemplate.cache
 import anytemplate.compat
+import anytemplate.engine
 import anytemplate.engines.base
+import anytemplate.utils
 
 from anytemplate.globals import TemplateNotFound
 from anytemplate.compat import ENCODING
 
 
+# Cache of jinja2.Environment objects keyed by search paths, encoding and
+# environment options, to reuse jinja2's template cache across renders.
+_ENVS = anytemplate.cache.make_cache(32)
+
+# Caches of the results of glob keyed by patterns and the mtimes of the dirs,
+# and the contents of template files keyed by paths, mtimes and sizes.
+_GLOBS = anytemplate.cache.make_cache(256)
+_CONTENTS = anytemplate.cache.make_cache(1024)
+
+
+def _glob(pattern):
+    """
+    glob.glob with the results cached by the mtime of the dir of `pattern`.
+
+    :param pattern: Glob pattern of files
+    :return: A tuple of (a tuple of paths sorted, a list of tuples of (dir,
+        mtime) the results depend on)
+    """
+    if not glob.has_magic(pattern):
+        if anytemplate.utils.RESOLVER.exists(pattern):
+            return ((pattern, ), [])
+        return ((), [])
+
+    dirname = os.path.dirname(pattern) or os.curdir
+    if glob.has_magic(dirname):  # It depends on not only this dir.
+        return (tuple(sorted(glob.glob(pattern))), [])
+
+    try:
+        mtime = os.stat(dirname).st_mtime_ns
+    except OSError:
+        return ((), [])
+
+    files = _GLOBS.get_or_set((pattern, mtime),
+                              lambda: tuple(sorted(glob.glob(pattern))))
+    return (files, [(dirname, mtime)])
+
+
 def _load_file_itr(files, encoding=ENCODING):
     """
     :param files: A list of file paths :: [str]
     :param encoding: Encoding, e.g. 'utf-8'
+    :return: A generator yields tuples of (path, content, mtime in nsec)
     """
     for filename in files:
         try:
-            with open(filename, mode="rb") as fileobj:
-                yield (
-                    fileobj.read().decode(encoding),
-                    os.path.getmtime(filename)
-                )
+            stat = os.stat(filename)
+            key = (filename, stat.st_mtime_ns, stat.st_size, encoding)
+            content = _CONTENTS.get(key)
+            if content is None:
+                with open(filename, mode="rb") as fileobj:
+                    content = fileobj.read().decode(encoding)
+                _CONTENTS.set(key, content)
+
+            yield (filename, content, stat.st_mtime_ns)
         except (PermissionError, IOError, OSError):
             pass
 
 
+def _make_uptodate(deps, ttl=0):
+    """
+    :param deps: A list of tuples of (path, mtime in nsec) of the files and
+        dirs the template depends on
+    :param ttl: Seconds to skip checks after the last successful check
+
+    :return: A function to check if these are up-to-date
+    """
+    checked = [time.monotonic()]
+
+    def uptodate():
+        """function to check of these are up-to-date.
+        """
+        now = time.monotonic()
+        if ttl and now - checked[0] < ttl:
+            return True
+
+        try:
+            res = all(os.stat(path).st_mtime_ns == mtime
+                      for path, mtime in deps)
+        except OSError:
+            return False
+
+        if res:
+            checked[0] = now
+        return res
+
+    return uptodate
+
+
 class FileSystemExLoader(jinja2.loaders.FileSystemLoader):
     """Extended version of jinja2.loaders.FileSystemLoader.
 
+    Results of glob and the contents of template files are cached by the
+    mtimes of dirs and files, and checks if templates are up-to-date are
+    skipped for `uptodate_ttl` seconds after the last check.
+
     .. seealso:: https://github.com/pallets/jinja/pull/878
     """
     def __init__(self, searchpath, encoding='utf-8', followlinks=False,
-                 enable_glob=False):
+                 enable_glob=False, uptodate_ttl=0):
         """.. seealso:: :meth:`jinja2.loaders.FileSystemLoader.__init__`
+
+        :param enable_glob: Expand glob patterns in template names if True
+        :param uptodate_ttl: Seconds to skip checks if templates are
+            up-to-date after the last check
         """
         super(FileSystemExLoader, self).__init__(searchpath, encoding=encoding,
                                                  followlinks=False)
         self.enable_glob = enable_glob
+        self.uptodate_ttl = uptodate_ttl
 
-    def get_source(self, environment, template):
-        """.. seealso:: :meth:`jinja2.loaders.FileSystemLoader.get_source`
+    def load_files(self, template):
+        """
+        Load the template files `template` refers to.
+
+        :param template: Template name may be a glob pattern
+        :return: A tuple of (contents, filename, deps); deps is a list of
+            tuples of (path, mtime in nsec) of the files loaded and the dirs
+            globbed
+        :throw: jinja2.exceptions.TemplateNotFound
         """
         pieces = jinja2.loaders.split_template_path(template)
         for searchpath in self.searchpath:
             filename = os.path.join(searchpath, *pieces)
             if self.enable_glob:
-                files = sorted(glob.glob(filename))
+                (files, deps) = _glob(filename)
+            elif anytemplate.utils.RESOLVER.exists(filename):
+                (files, deps) = ([filename], [])
             else:
-                files = [filename]
-            contents_mtimes = list(_load_file_itr(files, self.encoding))
-            if not contents_mtimes:
+                continue
+            loaded = list(_load_file_itr(files, self.encoding))
+            if not loaded:
                 continue
 
-            contents = ''.join(cm[0] for cm in contents_mtimes)
-            mtimes = [cm[1] for cm in contents_mtimes]
-
-            def uptodate():
-                """function to check of these are up-to-date.
-                """
-                try:
-                    return all(os.path.getmtime(fn) == mt for fn, mt
-                               in zip(files, mtimes))
-                except OSError:
-                    return False
+            contents = ''.join(fcm[1] for fcm in loaded)
+            deps = [(fcm[0], fcm[2]) for fcm in loaded] + deps
 
-            return contents, filename, uptodate
+            return contents, filename, deps
 
         raise jinja2.exceptions.TemplateNotFound(template)
 
+    def get_source(self, environment, template):
+        """.. seealso:: :meth:`jinja2.loaders.FileSystemLoader.get_source`
+        """
+        (contents, filename, deps) = self.load_files(template)
+        return contents, filename, _make_uptodate(deps, self.uptodate_ttl)
+
+
+def _make_bytecode_cache(cache_dir, paths, eopts):
+    """
+    :param cache_dir: Top dir to save cache files to
+    :param paths: Template search paths
+    :param eopts: Keyword arguments passed to jinja2.Environment, which may
+        change the code compiled
+
+    :return: jinja2.FileSystemBytecodeCache object saves cache files to the
+        dir for given search paths and options under `cache_dir`
+    """
+    digest = anytemplate.engines.base.content_digest(
+        "\0".join([os.path.abspath(p) for p in paths] +
+                  [repr(sorted(eopts.items()))])
+    )
+    bcdir = os.path.join(cache_dir, "jinja2", digest)
+    os.makedirs(bcdir, exist_ok=True)
+
+    return jinja2.FileSystemBytecodeCache(bcdir)
+
+
+def _make_env(paths, encoding, eopts, cache_dir=None, uptodate_ttl=0):
+    """
+    :param paths: Template search paths
+    :param encoding: Template encoding
+    :param eopts: Keyword arguments passed to jinja2.Environment
+    :param cache_dir: Dir to save bytecode cache files to unless the option
+        'bytecode_cache' was given, or None
+    :param uptodate_ttl: Seconds to skip checks if templates are up-to-date
+    """
+    if cache_dir is not None and eopts.get("bytecode_cache") is None:
+        eopts = dict(eopts, bytecode_cache=_make_bytecode_cache(cache_dir,
+                                                                paths, eopts))
+
+    # Use custom loader to allow glob include.
+    loader = FileSystemExLoader(paths, encoding=encoding, enable_glob=True,
+                                uptodate_ttl=uptodate_ttl)
+    return jinja2.Environment(loader=loader, **eopts)
+
 
 class Engine(anytemplate.engines.base.Engine):
     """
     Template engine class to support Jinja2.
     """
     _name = "jinja2"
-    _file_extensions = ["j2", "jinja2", "jinja"]
-    _priority = 10
+    _file_extensions = anytemplate.engine.builtin_spec(_name).file_extensions
+    _priority = anytemplate.engine.builtin_spec(_name).priority
     _engine_valid_opts = ("block_start_string", "block_end_string",
                           "variable_start_string", "variable_end_string",
                           "comment_start_string", "comment_end_string",
@@ -120,13 +259,95 @@ class Engine(anytemplate.engines.base.Engine):
     def __init__(self, **kwargs):
         """
         see `help(jinja2.Environment)` for options.
+
+        :param uptodate_ttl: Seconds to skip checks if template files are
+            up-to-date after the last check, 0 by default
         """
         super(Engine, self).__init__(**kwargs)
         self._env_options = self.filter_options(kwargs,
                                                 self.engine_valid_options())
+        self._uptodate_ttl = kwargs.get("uptodate_ttl", 0)
+
+    def _get_env(self, paths, encoding, at_cache=True, at_cache_dir=None,
+                 **eopts):
+        """
+        Get a jinja2.Environment object from the cache or make it.
+
+        Environments are cached by search paths, encoding, cache dir and
+        options given on initialization, and options given on each rendering
+        are applied by overlays of them cached as well.
+
+        :param paths: Template search paths
+        :param encoding: Template encoding
+        :param at_cache: Cache the environment object and its overlay if True
+        :param at_cache_dir: Dir to save bytecode cache files to or None
+        :param eopts: Keyword arguments passed to jinja2.Environment on each
+            rendering
+
+        :return: jinja2.Environment object
+        """
+        key = anytemplate.cache.make_key((paths, encoding, self._env_options,
+                                          at_cache_dir, self._uptodate_ttl)) \
+            if at_cache else None
+        if key is None:
+            return _make_env(paths, encoding, dict(self._env_options, **eopts),
+                             at_cache_dir, self._uptodate_ttl)
+
+        env = _ENVS.get_or_set(
+            key, lambda: _make_env(paths, encoding, self._env_options,
+                                   at_cache_dir, self._uptodate_ttl)
+        )
+        if not eopts:
+            return env
+
+        def overlay():
+            """Overlays must not share the bytecode cache with `env` as the
+            options given may change the code compiled.
+            """
+            opts = dict(self._env_options, **eopts)
+            if at_cache_dir is None or opts.get("bytecode_cache") is not None:
+                return env.overlay(**eopts)
+
+            return env.overlay(bytecode_cache=_make_bytecode_cache(
+                at_cache_dir, paths, opts
+            ), **eopts)
+
+        okey = anytemplate.cache.make_key(eopts)
+        if okey is None:
+            return overlay()
+
+        return _ENVS.get_or_set((key, okey), overlay)
+
+    def _get_template(self, env, template, is_file, at_paths, encoding,
+                      eopts, at_cache=True):
+        """
+        :param env: jinja2.Environment object
+        :param template: Template file name or template content
+        :param is_file: True if given `template` is a filename
+        :param at_paths: Template search paths
+        :param encoding: Template encoding
+        :param eopts: Keyword arguments passed to jinja2.Environment on each
+            rendering
+        :param at_cache: Cache compiled template objects if True
+
+        :return: jinja2.Template object
+        :throw: TemplateNotFound
+        """
+        try:
+            if is_file:
+                return env.get_template(template)
+
+            return self.compile_cached(
+                template, env.from_string,
+                options=(at_paths, encoding, self._env_options, eopts),
+                at_cache=at_cache
+            )
+        except jinja2.exceptions.TemplateNotFound as exc:
+            raise TemplateNotFound(str(exc))
 
     def _render(self, template, context, is_file, at_paths=None,
-                at_encoding=ENCODING, **kwargs):
+                at_encoding=ENCODING, at_cache=True, at_cache_dir=None,
+                **kwargs):
         """
         Render given template string and return the result.
 
@@ -136,6 +357,9 @@ class Engine(anytemplate.engines.base.Engine):
         :param is_file: True if given `template` is a filename
         :param at_paths: Template search paths
         :param at_encoding: Template encoding
+        :param at_cache: Cache compiled template objects if True
+        :param at_cache_dir: Dir to save bytecode cache files of templates
+            to unless the option 'bytecode_cache' was given, or None
         :param kwargs: Keyword arguments passed to jinja2.Envrionment. Please
             note that 'loader' option is not supported because anytemplate does
             not support to load template except for files
@@ -143,18 +367,40 @@ class Engine(anytemplate.engines.base.Engine):
         :return: Rendered string
 
         """
+        encoding = at_encoding.lower()
         eopts = self.filter_options(kwargs, self.engine_valid_options())
-        self._env_options.update(eopts)
+        env = self._get_env(at_paths, encoding, at_cache, at_cache_dir,
+                            **eopts)
+        if kwargs:  # Not to modify the context given.
+            context = dict(context, **kwargs)
+        try:
+            tmpl = self._get_template(env, template, is_file, at_paths,
+                                      encoding, eopts, at_cache)
+            return tmpl.render(**context)
+        except jinja2.exceptions.TemplateNotFound as exc:
+            raise TemplateNotFound(str(exc))
+
+    def _render_iter(self, template, context, is_file, at_paths=None,
+                     at_encoding=ENCODING, at_cache=True, at_cache_dir=None,
+                     **kwargs):
+        """
+        Streaming version of :meth:`_render` renders templates with
+        jinja2.Template.generate.
 
-        # Use custom loader to allow glob include.
-        loader = FileSystemExLoader(at_paths, encoding=at_encoding.lower(),
-                                    enable_glob=True)
-        env = jinja2.Environment(loader=loader, **self._env_options)
+        :return: A generator yields chunks of the rendered string
+        """
+        encoding = at_encoding.lower()
+        eopts = self.filter_options(kwargs, self.engine_valid_options())
+        env = self._get_env(at_paths, encoding, at_cache, at_cache_dir,
+                            **eopts)
         if kwargs:
-            context.update(kwargs)
+            context = dict(context, **kwargs)
         try:
-            tmpl = (env.get_template if is_file else env.from_string)(template)
-            return tmpl.render(**context)
+            tmpl = self._get_template(env, template, is_file, at_paths,
+                                      encoding, eopts, at_cache)
+            for chunk in anytemplate.engines.base.iter_chunks(
+                    tmpl.generate(**context)):
+                yield chunk
         except jinja2.exceptions.TemplateNotFound as exc:
             raise TemplateNotFound(str(exc))
 
@@ -200,4 +446,67 @@ class Engine(anytemplate.engines.base.Engine):
         """
         return self._render(os.path.basename(template), context, True, **opts)
 
+    def renders_iter_impl(self, template_content, context, **opts):
+        """
+        Render given template string and yield the result in chunks.
+
+        .. seealso:: :meth:`renders_impl`
+        """
+        return self._render_iter(template_content, context, False, **opts)
+
+    def render_iter_impl(self, template, context, **opts):
+        """
+        Render given template file and yield the result in chunks.
+
+        .. seealso:: :meth:`render_impl`
+        """
+        return self._render_iter(os.path.basename(template), context, True,
+                                 **opts)
+
+    def dependencies_impl(self, template, at_paths=None,
+                          at_encoding=ENCODING, **kwargs):
+        """
+        Find the files given template file includes, extends or imports
+        recursively with jinja2.meta.find_referenced_templates. The dirs
+        globbed to include files are in them too, as files may be added to or
+        removed from them.
+
+        :param template: Template file path
+        :param at_paths: Template search paths
+        :param at_encoding: Template encoding
+        :param kwargs: Keyword arguments passed to jinja2.Envrionment
+
+        :return: A list of the paths of the files and the dirs, or None if
+            any of the templates are referred dynamically
+        :throw: TemplateNotFound
+        """
+        eopts = self.filter_options(kwargs, self.engine_valid_options())
+        env = self._get_env(at_paths, at_encoding.lower(), **eopts)
+
+        res = []
+        (names, seen) = ([os.path.basename(template)], set())
+        while names:
+            name = names.pop()
+            if name in seen:
+                continue
+
+            seen.add(name)
+            if glob.has_magic(os.path.dirname(name)):
+                return None  # Files in the dirs matched are not tracked.
+            try:
+                (contents, _filename, deps) = env.loader.load_files(name)
+                refs = jinja2.meta.find_referenced_templates(
+                    env.parse(contents)
+                )
+            except jinja2.exceptions.TemplateNotFound as exc:
+                raise TemplateNotFound(str(exc))
+
+            res.extend(path for path, _mtime in deps)
+            for ref in refs:
+                if ref is None:
+                    return None
+                names.append(ref)
+
+        return anytemplate.utils.uniq(res)
+
 # vim:sw=4:ts=4:et:
@@ -30,19 +30,102 @@
       parameter passed to Engine.renders() will be ignored because it's
       meaningless.
 
+  - mako.lookup.TemplateLookup objects are cached and reused for each set of
+    search paths and options. 'module_directory' defaults to the sub dir of
+    the 'mako' dir under the common option 'at_cache_dir' for the search
+    paths and the options given, which may change the code compiled, if it
+    was given.
+
  - References:
 
    - http://docs.makotemplates.org/en/latest/
 """
 from __future__ import absolute_import
 
+import os.path
+
 import mako.template  # :throw: ImportError
+import mako.exceptions
 import mako.lookup
+import mako.runtime
 
+import anytemplate.cache
 import anytemplate.compat
+import anytemplate.engine
 import anytemplate.engines.base
 import anytemplate.utils
 
+from anytemplate.globals import TemplateNotFound
+
+
+# Parameters for mako.template.Template can be passed to
+# mako.lookup.TemplateLookup as well.
+_LOOKUP_TEMPLATE_OPTS = ("format_exceptions", "error_handler",
+                         "output_encoding", "encoding_errors",
+                         "module_directory", "cache_args", "cache_impl",
+                         "cache_enabled", "cache_type", "cache_dir",
+                         "cache_url", "input_encoding", "module_writer",
+                         "default_filters", "buffer_filters",
+                         "strict_undefined", "imports", "future_imports",
+                         "enable_loop", "preprocessor", "lexer_cls")
+
+# Parameters for mako.template.Template not to change the modules compiled.
+_NON_COMPILE_OPTS = ("text", "filename", "uri", "lookup", "module_directory",
+                     "module_filename")
+
+# Cache of mako.lookup.TemplateLookup objects keyed by search paths and
+# options, to reuse templates compiled and collected in them.
+_LOOKUPS = anytemplate.cache.make_cache(32)
+
+
+def _mk_template_opts(at_encoding, at_cache_dir=None, paths=None, **kwargs):
+    """
+    :param at_encoding: Template encoding
+    :param at_cache_dir: Dir to save compiled modules to or None
+    :param paths: Absolute paths of template search dirs or None; modules
+        are saved by the uris relative to them
+    :param kwargs: Keyword arguments passed to mako.template.Template
+
+    >>> mdir = _mk_template_opts("UTF-8", "/tmp/a")["module_directory"]
+    >>> os.path.dirname(mdir)
+    '/tmp/a/mako'
+    >>> mdir == _mk_template_opts("UTF-8", "/tmp/a",
+    ...                           default_filters=['h'])["module_directory"]
+    False
+    >>> mdir == _mk_template_opts("UTF-8", "/tmp/a",
+    ...                           paths=["/tmp/b"])["module_directory"]
+    False
+    """
+    for key in ("input_encoding", "output_encoding"):
+        kwargs.setdefault(key, at_encoding.lower())
+
+    if at_cache_dir is not None and "module_directory" not in kwargs:
+        digest = anytemplate.engines.base.content_digest(repr((paths, sorted(
+            (k, v) for k, v in kwargs.items() if k not in _NON_COMPILE_OPTS
+        ))))
+        kwargs["module_directory"] = os.path.join(at_cache_dir, "mako",
+                                                  digest)
+
+    return kwargs
+
+
+def _find_uri(filepath, paths):
+    """
+    :param filepath: Absolute path of template file
+    :param paths: Absolute paths of template search dirs
+
+    >>> _find_uri("/a/b/c.t", ["/x", "/a", "/a/b"])
+    '/b/c.t'
+    >>> _find_uri("/a/b/c.t", ["/x"])
+    '/a/b/c.t'
+    """
+    for path in paths:
+        prefix = path.rstrip(os.path.sep) + os.path.sep
+        if filepath.startswith(prefix):
+            return filepath[len(prefix) - 1:]
+
+    return filepath
+
 
 def _render(tmpl, ctx):
     """
@@ -53,12 +136,31 @@ def _render(tmpl, ctx):
     return tmpl.render_unicode(**ctx) if is_py3k else tmpl.render(**ctx)
 
 
+def _render_iter(tmpl, ctx):
+    """
+    Render given template with writing the result to a buffered writer, and
+    yield chunks of the result.
+
+    :param tmpl: mako.template.Template object
+    :param ctx: A dict or dict-like object to instantiate given
+    """
+    if tmpl.format_exceptions:  # Error pages replace the results written.
+        return anytemplate.engines.base.iter_chunks([_render(tmpl, ctx)])
+
+    def _render_to(out):
+        """Render to `out` as mako.template.Template.render does."""
+        tmpl.render_context(mako.runtime.Context(out, **ctx), **ctx)
+
+    return anytemplate.engines.base.iter_writes(_render_to)
+
+
 class Engine(anytemplate.engines.base.Engine):
     """
     Template engine class to support Mako.
     """
     _name = "mako"
-    _priority = 30
+    _file_extensions = anytemplate.engine.builtin_spec(_name).file_extensions
+    _priority = anytemplate.engine.builtin_spec(_name).priority
 
     # _engine_valid_opts: parameters for mako.lookup.TemplateLookup
     # _render_valid_opts: parameters for mako.template.Template
@@ -86,9 +188,113 @@ class Engine(anytemplate.engines.base.Engine):
         self.lookup_options = self.filter_options(kwargs,
                                                   self.engine_valid_options())
 
+    def _lookup_dirs(self, paths):
+        """
+        :param paths: Template search paths
+        :return: Absolute paths of the search dirs of the lookup object
+        """
+        paths = paths + self.lookup_options.get("directories", [])
+        return [os.path.abspath(p) for p in paths]
+
+    def _get_lookup(self, paths, at_cache=True, **kwargs):
+        """
+        Get a mako.lookup.TemplateLookup object from the cache or make it.
+
+        :param paths: Template search paths
+        :param at_cache: Cache the lookup object if True
+        :param kwargs: Keyword arguments passed to mako.template.Template
+
+        :return: mako.lookup.TemplateLookup object
+        """
+        lopts = dict(self.lookup_options, directories=self._lookup_dirs(paths))
+        lopts.update(self.filter_options(kwargs, _LOOKUP_TEMPLATE_OPTS))
+
+        key = anytemplate.cache.make_key(lopts) if at_cache else None
+        if key is None:
+            return mako.lookup.TemplateLookup(**lopts)
+
+        return _LOOKUPS.get_or_set(
+            key, lambda: mako.lookup.TemplateLookup(**lopts)
+        )
+
+    def _load_string(self, template_content, at_paths=None,
+                     at_encoding=anytemplate.compat.ENCODING,
+                     at_cache=True, at_cache_dir=None, **kwargs):
+        """
+        Compile given template string.
+
+        .. seealso:: :meth:`renders_impl` for parameters
+
+        :return: mako.template.Template object
+        """
+        if "filename" in kwargs:
+            kwargs["filename"] = None
+
+        paths = None if at_paths is None else self._lookup_dirs(at_paths)
+        kwargs = _mk_template_opts(at_encoding, at_cache_dir, paths, **kwargs)
+        if at_paths is not None:
+            kwargs["lookup"] = self._get_lookup(at_paths, at_cache, **kwargs)
+
+        return self.compile_cached(
+            template_content,
+            lambda text: mako.template.Template(text=text, **kwargs),
+            options=(at_paths, self.lookup_options,
+                     dict((k, v) for k, v in kwargs.items() if k != "lookup")),
+            at_cache=at_cache
+        )
+
+    def _load_file(self, template, at_paths=None,
+                   at_encoding=anytemplate.compat.ENCODING, at_cache=True,
+                   at_cache_dir=None, **kwargs):
+        """
+        Load and compile given template file.
+
+        .. seealso:: :meth:`render_impl` for parameters
+
+        :return: mako.template.Template object
+        :throw: TemplateNotFound
+        """
+        if "text" in kwargs:
+            kwargs["text"] = None
+
+        paths = None if at_paths is None else self._lookup_dirs(at_paths)
+        kwargs = _mk_template_opts(at_encoding, at_cache_dir, paths, **kwargs)
+        if at_paths is None:
+            return mako.template.Template(filename=template, **kwargs)
+
+        lookup = self._get_lookup(at_paths, at_cache, **kwargs)
+        filepath = anytemplate.utils.find_template_from_path(
+            template, lookup.directories
+        )
+        if filepath is None:
+            raise TemplateNotFound(f"template: {template}")
+
+        filepath = os.path.abspath(filepath)
+        uri = _find_uri(filepath, lookup.directories)
+        if "uri" not in kwargs and "module_filename" not in kwargs:
+            try:
+                tmpl = lookup.get_template(uri)
+                if os.path.abspath(tmpl.filename) == filepath:
+                    return tmpl
+            except mako.exceptions.TopLevelLookupException:
+                pass
+
+        # Some other template of the same uri was found in the search paths
+        # or some options specific to this template were given. The module
+        # is saved by the absolute path not to be confused with the other's.
+        if "uri" not in kwargs and "module_filename" not in kwargs and \
+                kwargs.get("module_directory"):
+            kwargs["module_filename"] = os.path.join(
+                kwargs["module_directory"], filepath.lstrip(os.path.sep) +
+                ".py"
+            )
+        kwargs.setdefault("uri", uri)
+        return mako.template.Template(filename=filepath, lookup=lookup,
+                                      **kwargs)
+
     def renders_impl(self, template_content, context, at_paths=None,
                      at_encoding=anytemplate.compat.ENCODING,
-                     **kwargs):
+                     at_cache=True, at_cache_dir=None, **kwargs):
         """
         Render given template string and return the result.
 
@@ -97,71 +303,63 @@ class Engine(anytemplate.engines.base.Engine):
             template file
         :param at_paths: Template search paths
         :param at_encoding: Template encoding
+        :param at_cache: Cache compiled template objects if True
+        :param at_cache_dir: Dir to save compiled modules to if
+            'module_directory' was not given
         :param kwargs: Keyword arguments passed to the template engine to
             render templates with specific features enabled.
 
         :return: Rendered string
         """
-        if "filename" in kwargs:
-            kwargs["filename"] = None
-
-        kwargs["text"] = template_content
-
-        if "input_encoding" not in kwargs:
-            kwargs["input_encoding"] = at_encoding.lower()
-
-        if "output_encoding" not in kwargs:
-            kwargs["output_encoding"] = at_encoding.lower()
-
-        if at_paths is not None:
-            paths = at_paths + self.lookup_options.get("directories", [])
-            self.lookup_options["directories"] = paths
-
-            lookup = mako.lookup.TemplateLookup(**self.lookup_options)
-            kwargs["lookup"] = lookup
-
-        tmpl = mako.template.Template(**kwargs)
-        return _render(tmpl, context)
+        return _render(self._load_string(template_content, at_paths,
+                                         at_encoding, at_cache, at_cache_dir,
+                                         **kwargs), context)
 
     def render_impl(self, template, context, at_paths=None,
-                    at_encoding=anytemplate.compat.ENCODING, **kwargs):
+                    at_encoding=anytemplate.compat.ENCODING, at_cache=True,
+                    at_cache_dir=None, **kwargs):
         """
         Render given template file and return the result.
 
+        Template files are loaded through the cached
+        mako.lookup.TemplateLookup object for given search paths, so that its
+        'collection_size' and 'filesystem_checks' options take effects.
+
         :param template: Template file path
         :param context: A dict or dict-like object to instantiate given
             template file
         :param at_paths: Template search paths
         :param at_encoding: Template encoding
+        :param at_cache: Cache the lookup object if True
+        :param at_cache_dir: Dir to save compiled modules to if
+            'module_directory' was not given
         :param kwargs: Keyword arguments passed to the template engine to
             render templates with specific features enabled.
 
         :return: Rendered string
         """
-        if "text" in kwargs:
-            kwargs["text"] = None
-
-        if "input_encoding" not in kwargs:
-            kwargs["input_encoding"] = at_encoding.lower()
-
-        if "output_encoding" not in kwargs:
-            kwargs["output_encoding"] = at_encoding.lower()
-
-        if at_paths is not None:
-            paths = at_paths + self.lookup_options.get("directories", [])
-            self.lookup_options["directories"] = paths
+        return _render(self._load_file(template, at_paths, at_encoding,
+                                       at_cache, at_cache_dir, **kwargs),
+                       context)
 
-            lookup = mako.lookup.TemplateLookup(**self.lookup_options)
-            kwargs["lookup"] = lookup
+    def renders_iter_impl(self, template_content, context, **kwargs):
+        """
+        Render given template string and yield the result in chunks.
 
-            template = anytemplate.utils.find_template_from_path(template,
-                                                                 paths)
-        # else:
-        #     template = anytemplate.utils.find_template_from_path(template)
+        .. seealso:: :meth:`renders_impl`
+        """
+        for chunk in _render_iter(self._load_string(template_content,
+                                                    **kwargs), context):
+            yield chunk
 
-        kwargs["filename"] = template
+    def render_iter_impl(self, template, context, **kwargs):
+        """
+        Render given template file and yield the result in chunks.
 
-        tmpl = mako.template.Template(**kwargs)
-        return _render(tmpl, context)
+        .. seealso:: :meth:`render_impl`
+        """
+        for chunk in _render_iter(self._load_file(template, **kwargs),
+                                  context):
+            yield chunk
 
 # vim:sw=4:ts=4:et:
@@ -17,6 +17,10 @@
     will be passed to pystache.render.Renderer.__init__() as the keyword
     parameter "search_dirs" which represents template search paths.
 
+  - Renderer objects are cached and reused for each set of options, and
+    parsed templates and the contents of partials are cached by their
+    contents or paths and mtimes.
+
  - References:
 
    - https://mustache.github.io
@@ -25,20 +29,155 @@
 from __future__ import absolute_import
 
 import os.path
+import threading
+
 import pystache.renderer  # :throw: ImportError
 import pystache.defaults
+import pystache.locator
+import pystache.parser
+import pystache.renderengine
 
+import anytemplate.cache
 import anytemplate.compat
+import anytemplate.engine
 import anytemplate.engines.base
 
 
+# Cache of Renderer objects keyed by effective options.
+_RENDERERS = anytemplate.cache.make_cache(32)
+
+# Cache of the contents of template files and partials and parsed template
+# files keyed by path and mtime of the files.
+_SOURCES = anytemplate.cache.make_cache(256)
+
+
+def _parse(template, delimiters=None, at_cache=True):
+    """
+    :param template: Template content string
+    :param delimiters: A tuple of a pair of delimiters or None
+    :param at_cache: Cache the parsed template object if True
+
+    :return: pystache.parsed.ParsedTemplate object parsed and cached
+    """
+    return anytemplate.engines.base.compile_cached(
+        Engine.name(), template,
+        lambda tmpl: pystache.parser.parse(tmpl, delimiters),
+        options=delimiters, at_cache=at_cache
+    )
+
+
+class RenderEngine(pystache.renderengine.RenderEngine):
+    """
+    pystache.renderengine.RenderEngine reuses parsed templates and partials.
+    """
+    def __init__(self, at_cache=True, **kwargs):
+        """
+        :param at_cache: Cache parsed templates and partials if True
+        """
+        super(RenderEngine, self).__init__(**kwargs)
+        self.at_cache = at_cache
+
+    def render(self, template, context_stack, delimiters=None):
+        """.. seealso:: :meth:`pystache.renderengine.RenderEngine.render`
+        """
+        return _parse(template, delimiters,
+                      self.at_cache).render(self, context_stack)
+
+
+class Renderer(pystache.renderer.Renderer):
+    """
+    pystache.renderer.Renderer caches the contents of template files and
+    partials by their paths and mtimes, and parsed templates.
+
+    The context stack of the current rendering, :attr:`context`, is kept per
+    thread so that an object of this class can be shared among threads.
+    """
+    def __init__(self, at_cache=True, **kwargs):
+        """
+        :param at_cache: Cache the contents of template files and partials,
+            and parsed templates if True
+        """
+        super(Renderer, self).__init__(**kwargs)
+        self.at_cache = at_cache
+
+    @property
+    def _context(self):
+        """The context stack of the current rendering in this thread.
+        """
+        return getattr(self._local, "context", None)
+
+    @_context.setter
+    def _context(self, stack):
+        """
+        :param stack: pystache.context.ContextStack object
+        """
+        self._local.context = stack
+
+    @property
+    def _local(self):
+        """Thread local data.
+        """
+        return self.__dict__.setdefault("_thread_local", threading.local())
+
+    def _read(self, path, parse=False):
+        """
+        :param path: Template file path
+        :param parse: Return the parsed template instead of the content
+        """
+        def _load():
+            """Load template file."""
+            content = self._make_loader().read(path)
+            return _parse(content, at_cache=self.at_cache) if parse \
+                else content
+
+        if not self.at_cache:
+            return _load()
+
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size, parse,
+               self.file_encoding, self.decode_errors)
+
+        return _SOURCES.get_or_set(key, _load)
+
+    def find_path(self, template_name):
+        """
+        :param template_name: Template name
+        :return: Template file path
+        :throw: pystache.common.TemplateNotFoundError
+        """
+        locator = pystache.locator.Locator(extension=self.file_extension)
+        return locator.find_name(template_name, self.search_dirs)
+
+    def load_parsed(self, template_path):
+        """
+        :param template_path: Template file path
+        :return: pystache.parsed.ParsedTemplate object
+        """
+        return self._read(template_path, parse=True)
+
+    def _make_load_template(self):
+        """.. seealso:: :meth:`pystache.renderer.Renderer._make_load_template`
+        """
+        return lambda name: self._read(self.find_path(name))
+
+    def _make_render_engine(self):
+        """.. seealso:: :meth:`pystache.renderer.Renderer._make_render_engine`
+        """
+        engine = super(Renderer, self)._make_render_engine()
+        return RenderEngine(at_cache=self.at_cache, literal=engine.literal,
+                            escape=engine.escape,
+                            resolve_context=engine.resolve_context,
+                            resolve_partial=engine.resolve_partial,
+                            to_str=engine.to_str)
+
+
 class Engine(anytemplate.engines.base.Engine):
     """
     Template engine class to support pystache.
     """
     _name = "pystache"
-    _priority = 30
-    _file_extensions = ["mustache"]
+    _file_extensions = anytemplate.engine.builtin_spec(_name).file_extensions
+    _priority = anytemplate.engine.builtin_spec(_name).priority
 
     # _engine_valid_opts: parameters for pystache.render.Renderer.__init__()
     # _render_valid_opts: same as the above at present
@@ -58,28 +197,37 @@ class Engine(anytemplate.engines.base.Engine):
         self._roptions = self.filter_options(kwargs,
                                              self.engine_valid_options())
 
-    def _make_renderer(self, at_paths, at_encoding, **kwargs):
+    def _make_renderer(self, at_paths, at_encoding, at_cache=True, **kwargs):
         """
         :param at_paths: Template search paths
         :param at_encoding: Template encoding
+        :param at_cache: Reuse the cached renderer object if True
         :param kwargs: Keyword arguments passed to the template engine to
             render templates with specific features enabled.
         """
+        ropts = dict(self._roptions)
         for eopt in ("file_encoding", "string_encoding"):
             default = self._roptions.get(eopt, at_encoding.lower())
-            self._roptions[eopt] = kwargs.get(eopt, default)
+            ropts[eopt] = kwargs.get(eopt, default)
 
         pkey = "search_dirs"
         paths = kwargs.get(pkey, []) + self._roptions.get(pkey, [])
         if at_paths is not None:
             paths = at_paths + paths
-        self._roptions[pkey] = paths
+        ropts[pkey] = paths
+
+        if not at_cache:
+            return Renderer(at_cache=False, **ropts)
 
-        return pystache.renderer.Renderer(**self._roptions)
+        key = anytemplate.cache.make_key(ropts)
+        if key is None:
+            return Renderer(**ropts)
+
+        return _RENDERERS.get_or_set(key, lambda: Renderer(**ropts))
 
     def renders_impl(self, template_content, context, at_paths=None,
                      at_encoding=anytemplate.compat.ENCODING,
-                     **kwargs):
+                     at_cache=True, at_cache_dir=None, **kwargs):
         """
         Render given template string and return the result.
 
@@ -88,18 +236,27 @@ class Engine(anytemplate.engines.base.Engine):
             template file
         :param at_paths: Template search paths
         :param at_encoding: Template encoding
+        :param at_cache: Cache parsed template objects if True
+        :param at_cache_dir: Not used in this engine at present
         :param kwargs: Keyword arguments passed to the template engine to
             render templates with specific features enabled.
 
         :return: Rendered string
         """
-        renderer = self._make_renderer(at_paths, at_encoding, **kwargs)
+        renderer = self._make_renderer(at_paths, at_encoding, at_cache,
+                                       **kwargs)
         ctxs = [] if context is None else [context]
 
+        if isinstance(template_content, str):
+            template_content = self.compile_cached(
+                template_content, pystache.parser.parse, at_cache=at_cache
+            )
+
         return renderer.render(template_content, *ctxs)
 
     def render_impl(self, template, context, at_paths=None,
-                    at_encoding=anytemplate.compat.ENCODING, **kwargs):
+                    at_encoding=anytemplate.compat.ENCODING, at_cache=True,
+                    at_cache_dir=None, **kwargs):
         """
         Render given template file and return the result.
 
@@ -108,20 +265,24 @@ class Engine(anytemplate.engines.base.Engine):
             template file
         :param at_paths: Template search paths
         :param at_encoding: Template encoding
+        :param at_cache: Reuse the cached renderer object, template files
+            and parsed template objects if True
+        :param at_cache_dir: Not used in this engine at present
         :param kwargs: Keyword arguments passed to the template engine to
             render templates with specific features enabled.
 
         :return: Rendered string
         """
-        renderer = self._make_renderer(at_paths, at_encoding, **kwargs)
+        renderer = self._make_renderer(at_paths, at_encoding, at_cache,
+                                       **kwargs)
         ctxs = [] if context is None else [context]
 
-        if os.path.sep in template:  # `template` is in abs/rel-path.
-            return renderer.render_path(template, *ctxs)
-        else:
+        if os.path.sep not in template:  # `template` is not in abs/rel-path.
             if template.endswith(renderer.file_extension):
                 template = os.path.splitext(template)[0]
 
-            return renderer.render_name(template, *ctxs)
+            template = renderer.find_path(template)
+
+        return renderer.render(renderer.load_parsed(template), *ctxs)
 
 # vim:sw=4:ts=4:et:
@@ -11,6 +11,11 @@
   - 'safe' to use string.Template.safe_substitute instead of
     string.Template.substitute to render templates
 
+- Templates are compiled once into lists of literal chunks and placeholder
+  names and cached, by their contents or paths and mtimes of template files,
+  so that rendering is just a join of the chunks and the values of
+  placeholders.
+
 - References:
 
   - Standard library doc, ex.
@@ -18,11 +23,100 @@
 """
 from __future__ import absolute_import
 
+import os
 import string
 
+import anytemplate.cache
 import anytemplate.compat
+import anytemplate.engine
 import anytemplate.engines.base
 import anytemplate.globals
+import anytemplate.utils
+
+
+# Cache of compiled templates of template files keyed by path and mtime.
+_FILES = anytemplate.cache.make_cache(64)
+
+
+class CompiledTemplate(object):
+    """
+    string.Template compiled into a list of literal chunks and placeholders.
+
+    >>> tmpl = CompiledTemplate("$a, ${b} and $$c")
+    >>> tmpl.substitute(dict(a=1, b="bbb"))
+    '1, bbb and $c'
+    >>> tmpl.safe_substitute(dict(a=1))
+    '1, ${b} and $c'
+    """
+    __slots__ = ("template", "chunks", "is_valid")
+
+    def __init__(self, template):
+        """
+        :param template: Template content string
+        """
+        self.template = template
+        self.chunks = []  # [(literal, None) or (placeholder, name)]
+        self.is_valid = True
+
+        pos = 0
+        literals = []
+        for mobj in string.Template.pattern.finditer(template):
+            literals.append(template[pos:mobj.start()])
+            pos = mobj.end()
+
+            name = mobj.group("named") or mobj.group("braced")
+            if name is not None:
+                self.chunks.append((''.join(literals), None))
+                self.chunks.append((mobj.group(), name))
+                literals = []
+            elif mobj.group("escaped") is not None:
+                literals.append(string.Template.delimiter)
+            else:  # invalid placeholder
+                literals.append(mobj.group())
+                self.is_valid = False
+
+        literals.append(template[pos:])
+        self.chunks.append((''.join(literals), None))
+        self.chunks = [c for c in self.chunks if c[0]]
+
+    def substitute(self, mapping):
+        """
+        .. seealso:: :meth:`string.Template.substitute`
+        """
+        if not self.is_valid:  # Let string.Template process errors.
+            return string.Template(self.template).substitute(mapping)
+
+        return ''.join([text if name is None else str(mapping[name])
+                        for text, name in self.chunks])
+
+    def safe_substitute(self, mapping):
+        """
+        .. seealso:: :meth:`string.Template.safe_substitute`
+        """
+        def _get(text, name):
+            """Get the value of `name` or `text` if not found."""
+            try:
+                return str(mapping[name])
+            except KeyError:
+                return text
+
+        return ''.join([text if name is None else _get(text, name)
+                        for text, name in self.chunks])
+
+
+def _substitute(tmpl, context, safe=False):
+    """
+    :param tmpl: :class:`CompiledTemplate` object
+    :param context: A dict or dict-like object
+    :param safe: Safely substitute parameters in templates if True
+    """
+    if safe:
+        return tmpl.safe_substitute(context)
+
+    try:
+        return tmpl.substitute(context)
+    except KeyError as exc:
+        raise anytemplate.globals.CompileError(str(exc))
 
 
 def renders(template_content, context, **options):
@@ -34,19 +128,18 @@ def renders(template_content, context, **options):
 
         - at_paths: Template search paths (common option)
         - at_encoding: Template encoding (common option)
+        - at_cache: Cache compiled templates if True (common option)
         - safe: Safely substitute parameters in templates, that is,
           original template content will be returned if some of template
           parameters are not found in given context
 
     :return: Rendered string
     """
-    if options.get("safe", False):
-        return string.Template(template_content).safe_substitute(context)
-    else:
-        try:
-            return string.Template(template_content).substitute(context)
-        except KeyError as exc:
-            raise anytemplate.globals.CompileError(str(exc))
+    tmpl = anytemplate.engines.base.compile_cached(
+        Engine.name(), template_content, CompiledTemplate,
+        at_cache=options.get("at_cache", True)
+    )
+    return _substitute(tmpl, context, options.get("safe", False))
 
 
 class Engine(anytemplate.engines.base.Engine):
@@ -54,29 +147,65 @@ class Engine(anytemplate.engines.base.Engine):
     Template engine class to support string.Template.
     """
     _name = "string.Template"
-    _priority = 50
+    _file_extensions = anytemplate.engine.builtin_spec(_name).file_extensions
+    _priority = anytemplate.engine.builtin_spec(_name).priority
 
     renders_impl = anytemplate.engines.base.to_method(renders)
 
-    def render_impl(self, template, context, **options):
+    def render_impl(self, template, context, at_paths=None,
+                    at_encoding=anytemplate.compat.ENCODING, at_cache=True,
+                    **options):
         """
         Inherited class must implement this!
 
         :param template: Template file path
         :param context: A dict or dict-like object to instantiate given
             template file
+        :param at_paths: Template search paths (common option)
+        :param at_encoding: Template encoding (common option)
+        :param at_cache: Cache compiled templates if True (common option)
         :param options: Same options as :meth:`renders_impl`
 
-            - at_paths: Template search paths (common option)
-            - at_encoding: Template encoding (common option)
             - safe: Safely substitute parameters in templates, that is,
               original template content will be returned if some of template
               parameters are not found in given context
 
         :return: To be rendered string in inherited classes
         """
-        ropts = dict((k, v) for k, v in options.items() if k != "safe")
-        tmpl = anytemplate.engines.base.fallback_render(template, {}, **ropts)
-        return self.renders_impl(tmpl, context, **options)
+        filepath = anytemplate.utils.find_template_from_path(template,
+                                                             at_paths)
+        if filepath is None:
+            raise anytemplate.globals.TemplateNotFound(f"template: {template}")
+
+        def _compile():
+            """Load and compile template file."""
+            return CompiledTemplate(
+                anytemplate.engines.base.read_template(filepath, at_encoding)
+            )
+
+        if at_cache:
+            stat = os.stat(filepath)
+            key = (filepath, stat.st_mtime_ns, stat.st_size, at_encoding)
+            tmpl = _FILES.get_or_set(key, _compile)
+        else:
+            tmpl = _compile()
+
+        return _substitute(tmpl, context, options.get("safe", False))
+
+    def dependencies_impl(self, template, at_paths=None, **options):
+        """
+        :param template: Template file path
+        :param at_paths: Template search paths (common option)
+
+        :return: A list of given template file path only as string.Template
+            does not support to include other templates
+        :throw: TemplateNotFound
+        """
+        filepath = anytemplate.utils.find_template_from_path(template,
+                                                             at_paths)
+        if filepath is None:
+            raise anytemplate.globals.TemplateNotFound(f"template: {template}")
+
+        return [filepath]
 
 # vim:sw=4:ts=4:et:
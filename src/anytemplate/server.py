@@ -0,0 +1,270 @@
+#
+# Copyright (C) 2015 - 2018 Satoru SATOH <ssato @ redhat.com>
+# License: MIT
+#
+"""anytemplate.server - Daemon to run the CLI in a long-running process.
+
+The daemon started with 'anytemplate_cli serve SOCK' listens on the Unix
+domain socket SOCK, and runs the CLI with the arguments sent from the clients
+started with 'anytemplate_cli --connect SOCK ...', so that template engines,
+compiled templates and parsed contexts are kept warm among them.
+
+Requests are processed one by one in the daemon, in the working dir of each
+client with stdin, stdout and stderr replaced with ones forwarded to it, and
+warnings and errors logged are forwarded to its stderr too.
+
+The protocol between them is described in :mod:`anytemplate.client`.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import logging
+import os
+import pickle
+import signal
+import socket
+import socketserver
+import sys
+import traceback
+
+import anytemplate.cache
+import anytemplate.cli
+import anytemplate.globals
+import anytemplate.utils
+
+from anytemplate.client import (
+    ARGS, STDOUT, STDERR, EXIT, send_frame, recv_frame
+)
+
+
+LOGGER = anytemplate.globals.LOGGER
+
+
+class FrameWriter(io.TextIOBase):
+    """
+    Text stream sends the strings written to it as frames.
+    """
+    def __init__(self, sock, kind, encoding="utf-8"):
+        """
+        :param sock: Socket object
+        :param kind: Type of the frames, STDOUT or STDERR
+        :param encoding: Character set encoding of the payloads
+        """
+        super(FrameWriter, self).__init__()
+        self._sock = sock
+        self._kind = kind
+        self._encoding = encoding
+
+    @property
+    def encoding(self):
+        return self._encoding
+
+    def writable(self):
+        return True
+
+    def write(self, content):
+        if content:
+            send_frame(self._sock, self._kind,
+                       content.encode(self._encoding, "surrogateescape"))
+        return len(content)
+
+
+class ContextCache(object):
+    """
+    Cache of merged contexts kept until any of the context files or the
+    schema file is changed. Contexts are kept pickled to give a copy of them
+    to each request, because engines and templates may modify them.
+    """
+    def __init__(self, maxsize=16):
+        """
+        :param maxsize: Maximum number of merged contexts to keep
+        """
+        self._cache = anytemplate.cache.make_cache(maxsize)
+
+    def _make_key(self, contexts, schema, kwargs):
+        """
+        :return: The key of the merged context or None if it cannot be cached
+        """
+        files = anytemplate.utils.concat(
+            anytemplate.utils.parse_filespec(c) for c in contexts
+        )
+        paths = [path for path, _type in files]
+        if schema is not None:
+            paths.append(schema)
+
+        if '-' in paths:
+            return None
+
+        try:
+            stats = tuple(anytemplate.utils.file_key(p) for p in paths)
+        except OSError:
+            return None
+
+        opts = anytemplate.cache.make_key(kwargs)
+        if opts is None:
+            return None
+
+        return (os.getcwd(), tuple(contexts), schema, opts, stats)
+
+    def load(self, contexts, schema=None, werr=False, **kwargs):
+        """
+        Same as :func:`anytemplate.utils.parse_and_load_contexts` but load
+        the merged context from the cache if possible.
+        """
+        key = self._make_key(contexts, schema, dict(kwargs, werr=werr))
+        if key is None:
+            return anytemplate.utils.parse_and_load_contexts(
+                contexts, schema, werr, **kwargs
+            )
+
+        data = self._cache.get(key)
+        if data is None:
+            ctx = anytemplate.utils.parse_and_load_contexts(
+                contexts, schema, werr, **kwargs
+            )
+            try:
+                self._cache.set(key, pickle.dumps(
+                    ctx, protocol=pickle.HIGHEST_PROTOCOL
+                ))
+            except (pickle.PicklingError, TypeError, AttributeError):
+                pass
+            return ctx
+
+        return pickle.loads(data)
+
+
+class Server(socketserver.UnixStreamServer):
+    """
+    Daemon runs the CLI for the requests from clients one by one.
+    """
+    def __init__(self, path):
+        """
+        :param path: Path of the Unix domain socket to listen on
+        """
+        self.contexts = ContextCache()
+        umask = os.umask(0o077)  # Only the owner may connect to it.
+        try:
+            super(Server, self).__init__(path, RequestHandler)
+        finally:
+            os.umask(umask)
+
+    def run(self, req, stdout, stderr):
+        """
+        Run the CLI for the request `req`.
+
+        :param req: A dict has 'argv', 'cwd' and 'stdin'
+        :param stdout: Stream to write stdout of the CLI to
+        :param stderr: Stream to write stderr of the CLI to
+        :return: Exit code
+        """
+        saved = (sys.stdin, sys.stdout, sys.stderr, os.getcwd(),
+                 LOGGER.level)
+        handler = logging.StreamHandler(stderr)
+        handler.setLevel(logging.WARNING)
+        LOGGER.addHandler(handler)
+        try:
+            os.chdir(req["cwd"])
+            sys.stdin = io.StringIO(req.get("stdin") or '')
+            (sys.stdout, sys.stderr) = (stdout, stderr)
+            return anytemplate.cli.run(req["argv"],
+                                       load_contexts=self.contexts.load,
+                                       allow_connect=False)
+        except Exception:  # pylint: disable=broad-except
+            traceback.print_exc(file=stderr)
+            return 1
+        finally:
+            (sys.stdin, sys.stdout, sys.stderr) = saved[:3]
+            os.chdir(saved[3])
+            LOGGER.setLevel(saved[4])
+            LOGGER.removeHandler(handler)
+
+
+class RequestHandler(socketserver.BaseRequestHandler):
+    """
+    Handler of a request from a client.
+    """
+    def handle(self):
+        (kind, payload) = recv_frame(self.request)
+        if kind != ARGS:
+            return
+
+        try:
+            req = json.loads(payload.decode("utf-8"))
+            code = self.server.run(req, FrameWriter(self.request, STDOUT),
+                                   FrameWriter(self.request, STDERR))
+            send_frame(self.request, EXIT, str(code or 0).encode("ascii"))
+        except (OSError, ValueError, KeyError) as exc:
+            LOGGER.warning("Failed to process the request: %r", exc)
+
+
+def _remove_stale_socket(path):
+    """
+    Remove the socket file `path` if no daemon listens on it.
+
+    :throw: OSError if any daemon listens on it
+    """
+    if not os.path.exists(path):
+        return
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        os.remove(path)
+        return
+    finally:
+        sock.close()
+
+    raise OSError(f"The daemon is already running on {path}")
+
+
+def serve(path):
+    """
+    Run the daemon listens on the Unix domain socket `path` until it's
+    terminated.
+
+    :param path: Path of the Unix domain socket
+    """
+    _remove_stale_socket(path)
+    signal.signal(signal.SIGTERM, lambda *_args: sys.exit(0))
+    try:
+        with Server(path) as server:
+            LOGGER.info("Listening on %s", path)
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def main(argv=None):
+    """
+    Entrypoint of 'anytemplate_cli serve'.
+
+    :param argv: A list of arguments without the program name and 'serve'
+    :return: Exit code
+    """
+    psr = argparse.ArgumentParser(prog="anytemplate_cli serve")
+    psr.add_argument("socket", help="Path of the Unix domain socket to "
+                                    "listen on")
+    psr.add_argument("-v", "--verbose", action="store_true",
+                     help="Verbose mode")
+    args = psr.parse_args(sys.argv[2:] if argv is None else argv)
+
+    if args.verbose:
+        LOGGER.addHandler(logging.StreamHandler())
+        LOGGER.setLevel(logging.INFO)
+
+    try:
+        serve(args.socket)
+    except OSError as exc:
+        print(f"Failed to start the daemon: {exc}", file=sys.stderr)
+        return 1
+
+    return 0
+
+# vim:sw=4:ts=4:et:
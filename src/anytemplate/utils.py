@@ -7,24 +7,62 @@
 from __future__ import absolute_import, print_function
 
 import codecs
+import functools
 import glob
+import hashlib
 import logging
 import os.path
 import os
+import pickle
 import sys
+import threading
+import time
 
+import anytemplate.cache
 import anytemplate.compat
-
-try:
-    from anyconfig.api import loads, load, merge
-except ImportError:
-    from anytemplate.compat import (
-        json_loads as loads, json_load as load, merge
-    )
+import anytemplate.globals
 
 
 LOGGER = logging.getLogger(__name__)
 
+# Functions to load and merge contexts, (loads, load, merge), imported lazily
+# by _get_context_loaders() because importing anyconfig is not cheap.
+_CONTEXT_LOADERS = None
+
+# Validators compiled from JSON schema files, keyed by the paths, sizes and
+# mtimes of them, and the results of validations keyed by the schema files and
+# the context files validated.
+_SCHEMA_VALIDATORS = anytemplate.cache.make_cache(16)
+_VALIDATIONS = anytemplate.cache.make_cache(1024)
+
+# Maximum number of snapshots of parsed contexts kept in the cache dir; the
+# least recently used ones are removed if it exceeded.
+MAX_CONTEXT_SNAPSHOTS = 256
+
+# The identity of the anyconfig installed, made on demand, to make snapshots
+# of parsed contexts stale on its upgrades.
+_ANYCONFIG_KEY = None
+
+
+def _get_context_loaders():
+    """
+    Import functions to load and merge contexts from anyconfig if it's
+    available or fallback ones.
+
+    :return: A tuple of functions, (loads, load, merge)
+    """
+    global _CONTEXT_LOADERS  # pylint: disable=global-statement
+    if _CONTEXT_LOADERS is None:
+        try:
+            from anyconfig.api import loads, load, merge
+        except ImportError:
+            from anytemplate.compat import (
+                json_loads as loads, json_load as load, merge
+            )
+        _CONTEXT_LOADERS = (loads, load, merge)
+
+    return _CONTEXT_LOADERS
+
 
 def get_output_stream(encoding=anytemplate.compat.ENCODING,
                       ostream=sys.stdout):
@@ -156,59 +194,505 @@ def parse_filespec(fspec, sep=':', gpat='*'):
         if gpat in fspec else [flip(tpl)]
 
 
-def load_context(ctx_path, ctx_type, scm=None):
+def _get_anyconfig_key():
+    """
+    :return: A tuple of (absolute path, size, mtime in nsec) of the module
+        file of anyconfig, or None if it's not available, without importing
+        it as it's not cheap
+    """
+    global _ANYCONFIG_KEY  # pylint: disable=global-statement
+    if _ANYCONFIG_KEY is None:
+        import importlib.util
+
+        try:
+            spec = importlib.util.find_spec("anyconfig")
+            _ANYCONFIG_KEY = (file_key(spec.origin), )
+        except (ImportError, ValueError, AttributeError, TypeError, OSError):
+            _ANYCONFIG_KEY = (None, )
+
+    return _ANYCONFIG_KEY[0]
+
+
+def _context_snapshot_path(cache_dir, ctx_path, ctx_type, scm=None):
+    """
+    :param cache_dir: Dir to save snapshots of parsed contexts
+    :param ctx_path: context file path
+    :param ctx_type: context file type
+    :param scm: JSON schema file to validate given context file or None
+
+    :return: The path of the snapshot file of given context file
+    :throw: OSError if context file or schema file is not accessible
+    """
+    key = [anytemplate.globals.VERSION, sys.version_info[:2],
+           _get_anyconfig_key(), ctx_type]
+    for path in (ctx_path, scm):
+        if path is not None:
+            key += file_key(path)
+
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, "contexts", digest + ".pickle")
+
+
+def _prune_context_snapshots(snapdir, maxsize=None):
+    """
+    Remove the least recently used snapshots of parsed contexts in `snapdir`
+    to keep `maxsize` ones at most. Errors are ignored as it's just a cache.
+
+    :param snapdir: Dir of snapshots
+    :param maxsize: Maximum number of snapshots or None (MAX_CONTEXT_SNAPSHOTS)
+    """
+    if maxsize is None:
+        maxsize = MAX_CONTEXT_SNAPSHOTS
+
+    try:
+        entries = [e for e in os.scandir(snapdir)
+                   if e.name.endswith(".pickle")]
+        if len(entries) <= maxsize:
+            return
+
+        entries.sort(key=lambda e: e.stat().st_mtime_ns)
+        for entry in entries[:len(entries) - maxsize]:
+            os.remove(entry.path)
+    except OSError as exc:
+        LOGGER.debug("Failed to prune the snapshots in %s: %r", snapdir, exc)
+
+
+def _save_context_snapshot(path, ctx):
+    """
+    Save the snapshot of parsed context `ctx` atomically. Errors are ignored
+    as it's just a cache.
+
+    :param path: Snapshot file path
+    :param ctx: Parsed context object
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "wb") as out:
+            pickle.dump(ctx, out, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except (OSError, pickle.PicklingError, TypeError, AttributeError) as exc:
+        LOGGER.debug("Failed to save the snapshot %s: %r", path, exc)
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return
+
+    _prune_context_snapshots(os.path.dirname(path))
+
+
+def file_key(path):
+    """
+    :param path: File path
+    :return: A tuple of (absolute path, size, mtime in nsec) of the file
+    :throw: OSError if the file is not accessible
+    """
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _make_schema_validator(scm):
+    """
+    :param scm: JSON schema file path
+    :return: A callable takes a context object and returns a tuple of the
+        error messages of validation or None if jsonschema is not available
+    """
+    try:
+        import jsonschema
+    except ImportError:
+        LOGGER.warning("Contexts are not validated as jsonschema looks "
+                       "missing")
+        return None
+
+    schema = _get_context_loaders()[1](scm)
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)  # :throw: jsonschema.SchemaError
+    validator = cls(schema)
+
+    def validate(ctx):
+        """Validate context `ctx`."""
+        return tuple(err.message for err in validator.iter_errors(ctx))
+
+    return validate
+
+
+def get_schema_validator(scm):
+    """
+    Get the validator of JSON schema file `scm`. It's loaded and compiled
+    only once unless the schema file is changed.
+
+    :param scm: JSON schema file path
+    :return: A callable same as :func:`_make_schema_validator` returns
+    :throw: OSError if the schema file is not accessible
+    """
+    return _SCHEMA_VALIDATORS.get_or_set(
+        file_key(scm), functools.partial(_make_schema_validator, scm)
+    )
+
+
+def validate_context(ctx, scm, key=None):
+    """
+    Validate context `ctx` with JSON schema file `scm`. Results are cached
+    and reused for the contexts of the same source if `key` was given.
+
+    :param ctx: Context object, a dict
+    :param scm: JSON schema file path
+    :param key: A hashable object identifies the source of `ctx`, e.g. the
+        paths, sizes and mtimes of the context files it was loaded from, or
+        None not to cache the result; hashing the context itself may cost as
+        much as validating it
+    :return: A tuple of the error messages, empty if `ctx` is valid
+    """
+    validate = get_schema_validator(scm)
+    if validate is None:
+        return ()
+
+    if key is None:
+        return validate(ctx)
+
+    return _VALIDATIONS.get_or_set((file_key(scm), key),
+                                   functools.partial(validate, ctx))
+
+
+def _files_key(files):
+    """
+    :param files: A list of tuples of (context file path, type)
+    :return: A tuple identifies the contents of the context files, or None if
+        any of them is stdin or not accessible
+
+    >>> _files_key([('-', None)]) is None
+    True
+    """
+    if any(path == '-' for path, _ctype in files):
+        return None
+
+    try:
+        return tuple((file_key(path), ctype) for path, ctype in files)
+    except OSError:
+        return None
+
+
+def _load_context(ctx_path, ctx_type, scm=None):
     """
     :param ctx_path: context file path or '-' (read from stdin)
     :param ctx_type: context file type
-    :param scm: JSON schema file in any formats anyconfig supports, to
-        validate given context files
+    :param scm: JSON schema file to validate given context file or None
+    :return: The loaded context or None if it's not valid
     """
+    (loads, load, _merge) = _get_context_loaders()
     if ctx_path == '-':
-        return loads(sys.stdin.read(), ac_parser=ctx_type, ac_schema=scm)
+        ctx = loads(sys.stdin.read(), ac_parser=ctx_type)
+    else:
+        ctx = load(ctx_path, ac_parser=ctx_type)
+
+    if ctx is not None and scm is not None:
+        errors = validate_context(ctx, scm, _files_key([(ctx_path, ctx_type)]))
+        if errors:
+            LOGGER.warning("Ignored the context %s not valid: %s",
+                           ctx_path, "; ".join(errors))
+            return None
+
+    return ctx
+
+
+def load_context(ctx_path, ctx_type, scm=None, cache_dir=None):
+    """
+    :param ctx_path: context file path or '-' (read from stdin)
+    :param ctx_type: context file type
+    :param scm: JSON schema file in any formats anyconfig supports, to
+        validate given context files; see :func:`validate_context`
+    :param cache_dir: Dir to save snapshots of parsed contexts to and load
+        them from, instead of parsing context files not changed again, or
+        None. Snapshots are keyed by the paths, sizes and mtimes of context
+        file and schema file, file type and the versions of python, anytemplate
+        and anyconfig, and MAX_CONTEXT_SNAPSHOTS ones used recently are kept.
+        Please note that snapshots are in pickle format and this dir must not
+        be writable by others.
+    """
+    if ctx_path == '-' or cache_dir is None:
+        return _load_context(ctx_path, ctx_type, scm)
+
+    try:
+        snapshot = _context_snapshot_path(cache_dir, ctx_path, ctx_type, scm)
+    except OSError:  # Let anyconfig process errors.
+        return _load_context(ctx_path, ctx_type, scm)
+
+    try:
+        with open(snapshot, "rb") as inp:
+            ctx = pickle.load(inp)
+        try:
+            os.utime(snapshot)  # Mark it used recently.
+        except OSError:
+            pass
+        return ctx
+    except FileNotFoundError:
+        pass
+    except Exception as exc:  # pylint: disable=broad-except
+        # Snapshots may be broken or stale, e.g. refer to classes removed.
+        LOGGER.debug("Ignored the snapshot %s: %r", snapshot, exc)
+
+    ctx = _load_context(ctx_path, ctx_type, scm)
+    if ctx is not None:
+        _save_context_snapshot(snapshot, ctx)
 
-    return load(ctx_path, ac_parser=ctx_type, ac_schema=scm)
+    return ctx
 
 
-def parse_and_load_contexts(contexts, schema=None, werr=False):
+def _load_context_itr(files, schema=None, workers=1, executor=None,
+                      cache_dir=None):
+    """
+    Load context files in parallel if needed.
+
+    :param files: A list of tuples of (context file path, file type)
+    :param schema: JSON schema file to validate context files
+    :param workers: Number of worker processes or None to use the number of
+        CPUs; context files are loaded in this process if it's 1
+    :param executor: concurrent.futures.Executor object to load context files
+        in instead of the pool of `workers` processes, or None
+    :param cache_dir: Dir to save snapshots of parsed contexts or None
+
+    :return: A generator yields callables return the loaded contexts or raise
+        the errors occurred, in the same order as `files`
+    """
+    if executor is None and workers != 1 and len(files) > 1:
+        import concurrent.futures
+
+        workers = min(workers or os.cpu_count() or 1, len(files))
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            for load_fn in _load_context_itr(files, schema, executor=pool,
+                                             cache_dir=cache_dir):
+                yield load_fn
+        return
+
+    # Submit all of them first to load them concurrently.
+    load_fns = [
+        functools.partial(load_context, ctx_path, ctx_type, scm=schema,
+                          cache_dir=cache_dir)
+        if executor is None or ctx_path == '-'  # Read stdin in this process.
+        else executor.submit(load_context, ctx_path, ctx_type, scm=schema,
+                             cache_dir=cache_dir).result
+        for ctx_path, ctx_type in files
+    ]
+    for load_fn in load_fns:
+        yield load_fn
+
+
+def parse_and_load_contexts(contexts, schema=None, werr=False, workers=1,
+                            executor=None, cache_dir=None,
+                            validate_merged=False):
     """
     :param contexts: list of context file specs
     :param schema: JSON schema file in any formats anyconfig supports, to
         validate given context files
     :param werr: Exit immediately if True and any errors occurrs
         while loading context files
+    :param workers: Number of worker processes to load context files in
+        parallel or None to use the number of CPUs; these are loaded one by
+        one in this process if it's 1 (default)
+    :param executor: concurrent.futures.Executor object such as
+        ThreadPoolExecutor to load context files in, instead of the pool of
+        `workers` processes
+    :param cache_dir: Dir to save snapshots of parsed contexts to and load
+        them from, or None; see :func:`load_context`
+    :param validate_merged: Validate the merged context only once with
+        `schema` instead of each context file if True; the context is empty
+        or ValueError is raised if `werr` is True, if it's not valid
+
+    Context files are merged in the same order as given regardless of how
+    these were loaded.
     """
     ctx = dict()
     diff = None
+    files = []
 
     if contexts:
-        for ctx_path, ctx_type in concat(parse_filespec(c) for c in contexts):
+        merge = _get_context_loaders()[2]
+        files = list(concat(parse_filespec(c) for c in contexts))
+        scm = None if validate_merged else schema
+        for load_fn in _load_context_itr(files, scm, workers, executor,
+                                         cache_dir):
             try:
-                diff = load_context(ctx_path, ctx_type, scm=schema)
+                diff = load_fn()
                 if diff is not None:
                     merge(ctx, diff)
             except (IOError, OSError, AttributeError):
                 if werr:
                     raise
+
+    if validate_merged and schema is not None:
+        errors = validate_context(ctx, schema, _files_key(files))
+        if errors:
+            msg = f"The merged context is not valid: {'; '.join(errors)}"
+            if werr:
+                raise ValueError(msg)
+
+            LOGGER.warning("Ignored the context: %s", msg)
+            return dict()
+
     return ctx
 
 
+class LazyContext(dict):
+    """
+    A dict loads and merges context files on the first access to it.
+
+    Context files are loaded all at once, when any key or the whole content
+    is accessed first, and the result is kept, because any of them may
+    have the value of any key. It's a dict to be processed in the same way as
+    dicts by template engines, but :meth:`load` must be called before passing
+    it to functions access the content of dicts directly in C such as
+    json.dumps.
+    """
+    def __init__(self, contexts, schema=None, werr=False, **kwargs):
+        """
+        :param contexts: list of context file specs
+        :param schema: JSON schema file to validate given context files
+        :param werr: Raise errors occurred while loading context files
+        :param kwargs: Other keyword arguments passed to
+            :func:`parse_and_load_contexts`
+        """
+        super(LazyContext, self).__init__()
+        self._args = (contexts, schema, werr, kwargs)
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        """True if context files were loaded.
+        """
+        return self._loaded
+
+    def load(self):
+        """
+        Load and merge context files if these were not loaded yet.
+        """
+        if self._loaded:
+            return
+
+        with self._lock:
+            if not self._loaded:
+                (contexts, schema, werr, kwargs) = self._args
+                dict.update(self, parse_and_load_contexts(contexts, schema,
+                                                          werr, **kwargs))
+                self._loaded = True
+
+    def __reduce__(self):
+        """It's pickled as a dict of the loaded contexts.
+        """
+        self.load()
+        return (dict, (dict(self), ))
+
+    @classmethod
+    def fromkeys(cls, iterable, value=None):
+        """It makes a dict as it has no context files to load.
+        """
+        return dict.fromkeys(iterable, value)
+
+
+def _lazy_method(name):
+    """
+    :param name: Name of the method of dict
+    :return: The method of LazyContext loads context files before calling it
+    """
+    method = getattr(dict, name)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        """Load context files and call the method of dict."""
+        self.load()
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+for _name in ("__getitem__", "__contains__", "__iter__", "__len__",
+              "__repr__", "__eq__", "__ne__", "__or__", "__ror__", "__ior__",
+              "__reversed__", "__sizeof__", "__setitem__", "__delitem__",
+              "keys", "values", "items", "get", "copy", "pop", "popitem",
+              "setdefault", "update", "clear"):
+    setattr(LazyContext, _name, _lazy_method(_name))
+
+
+def get_running_loop():
+    """
+    :return: The running event loop of asyncio; asyncio is imported here
+        because importing it is not cheap and it's not needed until
+        coroutines run.
+    """
+    import asyncio
+
+    return asyncio.get_running_loop()
+
+
+async def parse_and_load_contexts_async(
+        contexts, schema=None, werr=False, executor=None, **kwargs):
+    """
+    Asynchronous version of :func:`parse_and_load_contexts` loads context
+    files in `executor` not to block the event loop.
+
+    :param executor: concurrent.futures.Executor object or None to use the
+        default executor of the running event loop
+    :param kwargs: Other keyword arguments passed to
+        :func:`parse_and_load_contexts`
+    """
+    loop = get_running_loop()
+    return await loop.run_in_executor(
+        executor, functools.partial(parse_and_load_contexts, contexts,
+                                    schema=schema, werr=werr, **kwargs)
+    )
+
+
+def _write_chunks(content, out):
+    """
+    :param content: Content string or an iterable yields chunks of it
+    :param out: File object to write `content` to
+    """
+    if isinstance(content, str):
+        out.write(content)
+    else:
+        for chunk in content:
+            out.write(chunk)
+
+
 def _write_to_filepath(content, output):
     """
-    :param content: Content string to write to
+    Write `content` to a temporary file in the same dir and replace `output`
+    with it on success, so that `output` is not left written partially if
+    some errors occurred while rendering `content`.
+
+    :param content: Content string or an iterable yields chunks of it
     :param output: Output file path
     """
+    output = os.path.realpath(output)
     outdir = os.path.dirname(output)
-    if outdir and not os.path.exists(outdir):
-        os.makedirs(outdir)
-
-    with anytemplate.compat.copen(output, 'w') as out:
-        out.write(content)
+    if outdir:
+        os.makedirs(outdir, exist_ok=True)  # It may race with other workers.
+
+    if os.path.exists(output) and not os.path.isfile(output):
+        # It cannot be replaced, e.g. /dev/null.
+        with anytemplate.compat.copen(output, 'w') as out:
+            _write_chunks(content, out)
+        return
+
+    tmp = f"{output}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with anytemplate.compat.copen(tmp, 'w') as out:
+            _write_chunks(content, out)
+        if os.path.exists(output):
+            os.chmod(tmp, os.stat(output).st_mode & 0o7777)
+        os.replace(tmp, output)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
 
 
 def write_to_output(content, output=None,
                     encoding=anytemplate.compat.ENCODING):
     """
-    :param content: Content string to write to
+    :param content: Content string to write to, or an iterable yields chunks
+        of it to write them one by one
     :param output: Output destination
     :param encoding: Character set encoding of outputs
     """
@@ -217,10 +701,15 @@ def write_to_output(content, output=None,
 
     if output and not output == '-':
         _write_to_filepath(content, output)
-    elif anytemplate.compat.IS_PYTHON_3:
-        print(content)
+    elif isinstance(content, str):
+        if anytemplate.compat.IS_PYTHON_3:
+            print(content)
+        else:
+            print(content.encode(encoding.lower()), file=get_output_stream())
     else:
-        print(content.encode(encoding.lower()), file=get_output_stream())
+        for chunk in content:
+            sys.stdout.write(chunk)
+        print()
 
 
 def mk_template_paths(filepath, paths=None):
@@ -234,6 +723,8 @@ def mk_template_paths(filepath, paths=None):
     ['/tmp']
     >>> mk_template_paths("/tmp/t.j2", ["/etc"])
     ['/etc', '/tmp']
+    >>> mk_template_paths("/tmp/t.j2", ["/etc", "/tmp"])
+    ['/etc', '/tmp']
     >>> mk_template_paths(None, ["/etc"])
     ['/etc']
     """
@@ -241,7 +732,120 @@ def mk_template_paths(filepath, paths=None):
         return [os.curdir] if paths is None else paths
 
     tmpldir = os.path.dirname(os.path.abspath(filepath))
-    return [tmpldir] if paths is None else paths + [tmpldir]
+    if paths is None:
+        return [tmpldir]
+
+    return paths if tmpldir in paths else paths + [tmpldir]
+
+
+class TemplateResolver(object):
+    """
+    Resolve the paths of template files with the indexes of names in the
+    search dirs.
+
+    Each dir is scanned once with os.scandir into the index, and scanned
+    again only if its mtime was changed, so that lookups of missing
+    templates are cached as well. The mtimes of dirs are not checked for
+    `ttl` seconds after the last check; it's 0 by default and may be set
+    with :func:`anytemplate.api.set_resolver_ttl` or the CLI option
+    '--resolver-ttl'.
+
+    Changes of a dir made in the same tick of the mtime as it was scanned do
+    not change its mtime, so that dirs modified within MTIME_GRANULARITY
+    nanoseconds before are not scanned, and lookups in them are answered with
+    os.path.exists until they become older than that.
+    """
+    # Coarse enough for the file systems of which timestamps are coarsest,
+    # e.g. FAT has 2 seconds granularity.
+    MTIME_GRANULARITY = 2 * 10 ** 9
+
+    def __init__(self, ttl=0, maxsize=256):
+        """
+        :param ttl: Seconds to skip checks of the mtimes of dirs
+        :param maxsize: Maximum number of dirs to keep the indexes of
+        """
+        self.ttl = ttl
+        self._indexes = anytemplate.cache.LRUCache(maxsize)
+
+    def clear(self):
+        """Clear the indexes.
+        """
+        self._indexes.clear()
+
+    def _scan(self, dirpath):
+        """
+        :param dirpath: Dir path
+        :return: A frozenset of the names of files and dirs in `dirpath`
+        """
+        try:
+            with os.scandir(dirpath) as entries:
+                return frozenset(e.name for e in entries)
+        except OSError:
+            return frozenset()
+
+    def names(self, dirpath):
+        """
+        :param dirpath: Dir path
+        :return: A frozenset of the names of files and dirs in `dirpath`, or
+            None if it was modified too recently to be scanned
+        """
+        if not os.path.isabs(dirpath):  # The current dir may be changed.
+            dirpath = os.path.abspath(dirpath)
+
+        now = time.monotonic()
+        cached = self._indexes.get(dirpath)
+        if cached is not None and self.ttl and now - cached[0] < self.ttl:
+            return cached[2]
+
+        try:
+            mtime = os.stat(dirpath).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        if cached is not None and cached[1] == mtime and \
+                cached[2] is not None:
+            cached = (now, ) + cached[1:]
+        elif mtime is None:
+            cached = (now, mtime, frozenset())
+        elif time.time_ns() - mtime < self.MTIME_GRANULARITY:
+            cached = (now, mtime, None)
+        else:
+            cached = (now, mtime, self._scan(dirpath))
+
+        self._indexes.set(dirpath, cached)
+        return cached[2]
+
+    def exists(self, path):
+        """
+        :param path: File or dir path
+        :return: True if `path` exists
+        """
+        (dirpath, name) = os.path.split(path)
+        if not name or name in (os.curdir, os.pardir):
+            return os.path.exists(path)
+
+        names = self.names(dirpath or os.curdir)
+        if names is None:
+            return os.path.exists(path)
+
+        return name in names
+
+    def find(self, filepath, paths):
+        """
+        :param filepath: (Base) filepath of template file
+        :param paths: A list of template search paths
+        :return: Resolved path of given template file or None
+        """
+        for path in paths:
+            candidate = os.path.join(path, filepath)
+            if self.exists(candidate):
+                return candidate
+
+        return None
+
+
+# The resolver shared by template engines to find template files.
+RESOLVER = TemplateResolver()
 
 
 def find_template_from_path(filepath, paths=None):
@@ -254,10 +858,8 @@ def find_template_from_path(filepath, paths=None):
     if paths is None or not paths:
         paths = [os.path.dirname(filepath), os.curdir]
 
-    for path in paths:
-        candidate = os.path.join(path, filepath)
-        if os.path.exists(candidate):
-            return candidate
-
-    LOGGER.warning("Could not find template=%s in paths=%s", filepath, paths)
-    return None
+    candidate = RESOLVER.find(filepath, paths)
+    if candidate is None:
+        LOGGER.warning("Could not find template=%s in paths=%s", filepath,
+                       paths)
+    return candidate
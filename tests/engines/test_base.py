@@ -5,6 +5,10 @@
 # pylint: disable=missing-docstring
 from __future__ import absolute_import
 
+import threading
+
+import pytest
+
 import anytemplate.engines.base as TT  # stands for test target
 
 
@@ -23,3 +27,54 @@ def test_instance_methods():
 
     engine.renders("aaa")
     engine.render(__file__)
+
+
+def test_compile_cached():
+    compiled = []
+
+    def compile_fn(content):
+        compiled.append(content)
+        return content.upper()
+
+    for _i in range(2):
+        assert TT.compile_cached("t", "aaa", compile_fn) == "AAA"
+    assert compiled == ["aaa"]
+
+    assert TT.compile_cached("t", "aaa", compile_fn, dict(a=1)) == "AAA"
+    assert TT.compile_cached("t", "aaa", compile_fn, at_cache=False) == "AAA"
+    assert compiled == ["aaa"] * 3
+
+
+def test_iter_writes():
+    def _render(out):
+        for idx in range(1000):
+            out.write(f"{idx},")
+
+    exp = ''.join(f"{idx}," for idx in range(1000))
+    chunks = list(TT.iter_writes(_render, 100, 2))
+    assert len(chunks) > 1
+    assert ''.join(chunks) == exp
+
+
+def test_iter_writes__errors_and_cancel():
+    def _render(out):
+        out.write("a")
+        raise ValueError("err")
+
+    with pytest.raises(ValueError):
+        list(TT.iter_writes(_render, 1))
+
+    stopped = threading.Event()
+
+    def _render_forever(out):
+        try:
+            while True:
+                out.write("a")
+        finally:
+            stopped.set()
+
+    chunks = TT.iter_writes(_render_forever, 10, 1)
+    assert next(chunks) == "a" * 10
+    assert not stopped.is_set()
+    chunks.close()
+    assert stopped.wait(5)  # The rendering was stopped.
@@ -2,11 +2,17 @@
 # Copyright (C) 2011 - 2015 Satoru SATOH <ssato at redhat.com>
 # SPDX-License-Identifier: MIT
 #
-# pylint: disable=missing-docstring
+# pylint: disable=missing-docstring, protected-access
 from __future__ import absolute_import
 
+import asyncio
+import os
+import threading
+
 import pytest
 
+import anytemplate.engines.base as base
+
 try:
     import anytemplate.engines.jinja2 as TT
 except ImportError:
@@ -27,6 +33,38 @@ def test_ex_loader(tmp_path):
     assert res == ''.join(str(i) for i in range(0, imax))
 
 
+def test_ex_loader__glob_cached(tmp_path):
+    for i in range(3):
+        (tmp_path / f"{i}.j2").write_text(str(i))
+
+    loader = TT.FileSystemExLoader([str(tmp_path)], enable_glob=True)
+    env = TT.jinja2.Environment(loader=loader)
+    assert env.get_template("*.j2").render() == "012"
+
+    (tmp_path / "3.j2").write_text("3")  # The dir was updated.
+    assert env.get_template("*.j2").render() == "0123"
+
+    (tmp_path / "0.j2").write_text("a")
+    os.utime(tmp_path / "0.j2", ns=(0, 0))  # The file was updated.
+    assert env.get_template("*.j2").render() == "a123"
+
+
+def test_ex_loader__uptodate_ttl(tmp_path, monkeypatch):
+    tmpl = tmp_path / "a.j2"
+    tmpl.write_text("a")
+
+    loader = TT.FileSystemExLoader([str(tmp_path)], uptodate_ttl=60)
+    env = TT.jinja2.Environment(loader=loader)
+    assert env.get_template("a.j2").render() == "a"
+
+    stats = []
+    stat = os.stat
+    monkeypatch.setattr(TT.os, "stat", lambda *a: stats.append(a) or stat(*a))
+    for _i in range(3):
+        assert env.get_template("a.j2").render() == "a"
+    assert not stats
+
+
 @pytest.mark.parametrize(
     ("tmpl_s", "ctx", "exp"),
     (
@@ -56,3 +94,151 @@ def test_render(tmpl_s, ctx, opts, exp, tmp_path):
     assert TT.Engine().render(
         str(tmpl), ctx, at_paths=[str(tmp_path)], **opts
     ) == exp
+
+
+def test_get_env__cached(tmp_path):
+    engine = TT.Engine()
+    paths = [str(tmp_path)]
+    env = engine._get_env(paths, "utf-8")
+
+    assert engine._get_env(paths, "utf-8") is env
+    assert engine._get_env(["."], "utf-8") is not env
+
+    oenv = engine._get_env(paths, "utf-8", trim_blocks=True)
+    assert oenv is not env
+    assert oenv.linked_to is env
+    assert engine._get_env(paths, "utf-8", trim_blocks=True) is oenv
+
+
+def test_render__same_name_in_different_dirs(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "t.j2").write_text(name)
+
+    engine = TT.Engine()
+    for _i in range(2):
+        for name in ("a", "b"):
+            tmpl = tmp_path / name / "t.j2"
+            assert engine.render(str(tmpl)) == name
+
+
+def test_renders__compiled_template_cached():
+    engine = TT.Engine()
+    tmpl_s = "{{ a }}"
+    engine.renders(tmpl_s, dict(a=1))
+
+    size = len(base.TEMPLATE_CACHE)
+    assert engine.renders(tmpl_s, dict(a=2)) == "2"
+    assert len(base.TEMPLATE_CACHE) == size
+
+
+def test_render_async_impl(tmp_path):
+    tmpl = tmp_path / "a.j2"
+    tmpl.write_text("{{ a }}")
+    engine = TT.Engine()
+
+    res = asyncio.run(engine.render_async(str(tmpl), dict(a="aaa")))
+    assert res == "aaa"
+    assert engine.render(str(tmpl), dict(a="bbb")) == "bbb"
+
+
+def test_render_async_impl__not_blocking_loop(tmp_path, monkeypatch):
+    (tmp_path / "a.j2").write_text("{% include 'inc.d/*.j2' %}{{ a }}")
+    (tmp_path / "inc.d").mkdir()
+    (tmp_path / "inc.d" / "x.j2").write_text("x")
+
+    threads = []
+    load_files = TT.FileSystemExLoader.load_files
+
+    def record_thread(self, template):
+        threads.append(threading.get_ident())
+        return load_files(self, template)
+
+    monkeypatch.setattr(TT.FileSystemExLoader, "load_files", record_thread)
+    base.TEMPLATE_CACHE.clear()
+    TT._ENVS.clear()
+
+    res = asyncio.run(TT.Engine().render_async(str(tmp_path / "a.j2"),
+                                               dict(a="a")))
+    assert res == "xa"
+    assert len(threads) == 2
+    assert threading.get_ident() not in threads
+
+
+def test_render_impl__bytecode_cache(tmp_path):
+    tdir = tmp_path / "t"
+    tdir.mkdir()
+    (tdir / "a.j2").write_text("{{ a }}")
+    cache_dir = tmp_path / "cache"
+
+    base.TEMPLATE_CACHE.clear()
+    TT._ENVS.clear()
+    engine = TT.Engine()
+    assert engine.render(str(tdir / "a.j2"), dict(a=1),
+                         at_cache_dir=str(cache_dir)) == "1"
+
+    cache_files = list((cache_dir / "jinja2").glob("*/*.cache"))
+    assert len(cache_files) == 1
+
+    # Load the compiled template from the cache file in a new environment.
+    TT._ENVS.clear()
+    env = engine._get_env([str(tdir)], "utf-8",
+                          at_cache_dir=str(cache_dir))
+    assert env.bytecode_cache.directory == str(cache_files[0].parent)
+    assert env.get_template("a.j2").render(a=2) == "2"
+
+
+def test_render_impl__not_cached(tmp_path):
+    tmpl = tmp_path / "a.j2"
+    tmpl.write_text("{{ a }}")
+
+    TT._ENVS.clear()
+    engine = TT.Engine()
+    assert engine.render(str(tmpl), dict(a=1), at_cache=False) == "1"
+    assert engine.render(str(tmpl), dict(a=1), at_cache=False,
+                         trim_blocks=True) == "1"
+    assert engine.renders("{{ a }}", dict(a=2), at_cache=False) == "2"
+    assert not TT._ENVS
+
+    assert engine.render(str(tmpl), dict(a=1), trim_blocks=True) == "1"
+    assert len(TT._ENVS) == 2
+
+
+@pytest.mark.parametrize("at_init", (True, False))
+def test_render_impl__bytecode_cache_by_options(at_init, tmp_path):
+    tmpl = tmp_path / "a.j2"
+    tmpl.write_text("{% if 1 %}\nx\n{% endif %}")
+    cache_dir = str(tmp_path / "cache")
+
+    def render(engine, **opts):
+        base.TEMPLATE_CACHE.clear()
+        TT._ENVS.clear()
+        return engine.render(str(tmpl), {}, at_cache_dir=cache_dir, **opts)
+
+    if at_init:
+        assert render(TT.Engine(trim_blocks=True)) == "x\n"
+    else:
+        assert render(TT.Engine(), trim_blocks=True) == "x\n"
+
+    assert render(TT.Engine()) == "\nx\n"
+
+
+def test_dependencies(tmp_path):
+    incdir = tmp_path / "inc.d"
+    incdir.mkdir()
+    (incdir / "a.j2").write_text("a")
+    (incdir / "b.j2").write_text("{% import 'macros.j2' as m %}")
+    (tmp_path / "macros.j2").write_text("")
+    (tmp_path / "base.j2").write_text("{% block x %}{% endblock %}")
+    tmpl = tmp_path / "t.j2"
+    tmpl.write_text("{% extends 'base.j2' %}"
+                    "{% block x %}{% include 'inc.d/*.j2' %}{% endblock %}")
+
+    deps = TT.Engine().dependencies(str(tmpl))
+    assert sorted(deps) == sorted(
+        str(p) for p in (tmpl, tmp_path / "base.j2", incdir / "a.j2",
+                         incdir / "b.j2", incdir, tmp_path / "macros.j2")
+    )
+
+    tmpl.write_text("{% include name %}")
+    assert TT.Engine().dependencies(str(tmpl)) is None
@@ -2,7 +2,7 @@
 # Copyright (C) 2015 Satoru SATOH <ssato at redhat.com>
 # SPDX-License-Identifier: MIT
 #
-# pylint: disable=missing-docstring, invalid-name
+# pylint: disable=missing-docstring, invalid-name, protected-access
 from __future__ import absolute_import
 
 import pytest
@@ -47,3 +47,86 @@ def test_render(tmpl_s, ctx, exp, tmp_path):
     assert TT.Engine().render(
         str(tmpl), ctx, at_paths=[str(tmp_path)]
     ) == exp
+
+
+def test_render__lookup_reused(tmp_path):
+    tmpl = tmp_path / "a.t"
+    tmpl.write_text("a = ${a}")
+
+    engine = TT.Engine()
+    paths = [str(tmp_path)]
+    for ctx in ({'a': 1}, {'a': 2}):
+        assert engine.render(str(tmpl), ctx, at_paths=paths) == \
+            f"a = {ctx['a']}"
+
+    lookup = engine._get_lookup(paths, input_encoding="utf-8",
+                                output_encoding="utf-8")
+    assert "/a.t" in lookup._collection
+    assert engine.lookup_options.get("directories") is None
+
+
+def test_render__module_directory(tmp_path):
+    tmpl = tmp_path / "a.t"
+    tmpl.write_text("hello")
+    cache_dir = tmp_path / "cache"
+
+    assert TT.Engine().render(str(tmpl), at_cache_dir=str(cache_dir)) == \
+        "hello"
+    assert list((cache_dir / "mako").glob("**/a.t.py"))
+
+
+def test_render__module_directory_by_options(tmp_path):
+    tmpl = tmp_path / "a.t"
+    tmpl.write_text("${a}\n")
+    cache_dir = str(tmp_path / "cache")
+    engine = TT.Engine()
+
+    assert engine.render(str(tmpl), dict(a="<b>"), at_cache_dir=cache_dir,
+                         default_filters=['h']) == "&lt;b&gt;\n"
+    assert engine.render(str(tmpl), dict(a="<b>"),
+                         at_cache_dir=cache_dir) == "<b>\n"
+
+
+def test_render__module_directory_by_paths(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    tmpls = []
+    for name in ('a', 'b'):
+        (tmp_path / name).mkdir()
+        tmpl = tmp_path / name / "t.mako"
+        tmpl.write_text(name.upper() + " ${x}")
+        tmpls.append(tmpl)
+
+    engine = TT.Engine()
+    for tmpl in tmpls:
+        assert engine.render(str(tmpl), dict(x=1), at_cache_dir=cache_dir,
+                             at_paths=[str(tmpl.parent)]) == \
+            tmpl.parent.name.upper() + " 1"
+
+    # The other template of the same uri in the search paths.
+    paths = [str(t.parent) for t in tmpls]
+    assert engine.render(str(tmpls[1]), dict(x=2), at_cache_dir=cache_dir,
+                         at_paths=paths) == "B 2"
+    assert engine.render(str(tmpls[0]), dict(x=2), at_cache_dir=cache_dir,
+                         at_paths=paths) == "A 2"
+    assert len(list((tmp_path / "cache" / "mako").glob("**/t.mako.py"))) == 4
+
+
+def test_render_iter(tmp_path):
+    tmpl = tmp_path / "a.mako"
+    tmpl.write_text("<%page args='n'/>\n"
+                    "% for i in range(n):\n${i}\n% endfor\n")
+    engine = TT.Engine()
+    exp = engine.render(str(tmpl), dict(n=20000))
+
+    chunks = list(engine.render_iter(str(tmpl), dict(n=20000)))
+    assert len(chunks) > 1
+    assert ''.join(chunks) == exp
+    assert list(engine.renders_iter("${a}", dict(a=1))) == ["1"]
+
+
+def test_render_iter__format_exceptions():
+    engine = TT.Engine()
+    res = ''.join(engine.renders_iter("a${b.c}", dict(b=1),
+                                      format_exceptions=True))
+    assert "AttributeError" in res
+    assert not res.startswith('a')
@@ -2,11 +2,16 @@
 # Copyright (C) 2015 Satoru SATOH <ssato at redhat.com>
 # SPDX-License-Identifier: MIT
 #
-# pylint: disable=missing-docstring, invalid-name
+# pylint: disable=missing-docstring, invalid-name, protected-access
 from __future__ import absolute_import
 
+import concurrent.futures
+import os
+
 import pytest
 
+import anytemplate.engines.base as base
+
 try:
     import anytemplate.engines.pystache as TT
 except ImportError:
@@ -42,3 +47,68 @@ def test_render(tmpl_s, ctx, opts, exp, tmp_path):
     assert TT.Engine().render(
         tmpl.name, ctx, at_paths=[str(tmp_path)], **opts
     ) == exp
+
+
+def test_render__partials(tmp_path):
+    tmpl = tmp_path / "a.mustache"
+    tmpl.write_text("Hello, {{> name}}!")
+    partial = tmp_path / "name.mustache"
+    partial.write_text("{{name}}")
+
+    engine = TT.Engine()
+    for name in ("John", "Paul"):
+        assert engine.render(str(tmpl), {"name": name}) == f"Hello, {name}!"
+
+    partial.write_text("Mr. {{name}}")
+    os.utime(partial, ns=(0, 0))  # Make sure mtime is changed.
+    assert engine.render(str(tmpl), {"name": "John"}) == "Hello, Mr. John!"
+
+
+def test_make_renderer__cached():
+    engine = TT.Engine()
+    renderer = engine._make_renderer(["."], "utf-8")
+
+    assert engine._make_renderer(["."], "utf-8") is renderer
+    assert engine._make_renderer(["/"], "utf-8") is not renderer
+    assert engine._make_renderer(["."], "utf-8", at_cache=False) \
+        is not renderer
+    assert engine._roptions == {}
+
+
+def test_render__not_cached(tmp_path):
+    tmpl = tmp_path / "a.mustache"
+    tmpl.write_text("Hello, {{> b}}!")
+    (tmp_path / "b.mustache").write_text("{{name}} (not cached)")
+
+    nsources = len(TT._SOURCES)
+    ntemplates = len(base.TEMPLATE_CACHE)
+
+    engine = TT.Engine()
+    assert engine.render(str(tmpl), {"name": "John"}, at_cache=False) \
+        == "Hello, John (not cached)!"
+    assert engine.renders("{{a}} (not cached)", {"a": 1}, at_cache=False) \
+        == "1 (not cached)"
+    assert len(TT._SOURCES) == nsources
+    assert len(base.TEMPLATE_CACHE) == ntemplates
+
+
+def test_renderer__context_per_thread(tmp_path):
+    tmpl = tmp_path / "a.mustache"
+    tmpl.write_text("{{#f}}{{/f}}{{a}}")
+
+    renderer = TT.Engine()._make_renderer([str(tmp_path)], "utf-8")
+    seen = []
+
+    def _render(idx):
+        def _lambda(_text):
+            seen.append((idx, renderer.context.get("a")))
+            return ''
+
+        return renderer.render(renderer.load_parsed(str(tmpl)),
+                               dict(a=idx, f=_lambda))
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        res = list(executor.map(_render, range(100)))
+
+    assert res == [str(idx) for idx in range(100)]
+    assert all(idx == val for idx, val in seen)
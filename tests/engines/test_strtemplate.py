@@ -5,10 +5,13 @@
 # pylint: disable=missing-docstring
 from __future__ import absolute_import
 
+import os
+import string
+
 import pytest
 
 import anytemplate.engines.strtemplate as TT
-from anytemplate.globals import CompileError
+from anytemplate.globals import CompileError, TemplateNotFound
 
 
 @pytest.mark.parametrize(
@@ -47,3 +50,45 @@ def test_render_impl(tmpl_s, ctx, exp, tmp_path):
     tmpl.write_text(tmpl_s)
 
     assert engine.render_impl(tmpl, ctx) == exp
+
+
+@pytest.mark.parametrize(
+    ("tmpl_s", "ctx"),
+    (("", {}),
+     ("$a, ${b} and $$c", dict(a=1, b="bbb")),
+     ("$a, ${b} and $$c", dict(a=1)),
+     ("$a$a", dict(a="x")),
+     ("$", {}),
+     ("$1 and $a", dict(a=1)),
+     ),
+)
+def test_compiled_template(tmpl_s, ctx):
+    for meth in ("substitute", "safe_substitute"):
+        try:
+            exp = getattr(string.Template(tmpl_s), meth)(ctx)
+        except (KeyError, ValueError) as exc:
+            with pytest.raises(type(exc)):
+                getattr(TT.CompiledTemplate(tmpl_s), meth)(ctx)
+        else:
+            assert getattr(TT.CompiledTemplate(tmpl_s), meth)(ctx) == exp
+
+
+def test_render_impl__modified(tmp_path):
+    engine = TT.Engine()
+
+    tmpl = tmp_path / "test.tmpl"
+    tmpl.write_text("$a")
+    assert engine.render_impl(str(tmpl), {'a': "aaa"}) == "aaa"
+
+    tmpl.write_text("$a, $a")
+    os.utime(tmpl, ns=(0, 0))  # Make sure mtime is changed.
+    assert engine.render_impl(str(tmpl), {'a': "aaa"}) == "aaa, aaa"
+
+
+def test_dependencies(tmp_path):
+    tmpl = tmp_path / "a.t"
+    tmpl.write_text("$a")
+    assert TT.Engine().dependencies(str(tmpl)) == [str(tmpl)]
+
+    with pytest.raises(TemplateNotFound):
+        TT.Engine().dependencies(str(tmp_path / "b.t"))
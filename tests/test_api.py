@@ -5,10 +5,15 @@
 # pylint: disable=missing-docstring, invalid-name, protected-access
 from __future__ import absolute_import
 
+import asyncio
+import concurrent.futures
+import copy
+
 import pytest
 
 import anytemplate.api as TT
 import anytemplate.engines.strtemplate
+import anytemplate.utils
 
 from anytemplate.globals import TemplateNotFound
 
@@ -22,6 +27,12 @@ def test_list_engines():
     assert anytemplate.engines.strtemplate.Engine in ENGINES
 
 
+def test_set_resolver_ttl(monkeypatch):
+    monkeypatch.setattr(anytemplate.utils.RESOLVER, "ttl", 0)
+    TT.set_resolver_ttl(10)
+    assert anytemplate.utils.RESOLVER.ttl == 10
+
+
 def test_find_engine__wo_any_args():
     assert TT.find_engine() is not None
 
@@ -143,3 +154,316 @@ def test_render_to(tmp_path):
     )
     assert output.exists()
     assert output.read_text() == "aaa"
+
+
+def test_get_engine__cached():
+    TT.clear_caches()
+    ecls = anytemplate.engines.strtemplate.Engine
+
+    engine = TT.get_engine(ecls)
+    assert TT.get_engine(ecls) is engine
+    assert TT.get_engine(ecls, {}) is engine
+    assert TT.get_engine(ecls, at_cache=False) is not engine
+
+    TT.clear_caches()
+    assert TT.get_engine(ecls) is not engine
+
+
+def test_get_engine__unhashable_cls_args():
+    ecls = anytemplate.engines.strtemplate.Engine
+    args = dict(a=bytearray())
+
+    assert TT.get_engine(ecls, args) is not TT.get_engine(ecls, args)
+
+
+def test_render_many(tmp_path):
+    TT.clear_caches()
+    tmpls = []
+    for idx in range(3):
+        tmpl = tmp_path / f"{idx}.t"
+        tmpl.write_text(f"{idx}: $a")
+        tmpls.append(str(tmpl))
+
+    output = tmp_path / "out.txt"
+    jobs = [(tmpls[0], dict(a="aaa")),
+            (tmpls[1], dict(a="bbb"), str(output)),
+            (tmpls[2], dict(a="ccc"), None, dict(at_cls_args=dict(x=1)))]
+
+    res = TT.render_many(iter(jobs), at_engine="string.Template")
+    assert list(res) == ["0: aaa", str(output), "2: ccc"]
+    assert output.read_text() == "1: bbb"
+
+
+def test_render_many__engines_shared(tmp_path, monkeypatch):
+    tmpl = tmp_path / "a.t"
+    tmpl.write_text("$a")
+
+    calls = []
+    get_engine = TT.get_engine
+
+    def _get_engine(*args, **kwargs):
+        calls.append(args)
+        return get_engine(*args, **kwargs)
+
+    monkeypatch.setattr(TT, "get_engine", _get_engine)
+    jobs = ((str(tmpl), dict(a=idx)) for idx in range(10))
+    res = TT.render_many(jobs, at_engine="string.Template")
+
+    assert list(res) == [str(idx) for idx in range(10)]
+    assert len(calls) == 1
+
+
+def test_render_many__invalid_job():
+    with pytest.raises(ValueError):
+        list(TT.render_many([()]))
+
+
+@pytest.mark.parametrize("processes", (1, 2))
+def test_render_parallel(processes, tmp_path):
+    jobs = []
+    for idx in range(6):
+        tmpl = tmp_path / f"{idx}.t"
+        tmpl.write_text(f"{idx}: $a")
+        jobs.append((str(tmpl), dict(a=idx)))
+
+    jobs[3] = (str(tmp_path / "not_exist.t"), {})
+    jobs[4] = (jobs[4][0], {})  # Missing context.
+    output = tmp_path / "out.txt"
+    jobs[5] = jobs[5] + (str(output), )
+
+    res = list(TT.render_parallel(jobs, processes, maxtasksperchild=2,
+                                  at_engine="string.Template"))
+
+    assert [r.filepath for r in res] == [job[0] for job in jobs]
+    assert [r.result for r in res[:3]] == ["0: 0", "1: 1", "2: 2"]
+    assert isinstance(res[3].error, TemplateNotFound)
+    assert isinstance(res[4].error, TT.CompileError)
+    assert res[5].result == str(output)
+    assert output.read_text() == "5: 5"
+    assert all(r.error is None for r in res[:3] + res[5:])
+
+
+class CountedDict(dict):
+    """Dict counts how many times it's pickled."""
+    pickled = 0
+
+    def __reduce__(self):
+        CountedDict.pickled += 1
+        return (dict, (dict(self), ))
+
+
+@pytest.mark.parametrize("processes", (1, 2))
+def test_render_parallel__shared_context(processes, tmp_path):
+    jobs = []
+    for idx in range(6):
+        tmpl = tmp_path / f"{idx}.t"
+        tmpl.write_text("$a:$b")
+        jobs.append((str(tmpl), dict(b=idx) if idx % 2 else None))
+
+    CountedDict.pickled = 0
+    ctx = CountedDict(a=0, b=-1)
+    res = list(TT.render_parallel(jobs, processes, context=ctx,
+                                  at_engine="string.Template"))
+
+    assert [r.result for r in res] == ["0:-1", "0:1", "0:-1", "0:3", "0:-1",
+                                       "0:5"]
+    assert CountedDict.pickled <= processes  # Not per job.
+
+
+def test_render_parallel__duplicate_outputs(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    (tmp_path / "a" / "x.t").write_text("a")
+    (tmp_path / "b" / "x.t").write_text("b")
+    output = str(tmp_path / "x")
+    jobs = [(str(tmp_path / d / "x.t"), {}, output) for d in "ab"]
+
+    res = list(TT.render_parallel(jobs, 2, at_engine="string.Template"))
+    assert res[0].error is None
+    assert isinstance(res[1].error, ValueError)
+    assert (tmp_path / "x").read_text() == "a"
+
+
+@pytest.mark.skipif(not J2_ENGINE_IS_AVAIL, reason=J2_NOT_AVAIL_MSG)
+def test_render__concurrently(tmp_path):
+    (tmp_path / "a.j2").write_text("{{ a }}:{{ b|d('-') }}")
+    (tmp_path / "b.j2").write_text("<< a >>:<< b|d('-') >>")
+    (tmp_path / "c.t").write_text("$a:$b")
+
+    b_opts = dict(variable_start_string="<<", variable_end_string=">>")
+    cases = []
+    for idx in range(400):
+        ctx = dict(a=idx, b=idx * 2) if idx % 3 else dict(a=idx)
+        exp = f"{idx}:{ctx.get('b', '-')}"
+        if idx % 4 == 0:
+            cases.append(("a.j2", ctx, {}, exp))
+        elif idx % 4 == 1:
+            cases.append(("b.j2", ctx, b_opts, exp))
+        elif idx % 4 == 2:
+            cases.append(("a.j2", ctx, dict(trim_blocks=True), exp))
+        elif "b" in ctx:
+            cases.append(("c.t", ctx, dict(at_engine="string.Template"),
+                          exp))
+
+    ctxs = copy.deepcopy([c[1] for c in cases])
+
+    def _render(case):
+        (name, ctx, opts, _exp) = case
+        return TT.render(str(tmp_path / name), ctx, **opts)
+
+    with concurrent.futures.ThreadPoolExecutor(16) as executor:
+        res = list(executor.map(_render, cases))
+
+    assert res == [c[3] for c in cases]
+    assert [c[1] for c in cases] == ctxs  # Not modified.
+
+
+def test_render_async(tmp_path):
+    tmpl = tmp_path / "a.t"
+    tmpl.write_text("$a")
+
+    async def _main():
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            return await asyncio.gather(
+                TT.render_async(str(tmpl), dict(a="aaa"),
+                                at_engine="string.Template",
+                                at_executor=executor),
+                TT.renders_async("$a", dict(a="bbb"),
+                                 at_engine="string.Template"),
+            )
+
+    assert asyncio.run(_main()) == ["aaa", "bbb"]
+
+    with pytest.raises(TemplateNotFound):
+        asyncio.run(TT.render_async("not_existing.t",
+                                    at_engine="string.Template"))
+
+
+@pytest.mark.skipif(not J2_ENGINE_IS_AVAIL, reason=J2_NOT_AVAIL_MSG)
+def test_render_async__jinja2(tmp_path):
+    (tmp_path / "a.j2").write_text("{% include 'b.j2' %}:{{ a }}")
+    (tmp_path / "b.j2").write_text("b")
+
+    async def _main():
+        return await asyncio.gather(*[
+            TT.render_async(str(tmp_path / "a.j2"), dict(a=idx))
+            for idx in range(50)
+        ] + [TT.renders_async("{{ a }}", dict(a="x"), at_engine="jinja2")])
+
+    assert asyncio.run(_main()) == [f"b:{idx}" for idx in range(50)] + ["x"]
+
+
+@pytest.mark.skipif(not J2_ENGINE_IS_AVAIL, reason=J2_NOT_AVAIL_MSG)
+def test_render_iter(tmp_path):
+    tmpl = tmp_path / "a.j2"
+    tmpl.write_text("{% for i in range(n) %}{{ '%07d' % i }}\n{% endfor %}")
+    exp = ''.join(f"{i:07d}\n" for i in range(100000))
+
+    chunks = list(TT.render_iter(str(tmpl), dict(n=100000)))
+    assert len(chunks) > 1
+    assert ''.join(chunks) == exp
+
+    output = tmp_path / "out.txt"
+    TT.render_to(str(tmpl), dict(n=100000), str(output))
+    assert output.read_text() == exp
+
+    assert list(TT.renders_iter("{{ a }}", dict(a=1),
+                                at_engine="jinja2")) == ["1"]
+
+
+def test_render_iter__errors(tmp_path):
+    with pytest.raises(TemplateNotFound):
+        TT.render_iter("not_existing.t", at_engine="string.Template")
+
+    tmpl = tmp_path / "a.t"
+    tmpl.write_text("$a")
+    with pytest.raises(TT.CompileError):
+        list(TT.render_iter(str(tmpl), at_engine="string.Template"))
+
+    assert list(TT.render_iter(str(tmpl), dict(a=1),
+                               at_engine="string.Template")) == ["1"]
+
+
+@pytest.mark.parametrize(
+    ("engine", "tmpl"),
+    (("string.Template", "$c"),
+     ("jinja2", "{{ a.b }}-{{ c }}"),
+     ("mako", "${a['b']}-${c}"),
+     ("pystache", "{{a.b}}-{{c}}"),
+     ),
+)
+def test_renders__lazy_context(engine, tmpl, tmp_path):
+    if not any(e.name() == engine for e in ENGINES):
+        pytest.skip(f"{engine} is not available")
+
+    ctx = tmp_path / "ctx.json"
+    ctx.write_text('{"a": {"b": 1}, "c": 2}')
+    lctx = anytemplate.utils.LazyContext([str(ctx)])
+    exp = TT.renders(tmpl, {"a": {"b": 1}, "c": 2}, at_engine=engine)
+
+    assert not lctx.loaded
+    assert TT.renders(tmpl, lctx, at_engine=engine) == exp
+    assert lctx.loaded
+
+
+@pytest.mark.skipif(not J2_ENGINE_IS_AVAIL, reason=J2_NOT_AVAIL_MSG)
+def test_render_incremental(tmp_path):
+    tmpl = tmp_path / "a.j2"
+    tmpl.write_text("{{ a }}{% include 'inc.d/*.j2' %}")
+    (tmp_path / "inc.d").mkdir()
+    (tmp_path / "inc.d" / "x.j2").write_text("x")
+    (out, manifest) = (tmp_path / "a.txt", str(tmp_path / "deps.json"))
+
+    def render(ctx):
+        res = list(TT.render_incremental([(str(tmpl), ctx, str(out))],
+                                         manifest))
+        assert res[0].error is None
+        return out.stat().st_mtime_ns
+
+    mtime = render({"a": 1})
+    assert out.read_text() == "1x"
+    assert render({"a": 1}) == mtime  # Skipped.
+
+    mtime = render({"a": 2})
+    assert out.read_text() == "2x"
+
+    (tmp_path / "inc.d" / "y.j2").write_text("y")
+    mtime = render({"a": 2})
+    assert out.read_text() == "2xy"
+    assert render({"a": 2}) == mtime
+
+
+@pytest.mark.skipif(not J2_ENGINE_IS_AVAIL, reason=J2_NOT_AVAIL_MSG)
+def test_render_incremental__cls_args(tmp_path):
+    tmpl = tmp_path / "a.j2"
+    tmpl.write_text("{% if 1 %}\nx\n{% endif %}")
+    (out, manifest) = (tmp_path / "a.txt", str(tmp_path / "deps.json"))
+    jobs = [(str(tmpl), {}, str(out))]
+
+    list(TT.render_incremental(jobs, manifest, at_cls_args={}))
+    assert out.read_text() == "\nx\n"
+
+    list(TT.render_incremental(jobs, manifest,
+                               at_cls_args=dict(trim_blocks=True)))
+    assert out.read_text() == "x\n"
+
+
+def test_render_incremental__changed_while_rendering(tmp_path, monkeypatch):
+    tmpl = tmp_path / "a.t"
+    tmpl.write_text("$a")
+    (out, manifest) = (tmp_path / "a.txt", str(tmp_path / "deps.json"))
+    jobs = [(str(tmpl), {"a": 1}, str(out))]
+    render_parallel = TT.render_parallel
+
+    def edit_and_render(*args, **kwargs):
+        res = list(render_parallel(*args, **kwargs))
+        tmpl.write_text("$a$a")  # Edited while rendering.
+        return res
+
+    monkeypatch.setattr(TT, "render_parallel", edit_and_render)
+    list(TT.render_incremental(jobs, manifest, at_engine="string.Template"))
+    assert out.read_text() == "1"
+
+    monkeypatch.setattr(TT, "render_parallel", render_parallel)
+    list(TT.render_incremental(jobs, manifest, at_engine="string.Template"))
+    assert out.read_text() == "11"
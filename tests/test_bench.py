@@ -0,0 +1,60 @@
+#
+# Copyright (C) 2015 Satoru SATOH <ssato at redhat.com>
+# SPDX-License-Identifier: MIT
+#
+# pylint: disable=missing-docstring
+from __future__ import absolute_import
+
+import pytest
+
+import anytemplate.bench as TT
+
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |     a.b.c
+import time:       200 |        300 |   a.b
+import time:        50 |        350 | a
+import time:        10 |         10 | d
+"""
+
+
+def test_parse_importtime():
+    assert TT.parse_importtime(IMPORTTIME_OUTPUT) == [
+        ("a.b.c", 100, 100, 2), ("a.b", 200, 300, 1), ("a", 50, 350, 0),
+        ("d", 10, 10, 0)
+    ]
+
+
+def test_new_imports_and_top_level_cost():
+    imports = TT.parse_importtime(IMPORTTIME_OUTPUT)
+    diff = TT.new_imports(imports[-1:], imports)
+
+    assert [imp[0] for imp in diff] == ["a.b.c", "a.b", "a"]
+    assert TT.top_level_cost(diff) == 350
+
+
+def test_measure_imports():
+    imports = TT.measure_imports("import anytemplate")
+    assert "anytemplate" in [imp[0] for imp in imports]
+
+
+def test_parse_and_check_budgets():
+    budgets = TT.parse_budgets(["import=50", "cli=300"])
+    assert budgets == {"import": 50.0, "cli": 300.0}
+
+    res = dict((phase, 100.0) for phase in TT.PHASES)
+    assert TT.check_budgets(res, budgets) == [("import", 100.0, 50.0)]
+
+    with pytest.raises(ValueError):
+        TT.parse_budgets(["unknown=1"])
+
+
+def test_main(capsys):
+    assert TT.main(["-r", "1", "-n", "3", "-b", "render=100000"]) == 0
+    out = capsys.readouterr().out
+    for phase in TT.PHASES:
+        assert f"{phase}: " in out
+
+    assert TT.main(["-r", "1", "-b", "cli=0"]) == 1
+    assert "FAIL: cli" in capsys.readouterr().err
@@ -0,0 +1,57 @@
+#
+# Copyright (C) 2015 Satoru SATOH <ssato at redhat.com>
+# SPDX-License-Identifier: MIT
+#
+# pylint: disable=missing-docstring
+from __future__ import absolute_import
+
+import pytest
+
+import anytemplate.cache as TT
+
+
+@pytest.mark.parametrize(
+    ("obj", "exp"),
+    (({}, ("d", ())),
+     (dict(b=[1, 2], a=1), ("d", (("a", 1), ("b", ("l", (1, 2)))))),
+     ([{"a": {1}}], ("l", (("d", (("a", ("s", frozenset([1]))), )), ))),
+     ((1, ), ("t", (1, ))),
+     ([bytearray()], None),
+     ),
+)
+def test_make_key(obj, exp):
+    assert TT.make_key(obj) == exp
+
+
+@pytest.mark.parametrize(
+    ("obj", "other"),
+    (({"x": {"k": 1}}, {"x": [("k", 1)]}),
+     ({}, []),
+     ([], ()),
+     ((), set()),
+     ([1], (1, )),
+     ),
+)
+def test_make_key__not_collide(obj, other):
+    assert TT.make_key(obj) != TT.make_key(other)
+
+
+def test_lru_cache():
+    cache = TT.LRUCache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)  # "b" is the least recently used one.
+    assert len(cache) == 2
+    assert "b" not in cache
+    assert cache.get_or_set("b", lambda: 4) == 4
+    assert cache.get_or_set("b", lambda: 5) == 4
+
+
+def test_clear_caches():
+    cache = TT.make_cache()
+    cache.set("a", 1)
+
+    TT.clear_caches()
+    assert not cache
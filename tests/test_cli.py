@@ -120,3 +120,190 @@ def test_strtemplate_with_ctx(
         request
     )
     assert out.rstrip() == bytes(exp, "utf-8")
+
+
+@pytest.mark.parametrize("jobs", ("1", "2", "auto"))
+def test_run_main__multiple_templates(jobs, tmp_path):
+    ctx = tmp_path / "ctx.json"
+    ctx.write_text('{"a": "aaa"}')
+
+    tmpls = []
+    for idx in range(3):
+        tmpl = tmp_path / f"{idx}.conf.t"
+        tmpl.write_text(f"{idx}: $a\n")
+        tmpls.append(str(tmpl))
+
+    outdir = tmp_path / "out"
+    assert_run(
+        ["-E", "string.Template", "-C", f"json:{ctx!s}", "-o", str(outdir),
+         "-j", jobs] + tmpls
+    )
+    for idx in range(3):
+        assert (outdir / f"{idx}.conf").read_text() == f"{idx}: aaa\n"
+
+    assert_run(
+        ["-E", "string.Template", "-o", str(outdir), "-j", jobs] + tmpls,
+        exp_code=1
+    )
+
+
+def test_run_main__multiple_templates_to_stdout(tmp_path, capsys):
+    tmpls = []
+    for idx in range(3):
+        tmpl = tmp_path / f"{idx}.t"
+        tmpl.write_text(f"{idx}")
+        tmpls.append(str(tmpl))
+
+    assert_run(["-E", "string.Template", "-j", "2"] + tmpls)
+    assert capsys.readouterr().out == "0\n1\n2\n"
+
+
+def test_run_main__multiple_templates_same_name(tmp_path, capsys):
+    tmpls = []
+    for name in "ab":
+        (tmp_path / name).mkdir()
+        tmpl = tmp_path / name / "index.html.t"
+        tmpl.write_text(name)
+        tmpls.append(str(tmpl))
+
+    outdir = tmp_path / "out"
+    assert_run(["-E", "string.Template", "-o", str(outdir), "-j", "2"] +
+               tmpls, exp_code=1)
+    assert not (outdir / "index.html").exists()
+    assert "2 of 2 templates failed" in capsys.readouterr().err
+
+
+def test_run_main__resolver_ttl(tmp_path, monkeypatch):
+    monkeypatch.setattr(TT.anytemplate.utils.RESOLVER, "ttl", 0)
+    tmpl = tmp_path / "a.t"
+    tmpl.write_text("a")
+
+    assert_run(["-E", "string.Template", "--resolver-ttl", "1.5",
+                "-o", str(tmp_path / "a"), str(tmpl)])
+    assert TT.anytemplate.utils.RESOLVER.ttl == 1.5
+
+
+def test_run_main__invalid_jobs():
+    assert_run(["-j", "0", "a.t"], exp_code=2)
+
+
+@pytest.mark.skipif(not J2_IS_AVAIL, reason="jinja2 is not available.")
+def test_run_main__cache_dir(tmp_path):
+    tmpl = tmp_path / "test.j2"
+    tmpl.write_text("{{ a | d('none') }}")
+    cache_dir = tmp_path / "cache"
+    out = tmp_path / "output.txt"
+
+    assert_run(["--cache-dir", str(cache_dir), "-o", str(out), str(tmpl)])
+    assert out.read_text() == "none"
+    assert list((cache_dir / "jinja2").glob("*/*.cache"))
+
+
+def test_run_main__lazy_contexts(tmp_path):
+    tmpl = tmp_path / "test.tmpl"
+    ctx = tmp_path / "ctx.json"
+    out = tmp_path / "output.txt"
+
+    tmpl.write_text("$a\n")
+    ctx.write_text('{"a": "aaa"}')
+
+    assert_run(["--lazy-contexts", "-E", "string.Template",
+                "-C", f"json:{ctx!s}", "-o", str(out), str(tmpl)])
+    assert out.read_text() == "aaa\n"
+
+
+@pytest.mark.parametrize("fmt", ("json", "ndjson", "nul"))
+def test_run_main__batch(fmt, tmp_path, monkeypatch, capsys):
+    import io
+    import json
+
+    for name in ("a", "b"):
+        (tmp_path / f"{name}.tmpl").write_text(f"{name}: $x\n")
+    ctx = tmp_path / "ctx.json"
+    ctx.write_text('{"x": 1}')
+    outdir = tmp_path / "out"
+    entries = [str(tmp_path / "a.tmpl"),
+               dict(template=str(tmp_path / "b.tmpl"), context=dict(x=2),
+                    output=str(outdir / "b.txt"))]
+
+    if fmt == "nul":
+        manifest = '-'
+        entries[1] = entries[1]["template"]
+        monkeypatch.setattr(
+            "sys.stdin", io.StringIO("\0".join(entries) + "\0")
+        )
+    else:
+        manifest = tmp_path / f"manifest.{fmt}"
+        manifest.write_text(
+            json.dumps(entries) if fmt == "json"
+            else "\n".join(json.dumps(e) for e in entries)
+        )
+
+    assert_run(["--batch", str(manifest), "-E", "string.Template",
+                "-C", str(ctx), "-o", str(outdir)])
+    assert (outdir / "a").read_text() == "a: 1\n"
+    if fmt == "nul":
+        assert (outdir / "b").read_text() == "b: 1\n"
+    else:
+        assert (outdir / "b.txt").read_text() == "b: 2\n"
+
+
+def test_run_main__batch_failures(tmp_path, capsys):
+    tmpl = tmp_path / "a.tmpl"
+    tmpl.write_text("$$x\n")
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(
+        f'["{tmpl!s}", "{tmp_path!s}/not_exist.tmpl", {{"output": "-"}}]'
+    )
+
+    assert_run(["--batch", str(manifest), "-E", "string.Template",
+                "-o", str(tmp_path / "out")], exp_code=1)
+    assert (tmp_path / "out" / "a").read_text() == "$x\n"
+    assert "2 of 3 templates failed" in capsys.readouterr().err
+
+
+def test_run_main__batch_duplicate_outputs(tmp_path, capsys):
+    tmpls = []
+    for name in "abc":
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "x.tmpl").write_text(name)
+        tmpls.append(str(tmp_path / name / "x.tmpl"))
+
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(
+        f'["{tmpls[0]}", "{tmpls[1]}", '
+        f'{{"template": "{tmpls[2]}", "output": "{tmp_path!s}/y"}}]'
+    )
+    outdir = tmp_path / "out"
+    assert_run(["--batch", str(manifest), "-E", "string.Template",
+                "-o", str(outdir)], exp_code=1)
+    assert not (outdir / "x").exists()
+    assert (tmp_path / "y").read_text() == "c"
+
+    err = capsys.readouterr().err
+    assert "2 of 3 templates failed" in err
+    assert err.count("Duplicate output") == 2
+
+
+def test_run_main__incremental(tmp_path):
+    tmpl = tmp_path / "test.tmpl"
+    ctx = tmp_path / "ctx.json"
+    out = tmp_path / "output.txt"
+    manifest = tmp_path / "deps.json"
+
+    tmpl.write_text("$a\n")
+    ctx.write_text('{"a": "aaa"}')
+    args = ["--incremental", str(manifest), "-E", "string.Template",
+            "-C", str(ctx), "-o", str(out), str(tmpl)]
+
+    assert_run(args)
+    assert out.read_text() == "aaa\n"
+    assert manifest.exists()
+
+    out.write_text("modified")
+    assert_run(args)
+    assert out.read_text() == "aaa\n"
+
+    ctx.write_text('{"a": "bbb"}')
+    assert_run(args)
+    assert out.read_text() == "bbb\n"
@@ -0,0 +1,58 @@
+#
+# Copyright (C) 2015 - 2018 Satoru SATOH <ssato at redhat.com>
+# SPDX-License-Identifier: MIT
+#
+# pylint: disable=missing-docstring,invalid-name
+"""Tests of anytempalte.client
+"""
+from __future__ import absolute_import
+
+import subprocess
+import sys
+
+import pytest
+
+import anytemplate.cli
+import anytemplate.client as TT
+
+
+def test_options_with_value():
+    psr = anytemplate.cli.option_parser()
+    opts = [opt for act in psr._actions  # pylint: disable=protected-access
+            if act.option_strings and act.nargs is None
+            for opt in act.option_strings]
+    assert sorted(opts) == sorted(TT.OPTIONS_WITH_VALUE)
+
+
+@pytest.mark.parametrize(
+    ("argv", "exp"),
+    ((["-o", "-", "a.t"], False),
+     (["--output=-", "a.t"], False),
+     (["-C", "-", "a.t"], True),
+     (["--context=yaml:-", "a.t"], True),
+     (["-Cyaml:-", "a.t"], True),
+     (["--batch", "-"], True),
+     (["-"], True),
+     ),
+)
+def test_reads_stdin(argv, exp):
+    assert TT.reads_stdin(argv) == exp
+
+
+def test_main__connect_failure(tmp_path, capsys):
+    with pytest.raises(SystemExit) as exc_info:
+        TT.main(["dummy", "--connect", str(tmp_path / "none.sock"), "a.t"])
+
+    assert exc_info.value.code == 1
+    assert "Failed to connect" in capsys.readouterr().err
+
+
+def test_main__connect_imports_nothing_else(tmp_path):
+    code = ("import sys, anytemplate.client as C; "
+            f"C.run({str(tmp_path / 'none.sock')!r}, ['a.t']); "
+            "print(sorted(m for m in sys.modules "
+            "if m.startswith('anytemplate')))")
+    out = subprocess.run([sys.executable, "-c", code], check=True,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                         universal_newlines=True).stdout
+    assert out.strip() == "['anytemplate', 'anytemplate.client']"
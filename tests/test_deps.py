@@ -0,0 +1,63 @@
+#
+# Copyright (C) 2015 - 2018 Satoru SATOH <ssato at redhat.com>
+# SPDX-License-Identifier: MIT
+#
+# pylint: disable=missing-docstring,invalid-name
+"""Tests of anytempalte.deps
+"""
+from __future__ import absolute_import
+
+import os
+
+import anytemplate.deps as TT
+
+
+def test_manifest(tmp_path):
+    (tmpl, out) = (tmp_path / "a.t", tmp_path / "a.txt")
+    incdir = tmp_path / "inc.d"
+    incdir.mkdir()
+    tmpl.write_text("$a")
+    out.write_text("1")
+    path = str(tmp_path / "deps.json")
+
+    manifest = TT.Manifest(path)
+    assert not manifest.is_uptodate(str(out), "c", "o")
+
+    inputs = TT.stats([str(tmpl), str(incdir)])
+    manifest.update(str(out), inputs, "c", "o")
+    manifest.save()
+
+    manifest = TT.Manifest(path)
+    assert manifest.is_uptodate(str(out), "c", "o")
+    assert not manifest.is_uptodate(str(out), "c2", "o")
+    assert not manifest.is_uptodate(str(out), "c", "o2")
+
+    os.utime(tmpl, ns=(0, 0))  # Touched only.
+    assert manifest.is_uptodate(str(out), "c", "o")
+
+    tmpl.write_text("$b")
+    assert not manifest.is_uptodate(str(out), "c", "o")
+
+
+def test_manifest__dir_and_unknown_inputs(tmp_path):
+    out = tmp_path / "a.txt"
+    out.write_text("1")
+    manifest = TT.Manifest(str(tmp_path / "deps.json"))
+
+    manifest.update(str(out), TT.stats([str(tmp_path)]), "c", "o")
+    assert manifest.is_uptodate(str(out), "c", "o")
+    (tmp_path / "b.t").write_text("")
+    assert not manifest.is_uptodate(str(out), "c", "o")
+
+    manifest.update(str(out), None, "c", "o")
+    assert not manifest.is_uptodate(str(out), "c", "o")
+
+    manifest.update(str(out), TT.stats([]), "c", "o")
+    out.write_text("2")  # The output was modified.
+    assert not manifest.is_uptodate(str(out), "c", "o")
+
+
+def test_manifest__invalid(tmp_path):
+    path = tmp_path / "deps.json"
+    path.write_text("[")
+    assert not TT.Manifest(str(path)).is_uptodate(str(path), "c", "o")
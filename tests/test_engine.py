@@ -5,19 +5,147 @@
 # pylint: disable=missing-docstring, protected-access
 from __future__ import absolute_import
 
+import subprocess
+import sys
+
+import pytest
+
 import anytemplate.engine as TT
 import anytemplate.engines.strtemplate as strtemplate
 
 
+def _find_spec(name):
+    return [s for s in TT.ENGINE_SPECS if s.name == name][0]
+
+
 def test_find_by_filename():
-    strtemplate.Engine._file_extensions.append("t")
+    spec = _find_spec("string.Template")
+    spec.file_extensions.append("t")
+    TT.invalidate_index()
     assert strtemplate.Engine in TT.find_by_filename("foo.t")
+
+    spec.file_extensions.remove("t")
+    TT.invalidate_index()
+    assert strtemplate.Engine not in TT.find_by_filename("foo.t")
+
+
+def test_find_by_filename__w_engines():
+    strtemplate.Engine._file_extensions.append("t")
+    assert strtemplate.Engine in TT.find_by_filename("foo.t", TT.ENGINES)
     strtemplate.Engine._file_extensions.remove("t")
 
 
+def test_find_by_filename__sorted_by_priority():
+    engines = TT.find_by_filename()
+    assert engines == TT.list_engines_by_priority(TT.ENGINES)
+    assert TT.find_by_filename("foo.j2") is TT.find_by_filename("bar.j2")
+
+
+def test_find_by_filename__not_supported():
+    class Engine(strtemplate.Engine):
+        _name = "test"
+        _file_extensions = ["test"]
+
+        @classmethod
+        def supports(cls, template_file=None):
+            return False
+
+    TT.register_engine(Engine)
+    try:
+        assert TT.find_by_filename("foo.test") == ()
+    finally:
+        TT.ENGINE_SPECS.remove(_find_spec("test"))
+        TT.invalidate_index()
+
+
+def test_builtin_spec():
+    spec = TT.builtin_spec("string.Template")
+    assert strtemplate.Engine.file_extensions() is spec.file_extensions
+    assert strtemplate.Engine.priority() == spec.priority
+
+
+def test_list_engines_by_priority__cached():
+    engines = TT.list_engines_by_priority()
+    assert TT.list_engines_by_priority() is engines
+    assert TT.ENGINES is engines
+    with pytest.raises(TypeError, match="register_engine"):
+        TT.ENGINES.append(strtemplate.Engine)
+
+
+def test_find_default():
+    assert TT.find_default() == TT.list_engines_by_priority()[0]
+
+
 def test_find_by_name__found():
     assert TT.find_by_name("string.Template") == strtemplate.Engine
 
 
 def test_find_by_name__not_found():
     assert TT.find_by_name("not_existing_engine") is None
+
+
+def test_register_engine():
+    class Engine(strtemplate.Engine):
+        _name = "test"
+        _file_extensions = ["test"]
+
+    TT.register_engine(Engine)
+    try:
+        assert TT.find_by_name("test") == Engine
+        assert TT.find_by_filename("foo.test") == (Engine, )
+    finally:
+        TT.ENGINE_SPECS.remove(_find_spec("test"))
+        TT.invalidate_index()
+
+
+def test_register_engine__lazy():
+    spec = TT.EngineSpec("test", "not_existing_module", ["test"],
+                         requires="not_existing_module")
+    TT.register_engine(spec)
+    try:
+        assert TT.find_by_filename("foo.test") == ()
+        assert TT.find_by_name("test") is None
+    finally:
+        TT.ENGINE_SPECS.remove(spec)
+        TT.invalidate_index()
+
+
+def test_import_engines_lazily():
+    code = ("import sys, anytemplate; "
+            "anytemplate.render('/dev/null', at_engine='string.Template'); "
+            "mods = ('mako', 'pystache', 'Cheetah'); "
+            "assert not [m for m in mods if m in sys.modules]")
+    subprocess.check_call([sys.executable, "-c", code])
+
+
+def test_find_default_lazily():
+    code = ("import sys, anytemplate; "
+            "anytemplate.renders('$a', dict(a=1)); "
+            "mods = ('mako', 'pystache', 'Cheetah'); "
+            "assert not [m for m in mods if m in sys.modules]")
+    subprocess.check_call([sys.executable, "-c", code])
+
+
+def test_load_entry_points(monkeypatch):
+    class Engine(strtemplate.Engine):
+        _name = "test_ep"
+        _file_extensions = ["test_ep"]
+
+    class EntryPoint(object):
+        name = "test_ep"
+
+        @staticmethod
+        def load():
+            return Engine
+
+    monkeypatch.setattr(TT.anytemplate.compat, "entry_points",
+                        lambda group: [EntryPoint()])
+    monkeypatch.setattr(TT, "_ENTRY_POINTS_LOADED", False)
+    monkeypatch.setattr(TT, "ENGINE_SPECS", list(TT.ENGINE_SPECS))
+    TT.invalidate_index()
+    try:
+        assert TT.find_by_name("test_ep") == Engine
+        assert TT.find_by_filename("foo.test_ep") == (Engine, )
+    finally:
+        monkeypatch.undo()
+        TT.invalidate_index()
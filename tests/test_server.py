@@ -0,0 +1,132 @@
+#
+# Copyright (C) 2015 - 2018 Satoru SATOH <ssato at redhat.com>
+# SPDX-License-Identifier: MIT
+#
+# pylint: disable=missing-docstring,invalid-name
+"""Tests of anytempalte.server
+"""
+from __future__ import absolute_import
+
+import io
+import os
+import socket
+import threading
+
+import pytest
+
+import anytemplate.cli
+import anytemplate.client
+import anytemplate.server as TT
+
+from anytemplate.client import EXIT, STDOUT, send_frame, recv_frame
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "s.sock")
+    srv = TT.Server(path)
+    thread = threading.Thread(target=srv.serve_forever)
+    thread.start()
+    yield (srv, path)
+
+    srv.shutdown()
+    thread.join()
+    srv.server_close()
+
+
+def connect(path, argv, stdin=None):
+    (out, err) = (io.StringIO(), io.StringIO())
+    code = anytemplate.client.connect(path, argv, stdin, out, err)
+    return (code, out.getvalue(), err.getvalue())
+
+
+def test_frames():
+    (sock, peer) = socket.socketpair()
+    with sock, peer:
+        send_frame(sock, STDOUT, b"abc")
+        send_frame(sock, EXIT)
+        sock.close()
+
+        assert recv_frame(peer) == (STDOUT, b"abc")
+        assert recv_frame(peer) == (EXIT, b'')
+        assert recv_frame(peer) == (None, b'')
+
+
+def test_connect(server, tmp_path, monkeypatch):
+    (_srv, path) = server
+    tmpl = tmp_path / "a.tmpl"
+    tmpl.write_text("$a\n")
+    (tmp_path / "ctx.json").write_text('{"a": "aaa"}')
+    monkeypatch.chdir(tmp_path)
+
+    argv = ["-E", "string.Template", "-C", "ctx.json", "a.tmpl"]
+    assert connect(path, argv) == (0, "aaa\n\n", '')
+    assert connect(path, argv + ["-o", "out.txt"]) == (0, '', '')
+    assert (tmp_path / "out.txt").read_text() == "aaa\n"
+
+    argv = ["-E", "string.Template", "-C", "json:-", "a.tmpl"]
+    assert connect(path, argv, '{"a": "bbb"}') == (0, "bbb\n\n", '')
+
+    (code, _out, err) = connect(path, ["--wrong-option-abc"])
+    assert code == 2
+    assert "usage" in err
+    assert os.getcwd() == str(tmp_path)
+
+
+def test_connect__contexts_cached(server, tmp_path, monkeypatch):
+    (_srv, path) = server
+    (tmp_path / "a.tmpl").write_text("$a\n")
+    ctx = tmp_path / "ctx.json"
+    ctx.write_text('{"a": "aaa"}')
+    monkeypatch.chdir(tmp_path)
+
+    loads = []
+    load = TT.anytemplate.utils.parse_and_load_contexts
+    monkeypatch.setattr(TT.anytemplate.utils, "parse_and_load_contexts",
+                        lambda *a, **kw: loads.append(a) or load(*a, **kw))
+
+    argv = ["-E", "string.Template", "-C", str(ctx), "a.tmpl"]
+    assert connect(path, argv)[:2] == (0, "aaa\n\n")
+    assert connect(path, argv)[:2] == (0, "aaa\n\n")
+    assert len(loads) == 1
+
+    ctx.write_text('{"a": "bbbb"}')
+    assert connect(path, argv)[:2] == (0, "bbbb\n\n")
+    assert len(loads) == 2
+
+
+def test_run_main__connect_failure(tmp_path, capsys):
+    code = anytemplate.cli.run(["--connect", str(tmp_path / "none.sock"),
+                                "a.t"])
+    assert code == 1
+    assert "Failed to connect" in capsys.readouterr().err
+
+
+def test_connect__not_to_itself(server, tmp_path, monkeypatch):
+    (_srv, path) = server
+    (tmp_path / "a.tmpl").write_text("$a\n")
+    monkeypatch.chdir(tmp_path)
+
+    # The abbreviation of --connect is ignored in the daemon.
+    argv = ["--conn", path, "-E", "string.Template", "a.tmpl"]
+    (code, _out, err) = connect(path, argv)
+    assert code == 1
+    assert "'a'" in err
+
+    (tmp_path / "b.tmpl").write_text("b\n")
+    out = io.StringIO()
+    monkeypatch.setattr("sys.stdout", out)
+    assert anytemplate.cli.run(["--conn", path, "-E", "string.Template",
+                                "b.tmpl"]) == 0
+    assert out.getvalue() == "b\n\n"
+
+
+def test_server_run__system_exit(tmp_path, monkeypatch):
+    def run(*_args, **_kwargs):
+        raise SystemExit(0)
+
+    monkeypatch.setattr(TT.anytemplate.cli, "run", run)
+    srv = TT.Server(str(tmp_path / "s.sock"))
+    with srv, pytest.raises(SystemExit):
+        srv.run(dict(argv=[], cwd=str(tmp_path)), io.StringIO(),
+                io.StringIO())
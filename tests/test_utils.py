@@ -2,11 +2,15 @@
 # Copyright (C). 2015 Satoru SATOH <ssato at redhat.com>
 # SPDX-License-Identifier: MIT
 #
-# pylint: disable=missing-docstring, invalid-name
+# pylint: disable=missing-docstring, invalid-name, protected-access
 from __future__ import absolute_import, with_statement
 
+import asyncio
+import concurrent.futures
 import os
 import pathlib
+import subprocess
+import sys
 
 import pytest
 
@@ -113,6 +117,46 @@ def test_parse_and_load_contexts(tmp_path):
     assert TT.parse_and_load_contexts(paths) == dict(a="aaa", b="bbb", c="ccc")
 
 
+def test_parse_and_load_contexts__in_parallel(tmp_path):
+    for idx in range(20):
+        (tmp_path / f"{idx:02d}.json").write_text(
+            f'{{"a": {idx}, "b": {{"k{idx % 3}": {idx}}}, "l": [{idx}]}}'
+        )
+    specs = [f"json:{tmp_path!s}/*.json", "json:not_existing.json"]
+
+    exp = TT.parse_and_load_contexts(specs)
+    assert exp["a"] == 19
+
+    assert TT.parse_and_load_contexts(specs, workers=2) == exp
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        assert TT.parse_and_load_contexts(specs, executor=executor) == exp
+
+    with pytest.raises((IOError, OSError)):
+        TT.parse_and_load_contexts(specs, werr=True, workers=2)
+
+
+def test_parse_and_load_contexts__concurrently(tmp_path, monkeypatch):
+    import threading
+
+    for idx in range(4):
+        (tmp_path / f"{idx}.json").write_text(f'{{"a{idx}": {idx}}}')
+
+    # All of the loads must run at once to pass the barrier.
+    barrier = threading.Barrier(4, timeout=5)
+    load = TT.load_context
+
+    def load_context(*args, **kwargs):
+        barrier.wait()
+        return load(*args, **kwargs)
+
+    monkeypatch.setattr(TT, "load_context", load_context)
+
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        res = TT.parse_and_load_contexts([f"{tmp_path!s}/*.json"],
+                                         executor=executor, werr=True)
+    assert res == {"a0": 0, "a1": 1, "a2": 2, "a3": 3}
+
+
 def test_write_to_output__create_dir(tmp_path):
     out = tmp_path / "a" / "out.txt"
     TT.write_to_output("hello", str(out))
@@ -121,9 +165,293 @@ def test_write_to_output__create_dir(tmp_path):
     assert out.read_text() == "hello"
 
 
+def test_write_to_output__create_dir_raced(tmp_path, monkeypatch):
+    out = tmp_path / "a" / "out.txt"
+    out.parent.mkdir()
+    # Other workers made the dir after it was checked.
+    monkeypatch.setattr(os.path, "exists", lambda _path: False)
+    TT.write_to_output("hello", str(out))
+
+    assert out.read_text() == "hello"
+
+
+def test_write_to_output__errors(tmp_path):
+    out = tmp_path / "out.txt"
+    out.write_text("old")
+    out.chmod(0o640)
+
+    def chunks():
+        yield "new"
+        raise ValueError("err")
+
+    with pytest.raises(ValueError):
+        TT.write_to_output(chunks(), str(out))
+
+    assert out.read_text() == "old"
+    assert os.listdir(tmp_path) == ["out.txt"]
+
+    TT.write_to_output(iter(["a", "b"]), str(out))
+    assert out.read_text() == "ab"
+    assert out.stat().st_mode & 0o777 == 0o640
+
+
 def test_write_to_output__stdout(tmp_path):
     out = tmp_path / "test.out"
     TT.write_to_output("hello", output=out)
 
     assert out.exists()
     assert out.read_text() == "hello"
+
+
+def test_import_anyconfig_lazily():
+    code = ("import sys, anytemplate; "
+            "assert 'anyconfig' not in sys.modules")
+    subprocess.check_call([sys.executable, "-c", code])
+
+
+def test_parse_and_load_contexts_async(tmp_path):
+    ctx = tmp_path / "ctx.json"
+    ctx.write_text('{"a": 1}')
+
+    res = asyncio.run(TT.parse_and_load_contexts_async([f"json:{ctx!s}"]))
+    assert res == {"a": 1}
+
+
+def test_template_resolver(tmp_path, monkeypatch):
+    (tmp_path / "a.t").write_text("a")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.t").write_text("b")
+    other = tmp_path / "other"
+    other.mkdir()
+
+    resolver = TT.TemplateResolver()
+    paths = [str(other), str(tmp_path)]
+    assert resolver.find("a.t", paths) == str(tmp_path / "a.t")
+    assert resolver.find("sub/b.t", paths) == str(tmp_path / "sub" / "b.t")
+    assert resolver.find("c.t", paths) is None
+
+    # The dir is scanned again as its mtime was changed.
+    (other / "a.t").write_text("a")
+    assert resolver.find("a.t", paths) == str(other / "a.t")
+
+    # Dirs are scanned once these become older than the granularity of
+    # mtimes, and not scanned again until their mtimes are changed.
+    for path in paths:
+        os.utime(path, ns=(0, 0))
+    assert resolver.find("c.t", paths) is None
+
+    scans = []
+    scan = resolver._scan
+    monkeypatch.setattr(resolver, "_scan",
+                        lambda d: scans.append(d) or scan(d))
+    for _i in range(3):
+        assert resolver.find("c.t", paths) is None
+    assert not scans
+
+
+def test_template_resolver__mtime_granularity(tmp_path):
+    resolver = TT.TemplateResolver()
+    assert not resolver.exists(str(tmp_path / "a.t"))
+
+    # The mtime of the dir is not changed in the same tick of it.
+    mtime = tmp_path.stat().st_mtime_ns
+    (tmp_path / "a.t").write_text("a")
+    os.utime(tmp_path, ns=(mtime, mtime))
+    assert resolver.exists(str(tmp_path / "a.t"))
+
+
+def test_template_resolver__not_scan_racy_dirs(tmp_path, monkeypatch):
+    (tmp_path / "a.t").write_text("a")
+    resolver = TT.TemplateResolver()
+    scans = []
+    scan = resolver._scan
+    monkeypatch.setattr(resolver, "_scan",
+                        lambda d: scans.append(d) or scan(d))
+
+    # Dirs modified just now are not scanned.
+    for _i in range(3):
+        assert resolver.exists(str(tmp_path / "a.t"))
+        assert not resolver.exists(str(tmp_path / "b.t"))
+    assert not scans
+
+    (tmp_path / "b.t").write_text("b")
+    assert resolver.exists(str(tmp_path / "b.t"))
+
+    # These are scanned once these become old enough.
+    os.utime(tmp_path, ns=(0, 0))
+    for _i in range(3):
+        assert resolver.exists(str(tmp_path / "b.t"))
+        assert not resolver.exists(str(tmp_path / "c.t"))
+    assert scans == [str(tmp_path)]
+
+
+def test_template_resolver__ttl(tmp_path, monkeypatch):
+    (tmp_path / "a.t").write_text("a")
+    os.utime(tmp_path, ns=(0, 0))  # Make it old enough to be scanned.
+    resolver = TT.TemplateResolver(ttl=60)
+    assert resolver.exists(str(tmp_path / "a.t"))
+
+    stats = []
+    stat = os.stat
+    monkeypatch.setattr(TT.os, "stat", lambda *a: stats.append(a) or stat(*a))
+    assert resolver.exists(str(tmp_path / "a.t"))
+    assert not resolver.exists(str(tmp_path / "b.t"))
+    assert not stats
+
+
+def test_load_context__snapshot(tmp_path, monkeypatch):
+    ctx = tmp_path / "ctx.json"
+    ctx.write_text('{"a": 1}')
+    cache_dir = tmp_path / "cache"
+
+    assert TT.load_context(str(ctx), "json", cache_dir=str(cache_dir)) == \
+        {"a": 1}
+    assert len(list((cache_dir / "contexts").glob("*.pickle"))) == 1
+
+    loads = []
+    (_loads, load, merge) = TT._get_context_loaders()
+    monkeypatch.setattr(
+        TT, "_CONTEXT_LOADERS",
+        (_loads, lambda *a, **kw: loads.append(a) or load(*a, **kw), merge)
+    )
+    res = TT.parse_and_load_contexts([f"json:{ctx!s}"],
+                                     cache_dir=str(cache_dir))
+    assert res == {"a": 1}
+    assert not loads  # Loaded from the snapshot.
+
+    ctx.write_text('{"a": 2}')
+    os.utime(ctx, ns=(0, 0))
+    assert TT.load_context(str(ctx), "json", cache_dir=str(cache_dir)) == \
+        {"a": 2}
+    assert len(loads) == 1
+
+
+class Stale(object):
+    def __reduce__(self):  # Refers to a class removed.
+        return (getattr, (TT, "NotExistingClass"))
+
+
+def test_load_context__stale_snapshot(tmp_path):
+    ctx = tmp_path / "ctx.json"
+    ctx.write_text('{"a": 1}')
+    cache_dir = str(tmp_path / "cache")
+
+    path = TT._context_snapshot_path(cache_dir, str(ctx), "json")
+    TT._save_context_snapshot(path, Stale())
+    assert TT.load_context(str(ctx), "json", cache_dir=cache_dir) == \
+        {"a": 1}
+    assert TT.load_context(str(ctx), "json", cache_dir=cache_dir) == \
+        {"a": 1}  # The snapshot was replaced.
+
+
+def test_load_context__snapshots_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(TT, "MAX_CONTEXT_SNAPSHOTS", 2)
+    cache_dir = tmp_path / "cache"
+    for idx in range(4):
+        ctx = tmp_path / f"{idx}.json"
+        ctx.write_text(f'{{"a": {idx}}}')
+        assert TT.load_context(str(ctx), "json",
+                               cache_dir=str(cache_dir)) == {"a": idx}
+
+    snapshots = list((cache_dir / "contexts").glob("*.pickle"))
+    assert len(snapshots) == 2
+
+
+def test_lazy_context(tmp_path):
+    ctx = tmp_path / "ctx.json"
+    ctx.write_text('{"a": {"b": 1}, "c": 2}')
+
+    lctx = TT.LazyContext([f"json:{ctx!s}"])
+    assert isinstance(lctx, dict)
+    assert not lctx.loaded
+
+    assert lctx["c"] == 2
+    assert lctx.loaded
+    assert lctx == {"a": {"b": 1}, "c": 2}
+    assert sorted(lctx) == ["a", "c"]
+    assert dict(lctx, d=3) == {"a": {"b": 1}, "c": 2, "d": 3}
+
+    lctx = TT.LazyContext([f"json:{ctx!s}"])
+    lctx["c"] = 3  # Loaded before it's set.
+    assert lctx == {"a": {"b": 1}, "c": 3}
+
+
+def test_lazy_context__operators(tmp_path):
+    ctx = tmp_path / "ctx.json"
+    ctx.write_text('{"a": 1, "b": 2}')
+    lctx = TT.LazyContext([f"json:{ctx!s}"])
+
+    lctx |= {"a": 9}  # Loaded before it's updated.
+    assert lctx.get("a") == 9
+    assert lctx == {"a": 9, "b": 2}
+
+    lctx = TT.LazyContext([f"json:{ctx!s}"])
+    assert {"c": 3} | lctx == {"a": 1, "b": 2, "c": 3}
+    assert lctx | {"a": 9} == {"a": 9, "b": 2}
+
+    lctx = TT.LazyContext([f"json:{ctx!s}"])
+    assert lctx.__sizeof__() > TT.LazyContext([]).__sizeof__()
+    assert lctx.loaded
+
+    res = TT.LazyContext.fromkeys(["a"], 0)
+    assert res == {"a": 0}
+    assert type(res) is dict
+
+
+def test_lazy_context__pickle(tmp_path):
+    import pickle
+
+    ctx = tmp_path / "ctx.json"
+    ctx.write_text('{"a": 1}')
+
+    res = pickle.loads(pickle.dumps(TT.LazyContext([str(ctx)])))
+    assert res == {"a": 1}
+    assert type(res) is dict
+
+
+SCHEMA = '{"type": "object", "properties": {"a": {"type": "integer"}}}'
+
+
+def test_validate_context(tmp_path, monkeypatch):
+    pytest.importorskip("jsonschema")
+    scm = tmp_path / "scm.json"
+    scm.write_text(SCHEMA)
+
+    validate = TT.get_schema_validator(str(scm))
+    assert TT.get_schema_validator(str(scm)) is validate  # Compiled once.
+
+    calls = []
+    monkeypatch.setattr(TT, "_VALIDATIONS", TT.anytemplate.cache.LRUCache())
+    monkeypatch.setattr(TT, "_make_schema_validator",
+                        lambda s: lambda c: calls.append(c) or validate(c))
+    TT.anytemplate.cache.clear_caches()
+
+    assert TT.validate_context({"a": 1}, str(scm), "a") == ()
+    assert TT.validate_context({"a": 1}, str(scm), "a") == ()
+    assert TT.validate_context({"a": "1"}, str(scm), "b")
+    assert len(calls) == 2  # The result of the same source was reused.
+
+    assert TT.validate_context({"a": 1}, str(scm)) == ()
+    assert len(calls) == 3  # Not cached without the key.
+
+
+def test_parse_and_load_contexts__schema(tmp_path):
+    pytest.importorskip("jsonschema")
+    scm = tmp_path / "scm.json"
+    scm.write_text(SCHEMA)
+    (tmp_path / "a.json").write_text('{"a": "1"}')
+    (tmp_path / "b.json").write_text('{"a": 2, "b": 2}')
+    ctxs = [str(tmp_path / "a.json"), str(tmp_path / "b.json")]
+
+    assert TT.parse_and_load_contexts(ctxs, str(scm)) == {"a": 2, "b": 2}
+    assert TT.parse_and_load_contexts(ctxs, str(scm),
+                                      validate_merged=True) == \
+        {"a": 2, "b": 2}
+
+    ctxs.reverse()
+    assert TT.parse_and_load_contexts(ctxs, str(scm)) == {"a": 2, "b": 2}
+    assert TT.parse_and_load_contexts(ctxs, str(scm),
+                                      validate_merged=True) == {}
+    with pytest.raises(ValueError):
+        TT.parse_and_load_contexts(ctxs, str(scm), werr=True,
+                                   validate_merged=True)